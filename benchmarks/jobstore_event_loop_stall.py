@@ -0,0 +1,96 @@
+"""
+Бенчмарк: насколько операции планировщика блокируют event loop.
+
+Параллельно с add_job/get_job/remove_job работает "тикер", который каждую
+миллисекунду засыпает и меряет, на сколько позже он проснулся. Сумма и максимум
+этих задержек — время, в течение которого бот не мог обрабатывать апдейты.
+
+Запуск (нужна доступная БД из .env):
+    python -m benchmarks.jobstore_event_loop_stall --jobs 500
+    python -m benchmarks.jobstore_event_loop_stall --url sqlite:////tmp/jobs.db
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from src.core.subscription.jobstore import WriteBehindSQLAlchemyJobStore
+
+TICK = 0.001
+TABLENAME = "apscheduler_jobs_benchmark"
+
+
+async def _noop(sub_id: int):
+    return sub_id
+
+
+async def _ticker(stalls: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(max(time.perf_counter() - started - TICK, 0.0))
+
+
+async def _measure(jobstore, jobs: int) -> dict:
+    scheduler = AsyncIOScheduler(jobstores={"default": jobstore}, timezone="UTC")
+    scheduler.start(paused=True)
+    scheduler.remove_all_jobs()
+
+    stalls: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(stalls, stop))
+    await asyncio.sleep(TICK * 5)
+
+    run_date = datetime.now(timezone.utc) + timedelta(days=30)
+    started = time.perf_counter()
+    for sub_id in range(jobs):
+        # Так же, как SubscriptionService._schedule_tasks с reschedule=True
+        job_id = f"deactivate_{sub_id}"
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+        scheduler.add_job(_noop, trigger="date", run_date=run_date, args=[sub_id], id=job_id)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    scheduler.remove_all_jobs()
+    scheduler.shutdown()
+    await asyncio.sleep(0)
+    return {
+        "elapsed": elapsed,
+        "total_stall": sum(stalls),
+        "max_stall": max(stalls, default=0.0),
+    }
+
+
+async def main(url: str, jobs: int):
+    results = {
+        "SQLAlchemyJobStore": await _measure(
+            SQLAlchemyJobStore(url=url, tablename=TABLENAME), jobs
+        ),
+        "WriteBehindSQLAlchemyJobStore": await _measure(
+            WriteBehindSQLAlchemyJobStore(url=url, tablename=TABLENAME), jobs
+        ),
+    }
+    print(f"{jobs} reschedules per store")
+    for name, r in results.items():
+        print(
+            f"{name:<32} elapsed={r['elapsed'] * 1000:8.1f}ms "
+            f"loop stall total={r['total_stall'] * 1000:8.1f}ms "
+            f"max={r['max_stall'] * 1000:6.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    from src.core.subscription.scheduler import sync_db_url
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=sync_db_url)
+    parser.add_argument("--jobs", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.jobs))
@@ -5,15 +5,28 @@ from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.types import BotCommand
 
 from src.bot.handlers import get_handlers_router
-from src.bot.middlewares import DBSessionMiddleware, RemoveLastKeyboardMiddleware
+from src.bot.middlewares import (
+    DBSessionMiddleware,
+    RemoveLastKeyboardMiddleware,
+    ThrottlingMiddleware,
+)
+from src.cache import TokenBucketLimiter, redis_client
 from src.config import settings
+from src.notifications.keyboard_remover import keyboard_remover
 
 bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-storage = RedisStorage.from_url(settings.REDIS_URL)
+storage = RedisStorage(redis_client)
 dp = Dispatcher(storage=storage)
 
-dp.message.middleware(RemoveLastKeyboardMiddleware())
-dp.callback_query.middleware(RemoveLastKeyboardMiddleware())
+throttling = TokenBucketLimiter(
+    redis_client, rate=settings.THROTTLE_RATE, burst=settings.THROTTLE_BURST
+)
+if settings.THROTTLE_ENABLED:
+    # Первым среди inner-middleware: отброшенный апдейт не доходит до БД и хендлера
+    dp.callback_query.middleware(ThrottlingMiddleware(throttling))
+
+dp.message.middleware(RemoveLastKeyboardMiddleware(storage.redis, keyboard_remover))
+dp.callback_query.middleware(RemoveLastKeyboardMiddleware(storage.redis, keyboard_remover))
 
 dp.message.middleware(DBSessionMiddleware())
 dp.callback_query.middleware(DBSessionMiddleware())
@@ -28,4 +41,14 @@ async def setup_bot():
             BotCommand(command="help", description="Help"),
         ]
     )
-    await bot.delete_webhook(drop_pending_updates=True)
+    if settings.BOT_MODE == "webhook":
+        # Апдейты, накопленные за время перезапуска, не сбрасываются
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL,
+            secret_token=settings.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=False,
+        )
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
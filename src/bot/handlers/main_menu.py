@@ -15,7 +15,7 @@ async def main_menu(callback: CallbackQuery, state: FSMContext, session: AsyncSe
 
     user_id = callback.from_user.id
     user_repo = UserRepository(session)
-    user = await user_repo.get_by_id(user_id)
+    user = await user_repo.get_profile(user_id)
     return await callback.message.edit_text(
         "<b>Внимание!</b>\n"
         "Этот бот — учебный пет-проект и не предназначен для реальной эксплуатации.\n"
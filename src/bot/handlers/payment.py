@@ -1,3 +1,5 @@
+import logging
+
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, LabeledPrice, Message, PreCheckoutQuery
@@ -6,26 +8,33 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.bot.keyboards import back_to_main_kb, tariff_selection_kb
 from src.bot.states import UserStates
 from src.bot.utils.datetime_formatter import format_utc_to_moscow
-from src.config import settings
+from src.config import THROTTLING_COSTS, settings
+from src.core.payment.payload import invoice_payload_codec
 from src.core.payment.service import PaymentService
+from src.core.tariff.catalog import tariff_catalog
 from src.core.tariff.repository import TariffRepository
 from src.exceptions import TariffNotFoundException
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
 
 @router.callback_query(F.data == "select_tariff")
 async def select_tariff(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
-    tariff_repo = TariffRepository(session)
-    tariffs = await tariff_repo.get_all_active()
+    tariffs = await tariff_catalog.get_all_active(TariffRepository(session))
     await state.set_state(UserStates.CREATE_PAYMENT)
     return await callback.message.edit_text(
         "Выберите тариф для покупки/продления:", reply_markup=tariff_selection_kb(tariffs)
     )
 
 
-@router.callback_query(F.data.startswith("tariff_"), UserStates.CREATE_PAYMENT)
-async def create_payment(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@router.callback_query(
+    F.data.startswith("tariff_"),
+    UserStates.CREATE_PAYMENT,
+    flags={"throttling_cost": THROTTLING_COSTS["create_payment"]},
+)
+async def create_payment(callback: CallbackQuery, session: AsyncSession):
     user_id = callback.from_user.id
     tariff_id = int(callback.data.split("_")[1])
     pay_service = PaymentService(session)
@@ -40,8 +49,6 @@ async def create_payment(callback: CallbackQuery, state: FSMContext, session: As
         label=invoice_data["label"],
         amount=int(invoice_data["amount"] * 100),
     )
-    await state.update_data(payment_id=invoice_data["payment_id"])
-    await state.set_state(UserStates.SUCCESSFUL_PAYMENT)
     return await callback.message.answer_invoice(
         title="Покупка VPN-подписки",
         description=invoice_data["label"],
@@ -52,26 +59,61 @@ async def create_payment(callback: CallbackQuery, state: FSMContext, session: As
     )
 
 
-@router.pre_checkout_query(lambda q: True)
+@router.pre_checkout_query()
 async def pre_checkout(query: PreCheckoutQuery):
-    # Подтверждаем, переходим к оплате
+    """
+    Проверяет подпись payload, пользователя и сумму без обращения к БД и Redis:
+    на ответ у бота не больше 10 секунд.
+    """
+    payload = invoice_payload_codec.verify(query.invoice_payload)
+    if (
+        payload is None
+        or payload.user_id != query.from_user.id
+        or payload.total_amount != query.total_amount
+        or query.currency != "RUB"
+    ):
+        logger.warning(
+            "Rejected pre-checkout %s from user %s: payload=%r amount=%s",
+            query.id,
+            query.from_user.id,
+            query.invoice_payload,
+            query.total_amount,
+        )
+        return await query.answer(
+            ok=False, error_message="Счёт устарел. Пожалуйста, выберите тариф заново."
+        )
     await query.answer(ok=True)
 
 
-@router.message(F.content_type == "successful_payment", UserStates.SUCCESSFUL_PAYMENT)
-async def successful_payment(message: Message, state: FSMContext, session: AsyncSession):
+@router.message(F.successful_payment)
+async def successful_payment(message: Message, session: AsyncSession):
     """
     После успешной оплаты создаём или продлеваем подписку.
+    Платеж находится по подписанному payload, состояние FSM для этого не нужно.
     """
-    data = await state.get_data()
-    payment_id = data.get("payment_id")
+    payment = message.successful_payment
+    payload = invoice_payload_codec.verify(payment.invoice_payload)
+    if payload is None:
+        # pre_checkout пропускает только подписанные payload: сюда попадаем, лишь если
+        # INVOICE_PAYLOAD_SECRET сменили между pre-checkout и оплатой
+        logger.error(
+            "Successful payment with invalid payload %r: telegram_charge=%s provider_charge=%s",
+            payment.invoice_payload,
+            payment.telegram_payment_charge_id,
+            payment.provider_payment_charge_id,
+        )
+        return await message.answer(
+            "⚠️ Не удалось найти счёт для этой оплаты. Напишите в поддержку.",
+            reply_markup=back_to_main_kb(),
+        )
     service = PaymentService(session)
 
     try:
         action, end_datetime_utc, key = await service.process_success(
-            payment_id,
-            message.successful_payment.telegram_payment_charge_id,
-            message.successful_payment.provider_payment_charge_id,
+            payload.payment_id,
+            payment.telegram_payment_charge_id,
+            payment.provider_payment_charge_id,
+            created_at=payload.created_at,
         )
     except TariffNotFoundException:
         return await message.answer(
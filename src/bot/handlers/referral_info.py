@@ -10,12 +10,21 @@ router = Router()
 
 
 @router.callback_query(F.data == "ref_program")
+@router.callback_query(F.data.startswith("ref_next_") | F.data.startswith("ref_prev_"))
 async def referral_info(callback: CallbackQuery, session: AsyncSession):
     bot_username = (await callback.bot.get_me()).username
     ref_service = ReferralService(session)
 
+    after = before = None
+    if callback.data.startswith("ref_next_"):
+        after = int(callback.data.removeprefix("ref_next_"))
+    elif callback.data.startswith("ref_prev_"):
+        before = int(callback.data.removeprefix("ref_prev_"))
+
     try:
-        info = await ref_service.get_info(callback.from_user.id, bot_username)
+        info = await ref_service.get_info(
+            callback.from_user.id, bot_username, after=after, before=before
+        )
     except UserNotFoundException:
         return await callback.message.answer(
             "Пользователь не найден", reply_markup=back_to_main_kb()
@@ -35,4 +44,6 @@ async def referral_info(callback: CallbackQuery, session: AsyncSession):
 
     text += "\n🎁 Вы получаете +7 дней к подписке, а приглашенный человек 14 дней!"
 
-    return await callback.message.edit_text(text, reply_markup=referral_info_kb())
+    return await callback.message.edit_text(
+        text, reply_markup=referral_info_kb(info["prev_cursor"], info["next_cursor"])
+    )
@@ -7,7 +7,9 @@ from src.bot.keyboards import back_to_main_kb, trial_confirmation_kb
 from src.bot.states import UserStates
 from src.bot.texts import INSTRUCTION_TEXT
 from src.bot.utils.datetime_formatter import format_days_string, format_utc_to_moscow
+from src.config import THROTTLING_COSTS
 from src.core.subscription.service import SubscriptionService
+from src.core.tariff.catalog import tariff_catalog
 from src.core.tariff.repository import TariffRepository
 
 router = Router()
@@ -16,7 +18,7 @@ router = Router()
 @router.callback_query(F.data == "trial")
 async def trial(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
 
-    trial_tariff = await TariffRepository(session).get_by_name("trial")
+    trial_tariff = await tariff_catalog.get_by_name("trial", TariffRepository(session))
     if not trial_tariff:
         return await callback.message.edit_text(
             "Ошибка: пробный тариф не настроен. Обратитесь в поддержку.",
@@ -34,7 +36,11 @@ async def trial(callback: CallbackQuery, state: FSMContext, session: AsyncSessio
     )
 
 
-@router.callback_query(F.data == "get_trial", UserStates.TRIAL)
+@router.callback_query(
+    F.data == "get_trial",
+    UserStates.TRIAL,
+    flags={"throttling_cost": THROTTLING_COSTS["get_trial"]},
+)
 async def get_trial(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     user_id = callback.from_user.id
     sub_service = SubscriptionService(session)
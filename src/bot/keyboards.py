@@ -58,9 +58,16 @@ def subscription_info_kb():
     return builder.as_markup()
 
 
-def referral_info_kb():
+def referral_info_kb(prev_cursor: int | None = None, next_cursor: int | None = None):
     builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="Назад", callback_data="back_to_main"))
+    pages = []
+    if prev_cursor is not None:
+        pages.append(InlineKeyboardButton(text="◀️", callback_data=f"ref_prev_{prev_cursor}"))
+    if next_cursor is not None:
+        pages.append(InlineKeyboardButton(text="▶️", callback_data=f"ref_next_{next_cursor}"))
+    if pages:
+        builder.row(*pages)
+    builder.row(InlineKeyboardButton(text="Назад", callback_data="back_to_main"))
     return builder.as_markup()
 
 
@@ -1,41 +1,49 @@
 import logging
+from datetime import timedelta
 
-from aiogram import BaseMiddleware, Bot, types
-from aiogram.exceptions import TelegramBadRequest
-from aiogram.fsm.context import FSMContext
+from aiogram import BaseMiddleware, types
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import CallbackQuery, Message, TelegramObject
+from redis.asyncio import Redis
 
 from src.bot.keyboards import back_to_main_kb
-from src.database import session_factory
+from src.cache import TokenBucketLimiter
+from src.database import LazySession
 from src.exceptions import ServiceException
+from src.notifications.keyboard_remover import KeyboardRemover
 
 logger = logging.getLogger(__name__)
 
+LAST_MESSAGE_TTL = timedelta(days=30)
+
 
 class DBSessionMiddleware(BaseMiddleware):
     """
-    Открывает AsyncSession перед обработкой и коммитит/роллбекает после.
+    Передает в хендлер ленивую сессию (LazySession) и коммитит/роллбекает после,
+    только если хендлер действительно обращался к БД.
     """
 
     async def __call__(self, handler, event: TelegramObject, data: dict):
-        async with session_factory() as session:
-            data["session"] = session
-            try:
-                result = await handler(event, data)
-                await session.commit()
-                return result
-            # Неожиданные ошибки сервисов
-            except ServiceException:
-                await session.rollback()
-                # Отправка пользователю сообщение об ошибке
-                return await _send_error_message(event)
-            # Неожиданные ошибки хендлеров
-            except Exception as e:
-                await session.rollback()
-                logger.exception(
-                    "Error in middleware %s for event %s Exception %s", handler.__name__, event, e
-                )
-                return await _send_error_message(event)
+        session = LazySession()
+        data["session"] = session
+        try:
+            result = await handler(event, data)
+            await session.commit()
+            return result
+        # Неожиданные ошибки сервисов
+        except ServiceException:
+            await session.rollback()
+            # Отправка пользователю сообщение об ошибке
+            return await _send_error_message(event)
+        # Неожиданные ошибки хендлеров
+        except Exception as e:
+            await session.rollback()
+            logger.exception(
+                "Error in middleware %s for event %s Exception %s", handler.__name__, event, e
+            )
+            return await _send_error_message(event)
+        finally:
+            await session.close()
 
 
 async def _send_error_message(event: TelegramObject):
@@ -55,11 +63,19 @@ async def _send_error_message(event: TelegramObject):
 
 
 class RemoveLastKeyboardMiddleware(BaseMiddleware):
-    async def __call__(self, handler, event, data: dict):
-        state: FSMContext = data.get("state")
-        data_state = await state.get_data()
-        last_message_id = data_state.get("last_message_id")
+    """
+    Убирает клавиатуру у предыдущего сообщения бота, когда бот отвечает новым.
+
+    id последнего сообщения хранится в отдельном ключе Redis и обновляется одной командой
+    SET ... GET, которая сразу возвращает предыдущее значение. Удаление клавиатуры
+    выполняется в фоне через KeyboardRemover.
+    """
+
+    def __init__(self, redis: Redis, remover: KeyboardRemover):
+        self._redis = redis
+        self._remover = remover
 
+    async def __call__(self, handler, event, data: dict):
         result = await handler(event, data)
 
         current_message_id = None
@@ -67,28 +83,48 @@ class RemoveLastKeyboardMiddleware(BaseMiddleware):
             current_message_id = result.message_id
         elif isinstance(event, types.CallbackQuery):
             current_message_id = event.message.message_id
+        if not current_message_id:
+            return result
+
+        chat_id = event.message.chat.id if isinstance(event, types.CallbackQuery) else event.chat.id
+        logger.debug(f"Обновление last_message_id = {current_message_id}")
+        last_message_id = await self._redis.set(
+            _last_message_key(event.bot.id, chat_id),
+            current_message_id,
+            ex=LAST_MESSAGE_TTL,
+            get=True,
+        )
+        if last_message_id and int(last_message_id) != current_message_id:
+            self._remover.submit(chat_id, int(last_message_id))
+        return result
 
-        if last_message_id and current_message_id and last_message_id != current_message_id:
-            chat_id = (
-                event.message.chat.id if isinstance(event, types.CallbackQuery) else event.chat.id
-            )
-            await _remove_keyboard(event.bot, chat_id, last_message_id)
 
-        if state and current_message_id:
-            logger.debug(f"Обновление last_message_id = {current_message_id}")
-            await state.update_data(last_message_id=current_message_id)
-        return result
+def _last_message_key(bot_id: int, chat_id: int) -> str:
+    return f"last_msg:{bot_id}:{chat_id}"
 
 
-async def _remove_keyboard(bot: Bot, chat_id: int, message_id: int) -> None:
-    try:
-        await bot.edit_message_reply_markup(
-            chat_id=chat_id, message_id=message_id, reply_markup=None
-        )
-    except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
-            logger.debug(f"Keyboard already removed: {chat_id}:{message_id}")
-            return
-        logger.error(f"Error removing keyboard {chat_id}:{message_id}: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error removing keyboard {chat_id}:{message_id}: {e}")
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту апдейтов одного пользователя token bucket'ом в Redis.
+
+    Стоимость хендлера задается флагом throttling_cost (по умолчанию 1): хендлеры,
+    создающие ключи Outline или платежи, стоят дороже. Лишние нажатия отбрасываются
+    без ответа пользователю, callback только подтверждается, чтобы кнопка не зависла.
+    """
+
+    def __init__(self, limiter: TokenBucketLimiter):
+        self._limiter = limiter
+
+    async def __call__(self, handler, event: TelegramObject, data: dict):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        cost = get_flag(data, "throttling_cost", default=1)
+        if await self._limiter.acquire(f"{event.bot.id}:{user.id}", cost):
+            return await handler(event, data)
+
+        logger.debug("Throttled update from user %s (cost %s)", user.id, cost)
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+        return None
@@ -5,6 +5,5 @@ class UserStates(StatesGroup):
     TRIAL = State()
     TARIFF_SELECT = State()
     CREATE_PAYMENT = State()
-    SUCCESSFUL_PAYMENT = State()
     SUBSCRIPTION_INFO = State()
     REFERRAL = State()
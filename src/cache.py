@@ -0,0 +1,108 @@
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from redis.asyncio import Redis
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+# Общий клиент Redis приложения (FSM storage, кэши)
+redis_client: Redis = Redis.from_url(settings.REDIS_URL)
+
+
+class LRUCache(Generic[V]):
+    """
+    Небольшой кэш в памяти процесса: не больше maxsize записей, каждая живет ttl секунд.
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        self._data[key] = (monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# Бакет пополняется на rate токенов в секунду до burst, запрос проходит, если в бакете
+# есть cost токенов. Время берется у Redis, чтобы реплики с разными часами делили один бакет.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return allowed
+"""
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket в Redis, общий для всех реплик: проверка и списание выполняются
+    одним Lua-скриптом, поэтому параллельные запросы не списывают один токен дважды.
+    Если Redis недоступен, запросы пропускаются.
+    """
+
+    def __init__(self, redis: Redis, rate: float, burst: int, prefix: str = "throttle"):
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._rate = rate
+        self._burst = burst
+        self._prefix = prefix
+        self.stats: Dict[str, int] = {"allowed": 0, "throttled": 0, "errors": 0}
+
+    async def acquire(self, key: str, cost: int = 1) -> bool:
+        try:
+            allowed = await self._script(
+                keys=[f"{self._prefix}:{key}"], args=[self._rate, self._burst, cost]
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning("Token bucket check for %s failed: %s", key, e)
+            return True
+        if allowed:
+            self.stats["allowed"] += 1
+            return True
+        self.stats["throttled"] += 1
+        return False
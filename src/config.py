@@ -1,19 +1,66 @@
+import re
 from typing import Literal
 
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Стоимость дорогих хендлеров в token bucket (флаг throttling_cost, по умолчанию 1):
+# выдача пробного ключа и создание платежа. THROTTLE_BURST не может быть меньше наибольшей
+THROTTLING_COSTS = {"get_trial": 5, "create_payment": 3}
+
+
+class OutlineServerSettings(BaseModel):
+    name: str
+    api_url: str
+    cert_sha256: str
+    weight: int = 1
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, extra="ignore")
     MODE: Literal["DEV", "TEST", "PROD"] = "DEV"
+    # all — один процесс делает все; bot — только обработка апдейтов;
+    # worker — только фоновые задачи (окончание подписок, уведомления)
+    APP_ROLE: Literal["all", "bot", "worker"] = "all"
+    # Уникальное имя реплики (например, имя контейнера), нужно при нескольких репликах bot
+    REPLICA_ID: str = ""
 
     BOT_TOKEN: str = ""
+    # polling — long polling (одна реплика bot), webhook — aiohttp-сервер за балансировщиком
+    BOT_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_BASE_URL: str = ""
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    WEBHOOK_WORKERS: int = 16
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # /metrics без авторизации, поэтому только на внутреннем адресе (порт 0 — выключено)
+    WEBHOOK_METRICS_HOST: str = "127.0.0.1"
+    WEBHOOK_METRICS_PORT: int = 9090
+
+    @property
+    def WEBHOOK_URL(self):
+        return f"{self.WEBHOOK_BASE_URL.rstrip('/')}{self.WEBHOOK_PATH}"
+
+    # Ключ, из которого выводятся реферальные коды (пустой — используется BOT_TOKEN).
+    # После смены ключа новые коды не совпадают со старыми, старые продолжают работать
+    REFERRAL_CODE_SECRET: str = ""
+    # Ключ подписи payload инвойсов (пустой — используется BOT_TOKEN).
+    # После смены ключа неоплаченные инвойсы находятся только по состоянию FSM
+    INVOICE_PAYLOAD_SECRET: str = ""
 
     DB_HOST: str = ""
     DB_PORT: str = ""
     DB_USER: str = ""
     DB_PASS: str = ""
     DB_NAME: str = ""
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
 
     @property
     def DATABASE_URL(self):
@@ -51,10 +98,114 @@ class Settings(BaseSettings):
         )
         return url
 
+    # Кэш профилей пользователей: Redis + LRU в памяти процесса
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_LOCAL_SIZE: int = 10000
+    USER_CACHE_LOCAL_TTL_SECONDS: float = 10.0
+
     OUTLINE_API_URL: str = ""
     OUTLINE_CERT_SHA256: str = ""
+    # JSON-список серверов кластера: [{"name", "api_url", "cert_sha256", "weight"}, ...]
+    # Если не задан, используется один сервер из OUTLINE_API_URL/OUTLINE_CERT_SHA256
+    OUTLINE_SERVERS: list[OutlineServerSettings] = []
+    OUTLINE_HEALTHCHECK_INTERVAL_MINUTES: int = 5
+    OUTLINE_MAX_CONNECTIONS: int = 10
+    OUTLINE_TIMEOUT: int = 30
+
+    @property
+    def OUTLINE_CLUSTER(self) -> list[OutlineServerSettings]:
+        if self.OUTLINE_SERVERS:
+            return self.OUTLINE_SERVERS
+        server = OutlineServerSettings(
+            name="default", api_url=self.OUTLINE_API_URL, cert_sha256=self.OUTLINE_CERT_SHA256
+        )
+        return [server]
+
+    OUTLINE_KEY_POOL_SIZE: int = 20
+    OUTLINE_KEY_POOL_LOW_WATERMARK: int = 5
+    OUTLINE_KEY_POOL_REFILL_CONCURRENCY: int = 3
 
     PAYMASTER_MERCHANT_ID: str = ""
 
+    # Очередь исходящих сообщений: лимит Telegram ~30 msg/s, часть оставляем ответам хендлеров
+    MESSAGE_QUEUE_GLOBAL_RATE: float = 25.0
+    MESSAGE_QUEUE_CHAT_INTERVAL_SECONDS: float = 1.0
+    MESSAGE_QUEUE_MAX_ATTEMPTS: int = 5
+    MESSAGE_QUEUE_WORKERS: int = 4
+    MESSAGE_QUEUE_MAXSIZE: int = 100000
+
+    KEYBOARD_REMOVER_WORKERS: int = 2
+    KEYBOARD_REMOVER_MAXSIZE: int = 10000
+
+    # Anti-flood для callback'ов: THROTTLE_RATE токенов в секунду, не больше THROTTLE_BURST
+    # (стоимость хендлера — флаг throttling_cost, см. THROTTLING_COSTS)
+    THROTTLE_ENABLED: bool = True
+    THROTTLE_RATE: float = 1.0
+    THROTTLE_BURST: int = 10
+
+    SCHEDULER_JOBSTORE_POOL_SIZE: int = 2
+    # Пакетное выполнение просроченных задач (догоняющий запуск после простоя)
+    JOBS_BATCH_SIZE: int = 200
+
+    # jobs — две задачи APScheduler на подписку, sweeper — один периодический проход по БД
+    EXPIRY_ENGINE: Literal["jobs", "sweeper"] = "jobs"
+    EXPIRY_SWEEP_INTERVAL_SECONDS: int = 60
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500
+    # Уведомление, не отправленное за это время после постановки в очередь
+    # (рестарт, dead letter), ставится в очередь снова
+    NOTIFY_CLAIM_TTL_MINUTES: int = 30
+
+    # Outbox операций над Outline: ключи удаляются фоновым relay после коммита
+    OUTBOX_RELAY_INTERVAL_SECONDS: int = 10
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_CONCURRENCY: int = 10
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETRY_BASE_SECONDS: int = 30
+    # Забранная relay операция не выдается другим relay это время (должно покрывать пачку)
+    OUTBOX_LEASE_SECONDS: int = 600
+    # Созданный ключ удаляется, если транзакция с подпиской не подтвердила его за это время
+    OUTBOX_KEY_GRACE_SECONDS: int = 300
+
+    # Брошенные инвойсы (PENDING дольше PAYMENT_PENDING_TTL_HOURS) переводятся в CANCELED
+    PAYMENT_PENDING_TTL_HOURS: int = 24
+    PAYMENT_SWEEP_INTERVAL_MINUTES: int = 30
+    PAYMENT_SWEEP_BATCH_SIZE: int = 1000
+
+    # Месячные партиции payments: сколько месяцев вперед создавать заранее
+    # и через сколько месяцев отсоединять старые в PAYMENT_ARCHIVE_DIR (0 — не архивировать)
+    PAYMENT_PARTITIONS_AHEAD_MONTHS: int = 3
+    PAYMENT_ARCHIVE_AFTER_MONTHS: int = 12
+    PAYMENT_ARCHIVE_DIR: str = "archive/payments"
+    PAYMENT_PARTITION_INTERVAL_HOURS: int = 24
+
+    # Сверка ключей Outline с подписками; при AUTOFIX лишние ключи ставятся на удаление
+    RECONCILE_INTERVAL_MINUTES: int = 60
+    RECONCILE_BATCH_SIZE: int = 1000
+    RECONCILE_AUTOFIX: bool = False
+
+    @model_validator(mode="after")
+    def check_scaling(self) -> "Settings":
+        # Задачи APScheduler читаются из памяти реплики, поэтому разделять работу
+        # между репликами можно только через sweeper с SELECT ... FOR UPDATE SKIP LOCKED
+        if self.APP_ROLE != "all" and self.EXPIRY_ENGINE != "sweeper":
+            raise ValueError("APP_ROLE=bot/worker requires EXPIRY_ENGINE=sweeper")
+        # REPLICA_ID входит в имена ключей пула Outline и отделяется от них ":"
+        if not re.fullmatch(r"[A-Za-z0-9_-]*", self.REPLICA_ID):
+            raise ValueError("REPLICA_ID may contain only letters, digits, '_' and '-'")
+        if self.APP_ROLE == "bot" and not self.REPLICA_ID:
+            raise ValueError("APP_ROLE=bot requires REPLICA_ID")
+        if self.BOT_MODE == "webhook" and not (self.WEBHOOK_BASE_URL and self.WEBHOOK_SECRET):
+            raise ValueError("BOT_MODE=webhook requires WEBHOOK_BASE_URL and WEBHOOK_SECRET")
+        if self.THROTTLE_ENABLED and self.THROTTLE_RATE <= 0:
+            raise ValueError("THROTTLE_RATE must be positive")
+        # Хендлер дороже бакета не прошел бы никогда
+        max_cost = max(THROTTLING_COSTS.values())
+        if self.THROTTLE_ENABLED and self.THROTTLE_BURST < max_cost:
+            raise ValueError(
+                f"THROTTLE_BURST must be at least {max_cost} (largest throttling_cost)"
+            )
+        return self
+
 
 settings = Settings()
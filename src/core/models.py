@@ -1,9 +1,10 @@
 # src/core/models.py
 
+from src.core.outbox.models import OutboxMessage  # noqa
 from src.core.payment.models import Payment  # noqa
 from src.core.referral.models import Referral  # noqa
 from src.core.subscription.models import Subscription  # noqa
 from src.core.tariff.models import Tariff  # noqa
 from src.core.user.models import User  # noqa
 
-__all__ = ["User", "Subscription", "Tariff", "Referral", "Payment"]
+__all__ = ["User", "Subscription", "Tariff", "Referral", "Payment", "OutboxMessage"]
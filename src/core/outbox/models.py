@@ -0,0 +1,66 @@
+# src/core/outbox/models.py
+
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy import Index, Integer, String, Text, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class OutboxOperation(Enum):
+    DELETE_KEY = "delete_key"
+
+
+class OutboxStatus(Enum):
+    PENDING = "pending"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+
+class OutboxMessage(Base):
+    """
+    Операция над сервером Outline, записанная в той же транзакции, что и изменение подписки.
+    Выполняется после коммита фоновым relay (src/core/outbox/relay.py).
+    """
+
+    __tablename__ = "outline_outbox"
+    __table_args__ = (
+        Index(
+            "idx_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    operation: Mapped[OutboxOperation] = mapped_column(SQLEnum(OutboxOperation), nullable=False)
+    # Повторная постановка той же операции игнорируется, если она не в статусе FAILED
+    idempotency_key: Mapped[str] = mapped_column(String(150), unique=True, nullable=False)
+    key_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    server: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    status: Mapped[OutboxStatus] = mapped_column(
+        SQLEnum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Когда relay впервые взял операцию; после этого отменить удаление уже нельзя
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.timezone("utc", func.now()), nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<OutboxMessage(id={self.id}, operation={self.operation.value}, "
+            f"key_id={self.key_id}, status={self.status.value})>"
+        )
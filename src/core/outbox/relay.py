@@ -0,0 +1,108 @@
+# src/core/outbox/relay.py
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from src.config import settings
+from src.core.outbox.models import OutboxMessage, OutboxOperation, OutboxStatus
+from src.core.outbox.repository import OutboxRepository
+from src.database import session_factory
+from src.outline.service import OutlineManager
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+async def run_outbox_relay() -> None:
+    """
+    Периодическая задача worker: выполняет операции outbox над серверами Outline.
+    """
+    try:
+        processed = await relay_outbox()
+        if processed:
+            logger.info(f"Outbox relay processed {processed} operations")
+    except Exception as e:
+        logger.exception(f"Unhandled exception in run_outbox_relay: {e}")
+
+
+async def relay_outbox(outline: Optional[OutlineManager] = None) -> int:
+    """
+    Выполняет готовые операции outbox пачками по OUTBOX_BATCH_SIZE,
+    не более OUTBOX_CONCURRENCY запросов к Outline одновременно.
+
+    Пачка забирается короткой транзакцией (операции откладываются на OUTBOX_LEASE_SECONDS),
+    Outline вызывается без открытой транзакции, результаты записываются второй короткой
+    транзакцией. Если процесс упадет посередине, операции выполнятся снова после lease.
+    Неудачная операция повторяется с экспоненциальной задержкой,
+    после OUTBOX_MAX_ATTEMPTS попыток помечается FAILED.
+
+    Returns:
+        int: количество обработанных операций (успешных и неудачных)
+    """
+    outline = outline or OutlineManager()
+    semaphore = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+    lease = timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    total = 0
+
+    while True:
+        async with session_factory() as session:
+            messages = await OutboxRepository(session).claim_due(settings.OUTBOX_BATCH_SIZE, lease)
+            await session.commit()
+        if not messages:
+            break
+
+        errors = await asyncio.gather(
+            *(_apply(outline, message, semaphore) for message in messages)
+        )
+        results = {message.id: error for message, error in zip(messages, errors)}
+
+        async with session_factory() as session:
+            now = datetime.now(timezone.utc)
+            # Результат записывается только для операций, которые все еще ждут выполнения
+            for message in await OutboxRepository(session).get_pending_by_ids(list(results)):
+                _record_result(message, results[message.id], now)
+            await session.commit()
+
+        total += len(messages)
+        if len(messages) < settings.OUTBOX_BATCH_SIZE:
+            break
+    return total
+
+
+async def _apply(
+    outline: OutlineManager, message: OutboxMessage, semaphore: asyncio.Semaphore
+) -> Optional[Exception]:
+    async with semaphore:
+        try:
+            if message.operation == OutboxOperation.DELETE_KEY:
+                # Удаление уже удаленного ключа не считается ошибкой (см. OutlineManager.delete_key)
+                await outline.delete_key(message.key_id, server=message.server)
+            return None
+        except Exception as e:
+            return e
+
+
+def _record_result(message: OutboxMessage, error: Optional[Exception], now: datetime) -> None:
+    if error is None:
+        message.status = OutboxStatus.DONE
+        message.processed_at = now
+        return
+
+    message.attempts += 1
+    message.last_error = str(error)[:1000]
+    if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        message.status = OutboxStatus.FAILED
+        message.processed_at = now
+        logger.error(
+            f"Outbox operation {message.id} ({message.operation.value} {message.key_id}) "
+            f"failed after {message.attempts} attempts: {error}"
+        )
+        return
+    delay = timedelta(seconds=settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (message.attempts - 1))
+    message.next_attempt_at = now + min(delay, MAX_RETRY_DELAY)
+    logger.warning(
+        f"Outbox operation {message.id} failed (attempt {message.attempts}), "
+        f"retry at {message.next_attempt_at.isoformat()}: {error}"
+    )
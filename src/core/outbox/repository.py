@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.outbox.models import OutboxMessage, OutboxOperation, OutboxStatus
+
+# (outline_key_id, outline_server)
+KeyRef = Tuple[str, Optional[str]]
+
+
+class OutboxRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def enqueue_key_deletions(
+        self,
+        keys: Sequence[KeyRef],
+        reason: str = "delete",
+        delay: Optional[timedelta] = None,
+    ) -> list[int]:
+        """
+        Ставит удаление ключей Outline в outbox одним INSERT.
+        Ключ, удаление которого с тем же reason уже поставлено, повторно не добавляется;
+        операция в статусе FAILED снова становится PENDING с обнуленными попытками.
+
+        Args:
+            keys: пары (outline_key_id, outline_server)
+            reason: часть ключа идемпотентности (например, delete или release)
+            delay: через сколько операция станет доступна relay
+
+        Returns:
+            list[int]: ID новых записей
+        """
+        if not keys:
+            return []
+        next_attempt_at = func.now() + delay if delay else func.now()
+        stmt = insert(OutboxMessage)
+        stmt = (
+            stmt.values(
+                [
+                    {
+                        "operation": OutboxOperation.DELETE_KEY,
+                        "idempotency_key": f"{reason}:{server or ''}:{key_id}",
+                        "key_id": str(key_id),
+                        "server": server,
+                        "status": OutboxStatus.PENDING,
+                        "attempts": 0,
+                        "next_attempt_at": next_attempt_at,
+                    }
+                    for key_id, server in keys
+                ]
+            )
+            .on_conflict_do_update(
+                index_elements=[OutboxMessage.idempotency_key],
+                set_={
+                    "status": OutboxStatus.PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": stmt.excluded.next_attempt_at,
+                    "last_error": None,
+                    "processed_at": None,
+                },
+                where=OutboxMessage.status == OutboxStatus.FAILED,
+            )
+            .returning(OutboxMessage.id)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_pending_key_ids(
+        self, servers: Sequence[Optional[str]], key_ids: Sequence[str]
+    ) -> set[str]:
+        """Ключи из key_ids, операция над которыми уже ждет relay."""
+        if not key_ids:
+            return set()
+        server_filter = [OutboxMessage.server.in_([s for s in servers if s is not None])]
+        if None in servers:
+            server_filter.append(OutboxMessage.server.is_(None))
+        result = await self.session.execute(
+            select(OutboxMessage.key_id).where(
+                OutboxMessage.status == OutboxStatus.PENDING,
+                OutboxMessage.key_id.in_(key_ids),
+                or_(*server_filter),
+            )
+        )
+        return set(result.scalars().all())
+
+    async def cancel(self, message_ids: Sequence[int]) -> int:
+        """
+        Отменяет операции, которые relay еще не брал.
+
+        Returns:
+            int: количество отмененных операций; операция, уже выполненная или взятая
+            relay, не отменяется
+        """
+        if not message_ids:
+            return 0
+        result = await self.session.execute(
+            update(OutboxMessage)
+            .where(
+                OutboxMessage.id.in_(message_ids),
+                OutboxMessage.status == OutboxStatus.PENDING,
+                OutboxMessage.claimed_at.is_(None),
+            )
+            .values(status=OutboxStatus.CANCELLED, processed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def expedite(self, message_ids: Sequence[int]) -> None:
+        """Делает отложенные операции доступными relay немедленно."""
+        if not message_ids:
+            return
+        await self.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(message_ids), OutboxMessage.status == OutboxStatus.PENDING)
+            .values(next_attempt_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def claim_due(self, limit: int, lease: timedelta) -> Sequence[OutboxMessage]:
+        """
+        Забирает пачку готовых к выполнению операций в порядке постановки: откладывает их
+        на lease, чтобы их не взял другой relay, пока выполняется вызов Outline.
+        Занятые другими воркерами строки пропускаются; после коммита блокировки снимаются.
+        """
+        query = (
+            select(OutboxMessage)
+            .where(
+                OutboxMessage.status == OutboxStatus.PENDING,
+                OutboxMessage.next_attempt_at <= func.now(),
+            )
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(query)
+        messages = result.scalars().all()
+        # Как и задержка повтора в relay, срок считается по часам процесса
+        now = datetime.now(timezone.utc)
+        for message in messages:
+            message.next_attempt_at = now + lease
+            if message.claimed_at is None:
+                message.claimed_at = now
+        await self.session.flush()
+        return messages
+
+    async def get_pending_by_ids(self, message_ids: Sequence[int]) -> Sequence[OutboxMessage]:
+        """Операции из message_ids, которые все еще ждут выполнения (не отменены)."""
+        if not message_ids:
+            return []
+        result = await self.session.execute(
+            select(OutboxMessage)
+            .where(OutboxMessage.id.in_(message_ids), OutboxMessage.status == OutboxStatus.PENDING)
+            .order_by(OutboxMessage.id)
+            .with_for_update()
+        )
+        return result.scalars().all()
@@ -6,7 +6,7 @@ from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy import BigInteger, DateTime
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import ForeignKey, Integer, Numeric, String, func
+from sqlalchemy import ForeignKey, Index, Integer, Numeric, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database import Base
@@ -18,14 +18,34 @@ if TYPE_CHECKING:
 
 class PaymentStatus(Enum):
     PENDING = "pending"
+    # Деньги списаны, но подписка не применена из-за ошибки; sweeper такие платежи не трогает
+    PAID = "paid"
     SUCCESS = "success"
     FAILED = "failed"
     CANCELED = "canceled"
 
 
 class Payment(Base):
+    """
+    Таблица партиционирована по месяцам created_at (партиции payments_pYYYY_MM,
+    src/core/payment/partitions.py). Первичный ключ включает created_at:
+    запрос с ним читает одну партицию.
+    """
+
     __tablename__ = "payments"
-    id: Mapped[int] = mapped_column(primary_key=True)
+    __table_args__ = (
+        # Только PENDING-платежи: их выбирает sweeper брошенных инвойсов
+        Index(
+            "idx_payments_pending_created",
+            "created_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        Index("idx_payments_user_created", "user_id", "created_at"),
+        Index("idx_payments_invoice_payload", "invoice_payload"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
         BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
@@ -37,18 +57,15 @@ class Payment(Base):
         SQLEnum(PaymentStatus), default=PaymentStatus.PENDING, nullable=False
     )
     invoice_payload: Mapped[str] = mapped_column(String, nullable=False)
-    telegram_payment_charge_id: Mapped[str] = mapped_column(
-        String(128),
-        unique=True,
-        nullable=True,
-    )
-    provider_payment_charge_id: Mapped[str] = mapped_column(
-        String(128),
-        unique=True,
-        nullable=True,
-    )
+    # Уникальность по всей таблице недоступна для партиций: повторную доставку платежа
+    # отсекает блокировка строки в PaymentService.process_success
+    telegram_payment_charge_id: Mapped[str] = mapped_column(String(128), nullable=True)
+    provider_payment_charge_id: Mapped[str] = mapped_column(String(128), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.timezone("utc", func.now()), nullable=False
+        DateTime(timezone=True),
+        server_default=func.timezone("utc", func.now()),
+        primary_key=True,
+        nullable=False,
     )
     completed_at: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True),
@@ -56,8 +73,10 @@ class Payment(Base):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship("User", back_populates="payments", lazy="selectin")
-    tariff: Mapped["Tariff"] = relationship("Tariff", back_populates="payments", lazy="selectin")
+    user: Mapped["User"] = relationship("User", back_populates="payments", lazy="raise_on_sql")
+    tariff: Mapped["Tariff"] = relationship(
+        "Tariff", back_populates="payments", lazy="raise_on_sql"
+    )
 
     def __repr__(self) -> str:
         return (
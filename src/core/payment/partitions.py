@@ -0,0 +1,190 @@
+# src/core/payment/partitions.py
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from src.config import settings
+from src.database import session_factory
+
+logger = logging.getLogger(__name__)
+
+PARTITION_RE = re.compile(r"^payments_p(\d{4})_(\d{2})$")
+# Принимает платежи месяцев без своей партиции, чтобы вставка не падала,
+# если worker не успел создать партицию; ensure_partitions переносит их в партиции месяцев
+DEFAULT_PARTITION = "payments_default"
+
+
+def is_partition_name(name: str) -> bool:
+    return PARTITION_RE.match(name) is not None
+
+
+def partition_name(month: date) -> str:
+    return f"payments_p{month:%Y_%m}"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def run_partition_maintenance() -> None:
+    """
+    Периодическая задача worker: создает партиции payments на будущие месяцы
+    и архивирует старые.
+    """
+    try:
+        async with session_factory() as session:
+            created = await ensure_partitions(session)
+            await session.commit()
+        if created:
+            logger.info(f"Created payments partitions: {created}")
+
+        if settings.PAYMENT_ARCHIVE_AFTER_MONTHS > 0:
+            current = datetime.now(timezone.utc).date().replace(day=1)
+            archived = await archive_partitions(
+                add_months(current, -settings.PAYMENT_ARCHIVE_AFTER_MONTHS),
+                Path(settings.PAYMENT_ARCHIVE_DIR),
+            )
+            if archived:
+                logger.info(f"Archived payments partitions to {[str(p) for p in archived]}")
+    except Exception as e:
+        logger.exception(f"Unhandled exception in run_partition_maintenance: {e}")
+
+
+async def ensure_partitions(
+    conn: Union[AsyncSession, AsyncConnection],
+    today: Optional[date] = None,
+    months_ahead: Optional[int] = None,
+) -> List[str]:
+    """
+    Создает недостающие партиции с текущего месяца на months_ahead месяцев вперед,
+    а также партиции месяцев, платежи которых попали в DEFAULT-партицию, и переносит
+    эти платежи. Создает DEFAULT-партицию, если ее нет.
+    Границы месяцев — по UTC. Транзакцией управляет вызывающий код.
+
+    Returns:
+        List[str]: имена созданных партиций
+    """
+    if months_ahead is None:
+        months_ahead = settings.PAYMENT_PARTITIONS_AHEAD_MONTHS
+    current = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    created = []
+    if not await _default_partition_exists(conn):
+        await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF payments DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+
+    existing = await _partition_tables(conn)
+    months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    months.update(await _default_partition_months(conn))
+    for month in sorted(months):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        await _create_partition(conn, month)
+        created.append(name)
+    return created
+
+
+async def archive_partitions(before: date, directory: Path) -> List[Path]:
+    """
+    Архивирует партиции месяцев раньше before: отсоединяет партицию от payments,
+    выгружает ее в directory/<партиция>.csv.gz и удаляет таблицу.
+
+    Отсоединение коммитится отдельно, чтобы не держать блокировку payments на время
+    выгрузки. Отсоединенная, но не выгруженная таблица подхватывается следующим запуском.
+
+    Returns:
+        List[Path]: созданные файлы архива
+    """
+    async with session_factory() as session:
+        tables = await _partition_tables(session)
+
+    archived = []
+    for name, attached in sorted(tables.items()):
+        year, month = PARTITION_RE.match(name).groups()
+        if date(int(year), int(month), 1) >= before:
+            continue
+        async with session_factory() as session:
+            if attached:
+                await session.execute(text(f"ALTER TABLE payments DETACH PARTITION {name}"))
+                await session.commit()
+            path = await _export_table(session, name, directory)
+            await session.execute(text(f"DROP TABLE {name}"))
+            await session.commit()
+        archived.append(path)
+    return archived
+
+
+async def _create_partition(conn: Union[AsyncSession, AsyncConnection], month: date) -> None:
+    """
+    Создает партицию месяца и переносит в нее платежи этого месяца из DEFAULT-партиции.
+    CREATE TABLE ... PARTITION OF упал бы на таких строках, поэтому таблица создается
+    отдельно, заполняется и подключается через ATTACH PARTITION.
+    """
+    name = partition_name(month)
+    start = f"'{month} 00:00:00+00'"
+    end = f"'{add_months(month, 1)} 00:00:00+00'"
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE payments)"))
+    await conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE created_at >= {start} AND created_at < {end} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        )
+    )
+    await conn.execute(
+        text(f"ALTER TABLE payments ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})")
+    )
+
+
+async def _default_partition_exists(conn: Union[AsyncSession, AsyncConnection]) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION})
+    return result.scalar() is not None
+
+
+async def _default_partition_months(conn: Union[AsyncSession, AsyncConnection]) -> List[date]:
+    """Месяцы (по UTC) платежей, попавших в DEFAULT-партицию."""
+    result = await conn.execute(
+        text(
+            "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+            f"FROM {DEFAULT_PARTITION}"
+        )
+    )
+    return list(result.scalars().all())
+
+
+async def _partition_tables(conn: Union[AsyncSession, AsyncConnection]) -> Dict[str, bool]:
+    """Таблицы партиций payments текущей схемы: имя -> подключена ли к payments."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, i.inhrelid IS NOT NULL "
+            "FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+            "WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace "
+            "AND c.relname LIKE 'payments\\_p%'"
+        )
+    )
+    return {name: attached for name, attached in result.all() if is_partition_name(name)}
+
+
+async def _export_table(session: AsyncSession, name: str, directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.csv.gz"
+    tmp_path = path.with_name(f"{path.name}.tmp")
+
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    with gzip.open(tmp_path, "wb") as archive:
+
+        async def write(chunk: bytes) -> None:
+            archive.write(chunk)
+
+        await raw.driver_connection.copy_from_table(name, output=write, format="csv", header=True)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from src.config import settings
+
+VERSION = 1
+# версия, id платежа, id пользователя, id тарифа, сумма в копейках, created_at в микросекундах
+BODY = struct.Struct(">BQQIIq")
+SIGNATURE_LENGTH = 16
+# 49 байт в base64url — 66 символов при лимите Telegram в 128 байт
+PAYLOAD_LENGTH = len(base64.urlsafe_b64encode(bytes(BODY.size + SIGNATURE_LENGTH)))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass(frozen=True)
+class InvoicePayload:
+    payment_id: int
+    user_id: int
+    tariff_id: int
+    # Сумма в минимальных единицах валюты, как total_amount у Telegram
+    total_amount: int
+    # Ключ партиции платежа
+    created_at: datetime
+
+
+class InvoicePayloadCodec:
+    """
+    Payload инвойса, подписанный HMAC-SHA256: по нему pre-checkout проверяет
+    пользователя и сумму, а successful_payment находит платеж без обращения к БД и FSM.
+    """
+
+    def __init__(self, key: bytes):
+        self._key = key
+
+    def sign(self, payload: InvoicePayload) -> str:
+        body = BODY.pack(
+            VERSION,
+            payload.payment_id,
+            payload.user_id,
+            payload.tariff_id,
+            payload.total_amount,
+            (payload.created_at - EPOCH) // MICROSECOND,
+        )
+        return base64.urlsafe_b64encode(body + self._signature(body)).decode()
+
+    def verify(self, raw: str) -> Optional[InvoicePayload]:
+        """
+        Возвращает данные payload или None, если строка не подписана этим ключом
+        (в том числе payload инвойсов старого формата).
+        """
+        if len(raw) != PAYLOAD_LENGTH:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(raw)
+        except (binascii.Error, ValueError):
+            return None
+        body, signature = data[: BODY.size], data[BODY.size :]
+        if not hmac.compare_digest(signature, self._signature(body)):
+            return None
+        version, payment_id, user_id, tariff_id, total_amount, micros = BODY.unpack(body)
+        if version != VERSION:
+            return None
+        return InvoicePayload(
+            payment_id=payment_id,
+            user_id=user_id,
+            tariff_id=tariff_id,
+            total_amount=total_amount,
+            created_at=EPOCH + micros * MICROSECOND,
+        )
+
+    def _signature(self, body: bytes) -> bytes:
+        return hmac.new(self._key, body, hashlib.sha256).digest()[:SIGNATURE_LENGTH]
+
+
+invoice_payload_codec = InvoicePayloadCodec(
+    (settings.INVOICE_PAYLOAD_SECRET or settings.BOT_TOKEN).encode()
+)
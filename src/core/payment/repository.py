@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
+from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import func, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.payment.models import Payment, PaymentStatus
@@ -10,18 +11,30 @@ class PaymentRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    async def next_id(self) -> int:
+        """Резервирует id платежа до вставки, чтобы подписать им payload инвойса."""
+        result = await self.session.execute(select(func.nextval("payments_id_seq")))
+        return result.scalar_one()
+
     async def create(
-        self, user_id: int, tariff_id: int, amount: int, invoice_payload: str
+        self,
+        user_id: int,
+        tariff_id: int,
+        amount: int,
+        invoice_payload: str,
+        id: Optional[int] = None,
+        created_at: Optional[datetime] = None,
     ) -> Payment:
         payment = Payment(
+            id=id,
             user_id=user_id,
             tariff_id=tariff_id,
             amount=amount,
             invoice_payload=invoice_payload,
+            created_at=created_at,
         )
         self.session.add(payment)
         await self.session.flush()
-        await self.session.refresh(payment)
         return payment
 
     async def update_status(
@@ -39,12 +52,62 @@ class PaymentRepository:
         self.session.add(payment)
         await self.session.flush()
 
-    async def get_by_payload(self, payload: str) -> Payment | None:
+    async def cancel_stale(self, created_before: datetime, limit: int) -> list[int]:
+        """
+        Переводит в CANCELED пачку PENDING-платежей, созданных раньше created_before.
+        Строки, заблокированные обработкой оплаты, пропускаются.
+        """
+        stale = (
+            select(Payment.id, Payment.created_at)
+            .where(Payment.status == PaymentStatus.PENDING, Payment.created_at < created_before)
+            .order_by(Payment.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(
+            update(Payment)
+            .where(tuple_(Payment.id, Payment.created_at).in_(stale))
+            .values(status=PaymentStatus.CANCELED)
+            .returning(Payment.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars().all())
+
+    async def get_by_payload(
+        self, payload: str, created_after: Optional[datetime] = None
+    ) -> Payment | None:
+        """
+        created_after отсекает партиции месяцев до него, без него просматриваются все.
+        """
         query = select(Payment).where(Payment.invoice_payload == payload)
+        if created_after is not None:
+            query = query.where(Payment.created_at >= created_after)
         payment = await self.session.execute(query)
         return payment.scalar_one_or_none()
 
-    async def get_by_id(self, id: int):
-        query = select(Payment).where(Payment.id == id)
+    async def get_by_id_for_update(
+        self, id: int, created_at: Optional[datetime] = None
+    ) -> Payment | None:
+        """
+        Блокирует платеж до конца транзакции: повторная доставка того же
+        платежа ждет и видит уже обновленный статус.
+        """
+        query = _by_id(id, created_at).with_for_update()
         result = await self.session.execute(query)
         return result.scalar_one_or_none()
+
+    async def get_by_id(self, id: int, created_at: Optional[datetime] = None):
+        query = _by_id(id, created_at)
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none()
+
+
+def _by_id(id: int, created_at: Optional[datetime]):
+    """
+    С created_at (вторая часть первичного ключа) запрос читает одну партицию,
+    без него — индекс каждой партиции.
+    """
+    query = select(Payment).where(Payment.id == id)
+    if created_at is not None:
+        query = query.where(Payment.created_at == created_at)
+    return query
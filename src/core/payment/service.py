@@ -1,12 +1,15 @@
 import logging
-from time import time
-from typing import Any, Dict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.core.payment.models import PaymentStatus
+from src.core.payment.models import Payment, PaymentStatus
+from src.core.payment.payload import InvoicePayload, invoice_payload_codec
 from src.core.payment.repository import PaymentRepository
+from src.core.subscription.models import Subscription
 from src.core.subscription.service import SubscriptionService
+from src.core.tariff.catalog import tariff_catalog
 from src.core.tariff.repository import TariffRepository
 from src.database import session_factory
 from src.exceptions import (
@@ -23,6 +26,7 @@ class PaymentService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.tariff_repo = TariffRepository(session)
+        self.pay_repo = PaymentRepository(session)
         self.sub_service = SubscriptionService(session)
 
     async def create_invoice(
@@ -45,18 +49,34 @@ class PaymentService:
             PaymentException: При других ошибках создания инвойса
         """
         try:
-            tariff = await self.tariff_repo.get_by_id(tariff_id)
+            tariff = await tariff_catalog.get_by_id(tariff_id, self.tariff_repo)
             if not tariff:
                 logger.warning("User %s request non-existent tariff %s", user_id, tariff_id)
                 raise TariffNotFoundException
             amount = int(tariff.price)
-            payload = f"{user_id}_{tariff_id}_{int(time())}"
 
             # Создание отдельной сессии и коммита чтобы точно создать потенциальный платеж
             async with session_factory() as pay_sess:
                 pay_repo = PaymentRepository(pay_sess)
+                # id и created_at известны до вставки и входят в подписанный payload
+                payment_id = await pay_repo.next_id()
+                created_at = datetime.now(timezone.utc)
+                payload = invoice_payload_codec.sign(
+                    InvoicePayload(
+                        payment_id=payment_id,
+                        user_id=user_id,
+                        tariff_id=tariff_id,
+                        total_amount=amount * 100,
+                        created_at=created_at,
+                    )
+                )
                 payment = await pay_repo.create(
-                    user_id=user_id, tariff_id=tariff_id, invoice_payload=payload, amount=amount
+                    user_id=user_id,
+                    tariff_id=tariff_id,
+                    invoice_payload=payload,
+                    amount=amount,
+                    id=payment_id,
+                    created_at=created_at,
                 )
                 await pay_sess.commit()
                 logger.info(
@@ -68,6 +88,7 @@ class PaymentService:
                 )
             return {
                 "payment_id": payment.id,
+                "created_at": payment.created_at,
                 "payload": payload,
                 "amount": amount,
                 "duration_days": tariff.duration_days,
@@ -84,14 +105,25 @@ class PaymentService:
         payment_id: int,
         telegram_charge_id: str,
         provider_charge_id: str,
+        created_at: Optional[datetime] = None,
     ):
         """
-        Обрабатывает успешный платеж по payment_id: обновляет статус, создает/продлевает подписку.
+        Обрабатывает успешный платеж по payment_id в транзакции сессии хендлера:
+        блокирует строку платежа, переводит его в SUCCESS и создает/продлевает подписку.
+        Статус платежа и подписка коммитятся вместе.
+
+        Подписка применяется в savepoint. Если это не удалось, откатывается только она,
+        а платеж коммитится со статусом PAID и charge id: списание не теряется,
+        sweeper его не отменяет, а повторная обработка того же charge применит подписку.
+
+        Повторная доставка того же telegram_charge_id не продлевает подписку второй раз,
+        а возвращает ее текущее состояние.
 
         Args:
             payment_id: ID платежа
             telegram_charge_id: ID платежа в Telegram
             provider_charge_id: ID платежа у провайдера
+            created_at: время создания платежа из инвойса; с ним поиск идет по одной партиции
 
         Returns:
             tuple: (action, end_datetime, vpn_key)
@@ -102,38 +134,84 @@ class PaymentService:
             PaymentException: При других ошибках обработки платежа
         """
         try:
-            # Создание отдельной сессии для успешного платежа (иначе в middleware может быть откат)
-            async with session_factory() as pay_sess:
-                pay_repo = PaymentRepository(pay_sess)
-                payment = await pay_repo.get_by_id(payment_id)
-                if not payment:
-                    logger.error("Payment not found: id=%s", payment_id)
-                    raise PaymentNotFoundException(f"Payment {payment_id} not found")
-                await pay_repo.update_status(
-                    payment,
-                    PaymentStatus.SUCCESS,
-                    telegram_charge_id=telegram_charge_id,
-                    provider_charge_id=provider_charge_id,
+            payment = await self.pay_repo.get_by_id_for_update(payment_id, created_at)
+            if not payment:
+                logger.error("Payment not found: id=%s", payment_id)
+                raise PaymentNotFoundException(f"Payment {payment_id} not found")
+
+            paid = payment.status in (PaymentStatus.PAID, PaymentStatus.SUCCESS)
+            if paid and payment.telegram_payment_charge_id != telegram_charge_id:
+                logger.error(
+                    "Payment %s is already paid by charge %s, got charge %s",
+                    payment_id,
+                    payment.telegram_payment_charge_id,
+                    telegram_charge_id,
+                )
+                raise PaymentException(
+                    f"Payment {payment_id} is already paid by charge "
+                    f"{payment.telegram_payment_charge_id}, got {telegram_charge_id}"
                 )
-                await pay_sess.commit()
-                logger.info("Payment marked SUCCESS: id=%s", payment.id)
-
-            user_id = payment.user_id
-            tariff_id = payment.tariff_id
 
-            sub, key = await self.sub_service.create_or_extend_subscription(user_id, tariff_id)
+            if payment.status == PaymentStatus.SUCCESS:
+                logger.info(
+                    "Payment %s already processed, charge %s", payment_id, telegram_charge_id
+                )
+                sub = await self.sub_service.sub_repo.get_by_user_id(payment.user_id)
+                # Продление увеличивает cnt_payments, создание — нет
+                action = "создана" if sub.cnt_payments == 0 else "продлена"
+                return action, sub.end_date, sub.vpn_key
 
-            existing_sub = await self.sub_service.sub_repo.get_by_user_id(user_id)
-            action = "продлена" if existing_sub else "создана"
+            sub, key, created = await self._apply_payment(
+                payment, telegram_charge_id, provider_charge_id
+            )
+            logger.info("Payment marked SUCCESS: id=%s", payment.id)
+            action = "создана" if created else "продлена"
 
             return action, sub.end_date, key
 
         except (PaymentNotFoundException, TariffNotFoundException):
             raise
         except ServiceException:
+            # Платеж сохранен со статусом PAID, charge id нужен поддержке
+            logger.error(
+                "Successful payment %s was not applied: telegram_charge=%s provider_charge=%s",
+                payment_id,
+                telegram_charge_id,
+                provider_charge_id,
+            )
             raise
         except Exception as e:
             logger.exception(
                 f"Unhandled exception in process_success for payment {payment_id}: {e}"
             )
             raise PaymentException(f"Failed to process successful payment {payment_id}: {str(e)}")
+
+    async def _apply_payment(
+        self, payment: Payment, telegram_charge_id: str, provider_charge_id: str
+    ) -> tuple[Subscription, str, bool]:
+        """
+        Создает/продлевает подписку и переводит платеж в SUCCESS в savepoint.
+        При ошибке платеж коммитится со статусом PAID, исключение пробрасывается.
+        """
+        try:
+            async with self.session.begin_nested():
+                result = await self.sub_service.create_or_extend_subscription(
+                    payment.user_id, payment.tariff_id
+                )
+                await self.pay_repo.update_status(
+                    payment,
+                    PaymentStatus.SUCCESS,
+                    telegram_charge_id=telegram_charge_id,
+                    provider_charge_id=provider_charge_id,
+                )
+        except Exception:
+            # Откат savepoint отменил только подписку, списание сохраняется
+            await self.pay_repo.update_status(
+                payment,
+                PaymentStatus.PAID,
+                telegram_charge_id=telegram_charge_id,
+                provider_charge_id=provider_charge_id,
+            )
+            await self.session.commit()
+            raise
+        return result
@@ -0,0 +1,47 @@
+# src/core/payment/sweeper.py
+import logging
+from datetime import datetime, timedelta, timezone
+
+from src.config import settings
+from src.core.payment.repository import PaymentRepository
+from src.database import session_factory
+
+logger = logging.getLogger(__name__)
+
+
+async def run_payment_sweep() -> None:
+    """
+    Периодическая задача worker: отменяет инвойсы, которые так и не были оплачены.
+    """
+    try:
+        cancelled = await cancel_stale_payments()
+        if cancelled:
+            logger.info(f"Payment sweep cancelled {cancelled} stale invoices")
+    except Exception as e:
+        logger.exception(f"Unhandled exception in run_payment_sweep: {e}")
+
+
+async def cancel_stale_payments(now: datetime | None = None) -> int:
+    """
+    Переводит PENDING-платежи старше PAYMENT_PENDING_TTL_HOURS в CANCELED
+    пачками по PAYMENT_SWEEP_BATCH_SIZE, каждая пачка — отдельная транзакция.
+    Если отмененный инвойс все же оплатят, process_success обработает его как обычно.
+
+    Returns:
+        int: количество отмененных платежей
+    """
+    now = now or datetime.now(timezone.utc)
+    created_before = now - timedelta(hours=settings.PAYMENT_PENDING_TTL_HOURS)
+    total = 0
+
+    while True:
+        async with session_factory() as session:
+            cancelled = await PaymentRepository(session).cancel_stale(
+                created_before, settings.PAYMENT_SWEEP_BATCH_SIZE
+            )
+            await session.commit()
+
+        total += len(cancelled)
+        if len(cancelled) < settings.PAYMENT_SWEEP_BATCH_SIZE:
+            break
+    return total
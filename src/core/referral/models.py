@@ -32,10 +32,10 @@ class Referral(Base):
 
     # Relationships
     referrer: Mapped["User"] = relationship(
-        "User", foreign_keys=[referrer_id], back_populates="sent_referrals", lazy="select"
+        "User", foreign_keys=[referrer_id], back_populates="sent_referrals", lazy="raise_on_sql"
     )
     referred: Mapped["User"] = relationship(
-        "User", foreign_keys=[referred_id], back_populates="received_referral", lazy="select"
+        "User", foreign_keys=[referred_id], back_populates="received_referral", lazy="raise_on_sql"
     )
 
     def __repr__(self) -> str:
@@ -1,7 +1,11 @@
-from sqlalchemy import select
+from typing import Sequence
+
+from sqlalchemy import Row, and_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from src.core.referral.models import Referral
+from src.core.user.models import User
 
 
 class ReferralRepository:
@@ -11,6 +15,12 @@ class ReferralRepository:
     async def create(self, referrer_id: int, referred_id: int) -> Referral:
         referral = Referral(referrer_id=referrer_id, referred_id=referred_id)
         self.session.add(referral)
+        await self.session.execute(
+            update(User)
+            .where(User.id == referrer_id)
+            .values(referrals_count=User.referrals_count + 1)
+            .execution_options(synchronize_session=False)
+        )
         await self.session.flush()
         return referral
 
@@ -25,3 +35,44 @@ class ReferralRepository:
             select(Referral).where(Referral.referred_id == referred_id)
         )
         return result.scalars().first()
+
+    async def get_stats_page(
+        self,
+        referrer_id: int,
+        limit: int,
+        after: int | None = None,
+        before: int | None = None,
+    ) -> Sequence[Row]:
+        """
+        Одним запросом возвращает данные пригласившего и страницу приглашенных.
+
+        Строки содержат referral_code, referrals_count пригласившего и referral_id,
+        referred_id, username приглашенного (None, если приглашенных на странице нет).
+        Страницы идут по Referral.id: after — следующая страница, before — предыдущая
+        (строки предыдущей страницы возвращаются в обратном порядке).
+        """
+        referred = aliased(User)
+        condition = Referral.referrer_id == User.id
+        order = Referral.id.asc()
+        if after is not None:
+            condition = and_(condition, Referral.id > after)
+        elif before is not None:
+            condition = and_(condition, Referral.id < before)
+            order = Referral.id.desc()
+
+        query = (
+            select(
+                User.referral_code,
+                User.referrals_count,
+                Referral.id.label("referral_id"),
+                Referral.referred_id,
+                referred.username,
+            )
+            .outerjoin(Referral, condition)
+            .outerjoin(referred, referred.id == Referral.referred_id)
+            .where(User.id == referrer_id)
+            .order_by(order)
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return result.all()
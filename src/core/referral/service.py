@@ -3,11 +3,12 @@ import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.referral.repository import ReferralRepository
-from src.core.user.repository import UserRepository
 from src.exceptions import ReferralException, UserNotFoundException
 
 logger = logging.getLogger(__name__)
 
+REFERRALS_PAGE_SIZE = 20
+
 
 class ReferralService:
     """
@@ -17,35 +18,63 @@ class ReferralService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.ref_repo = ReferralRepository(session)
-        self.user_repo = UserRepository(session)
 
-    async def get_info(self, user_id: int, bot_username: str) -> dict:
+    async def get_info(
+        self,
+        user_id: int,
+        bot_username: str,
+        after: int | None = None,
+        before: int | None = None,
+    ) -> dict:
+        """
+        Возвращает реферальную ссылку, число приглашенных и страницу их имен.
+
+        Args:
+            user_id: ID пользователя
+            bot_username: username бота для ссылки
+            after: курсор следующей страницы (id последнего реферала предыдущей)
+            before: курсор предыдущей страницы (id первого реферала текущей)
+
+        Returns:
+            dict: ref_link, total, referred_usernames, next_cursor, prev_cursor
+
+        Raises:
+            UserNotFoundException: Если пользователь не найден
+        """
         try:
-            # Проверяем, что пользователь существует
-            user = await self.user_repo.get_by_id(user_id)
-            if not user:
+            # Лишняя строка показывает, есть ли еще страница в направлении запроса
+            rows = await self.ref_repo.get_stats_page(
+                user_id, REFERRALS_PAGE_SIZE + 1, after=after, before=before
+            )
+            if not rows:
                 logger.info(f"UserNotFound in get_info for user {user_id}")
                 raise UserNotFoundException(f"User {user_id} not found")
 
-            # Формируем ссылку
-            ref_link = f"https://t.me/{bot_username}?start={user.referral_code}"
-
-            # Получаем статистику
-            referrals = await self.ref_repo.get_by_referrer_id(user_id)
-            total = len(referrals)
-            usernames: list[str] = []
-            for ref in referrals:
-                try:
-                    referred_user = await self.user_repo.get_by_id(ref.referred_id)
-                    if referred_user and referred_user.username:
-                        usernames.append(f"@{referred_user.username}")
-                    else:
-                        usernames.append(str(ref.referred_id))
-                except Exception as e:
-                    logger.warning(f"Failed to fetch referred user {ref.referred_id}: {e}")
-                    continue
-
-            return {"ref_link": ref_link, "total": total, "referred_usernames": usernames}
+            ref_link = f"https://t.me/{bot_username}?start={rows[0].referral_code}"
+            page = [row for row in rows if row.referral_id is not None]
+            has_more = len(page) > REFERRALS_PAGE_SIZE
+            page = page[:REFERRALS_PAGE_SIZE]
+            if before is not None:
+                page.reverse()
+
+            next_cursor = prev_cursor = None
+            if page and before is None:
+                next_cursor = page[-1].referral_id if has_more else None
+                prev_cursor = page[0].referral_id if after is not None else None
+            elif page:
+                next_cursor = page[-1].referral_id
+                prev_cursor = page[0].referral_id if has_more else None
+
+            usernames = [
+                f"@{row.username}" if row.username else str(row.referred_id) for row in page
+            ]
+            return {
+                "ref_link": ref_link,
+                "total": rows[0].referrals_count,
+                "referred_usernames": usernames,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+            }
 
         except UserNotFoundException:
             raise
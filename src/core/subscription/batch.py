@@ -0,0 +1,73 @@
+# src/core/subscription/batch.py
+import logging
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Sequence
+
+from src.config import settings
+from src.core.outbox.repository import KeyRef
+from src.core.subscription.repository import SubscriptionRepository
+from src.database import session_factory
+from src.notifications.queue import MessagePriority, message_queue
+
+logger = logging.getLogger(__name__)
+
+
+def key_refs(subs: Sequence[Any]) -> list[KeyRef]:
+    """
+    Ключи Outline подписок для постановки удаления в outbox.
+
+    Args:
+        subs: подписки или строки с полями outline_key_id, outline_server
+    """
+    return [(str(sub.outline_key_id), sub.outline_server) for sub in subs if sub.outline_key_id]
+
+
+def notify_claim_ttl() -> timedelta:
+    return timedelta(minutes=settings.NOTIFY_CLAIM_TTL_MINUTES)
+
+
+def notification_pending(sub: Any, now: datetime) -> bool:
+    """
+    Нужно ли ставить в очередь уведомление по подписке: она активна, уведомление
+    о текущем end_date не отправлено и не стоит в очереди дольше NOTIFY_CLAIM_TTL_MINUTES.
+    """
+    return (
+        sub.is_active
+        and sub.end_date > now
+        and sub.notified_end_date != sub.end_date
+        and (sub.notify_claimed_at is None or sub.notify_claimed_at <= now - notify_claim_ttl())
+    )
+
+
+async def mark_notified(sub_id: int, end_date: datetime) -> None:
+    """Отмечает уведомление об окончании end_date отправленным, вызывается очередью."""
+    async with session_factory() as session:
+        await SubscriptionRepository(session).mark_notified(sub_id, end_date)
+        await session.commit()
+
+
+def send_expiry_notifications(subs: Sequence[Any]) -> list[int]:
+    """
+    Ставит уведомления о скором окончании подписки в очередь исходящих сообщений.
+    notified_end_date заполняется после отправки; вызывающий код отмечает принятые
+    уведомления через claim_notifications в своей транзакции.
+
+    Args:
+        subs: подписки или строки с полями id, user_id, end_date
+
+    Returns:
+        list[int]: ID подписок, уведомление по которым принято очередью
+    """
+    from src.core.subscription.service import EXPIRY_NOTIFICATION_TEXT
+
+    return [
+        sub.id
+        for sub in subs
+        if message_queue.enqueue(
+            sub.user_id,
+            EXPIRY_NOTIFICATION_TEXT,
+            MessagePriority.REMINDER,
+            on_done=partial(mark_notified, sub.id, sub.end_date),
+        )
+    ]
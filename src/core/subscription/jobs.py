@@ -1,13 +1,28 @@
 # src/core/subscription/jobs.py
 import logging
-from datetime import datetime
-
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from apscheduler.jobstores.base import JobLookupError
+
+from src.config import settings
+from src.core.outbox.repository import OutboxRepository
+from src.core.subscription.batch import (
+    key_refs,
+    notification_pending,
+    notify_claim_ttl,
+    send_expiry_notifications,
+)
+from src.core.subscription.repository import SubscriptionRepository
 from src.core.subscription.scheduler import scheduler
 from src.database import session_factory
 from src.exceptions import ServiceException
 
 logger = logging.getLogger(__name__)
 
+RETRY_DELAY = timedelta(minutes=1)
+
 
 async def _run_deactivate(sub_id: int):
 
@@ -101,33 +116,137 @@ def reschedule_notification(sub_id: int, new_date: datetime):
         )
 
 
+async def _deactivate_batch(sub_ids: list[int]) -> list[int]:
+    """
+    Деактивирует пачку подписок в одной сессии одним UPDATE, удаление ключей Outline
+    ставится в outbox в той же транзакции. Подписки, строки которых заняты другой
+    транзакцией (SKIP LOCKED), не обрабатываются, и задачи по ним повторяются.
+
+    Returns:
+        list[int]: ID подписок, задачи по которым нужно повторить
+    """
+    now = datetime.now(timezone.utc)
+    async with session_factory() as session:
+        repo = SubscriptionRepository(session)
+        locked = await repo.get_by_ids(sub_ids, for_update=True)
+        subs = [sub for sub in locked if sub.is_active and sub.end_date <= now]
+        await OutboxRepository(session).enqueue_key_deletions(key_refs(subs))
+        await repo.deactivate_many([sub.id for sub in subs])
+        # Не вернулись заблокированные и удаленные подписки; повторять нужно только первые
+        skipped = set(sub_ids) - {sub.id for sub in locked}
+        busy = await repo.get_existing_ids(list(skipped))
+        await session.commit()
+    return [sub_id for sub_id in sub_ids if sub_id in busy]
+
+
+async def _notify_batch(sub_ids: list[int]) -> list[int]:
+    """
+    Ставит в очередь уведомления по пачке подписок в одной сессии. По принятым
+    уведомлениям ставится проверочная задача на момент истечения claim: если
+    уведомление так и не отправлено, она поставит его в очередь снова.
+
+    Returns:
+        list[int]: ID подписок, уведомление по которым не принято очередью
+    """
+    now = datetime.now(timezone.utc)
+    async with session_factory() as session:
+        repo = SubscriptionRepository(session)
+        subs = [
+            sub
+            for sub in await repo.get_by_ids(sub_ids, for_update=True)
+            if notification_pending(sub, now)
+        ]
+        done = send_expiry_notifications(subs)
+        await repo.claim_notifications(done, now)
+        await session.commit()
+    for sub_id in done:
+        reschedule_notification(sub_id, now + notify_claim_ttl())
+    accepted = set(done)
+    return [sub.id for sub in subs if sub.id not in accepted]
+
+
+async def _run_due_jobs(
+    prefix: str, run_batch: Callable[[list[int]], Awaitable[list[int]]]
+) -> tuple[int, int]:
+    """
+    Выполняет наступившие задачи с префиксом prefix пачками по JOBS_BATCH_SIZE
+    (пачки выполняются последовательно) и удаляет выполненные из планировщика.
+    Задачи, которые не удалось выполнить, остаются в планировщике и повторяются им
+    через RETRY_DELAY. Задачи, которые пачка перепланировала сама или которые уже
+    удалены, не трогаются.
+    Логирует пропускную способность каждой пачки.
+
+    Returns:
+        tuple: (успешно, с ошибкой) по всем пачкам
+    """
+    now = datetime.now(timezone.utc)
+    jobs = [
+        job
+        for job in scheduler.get_jobs()
+        if job.id.startswith(prefix) and job.next_run_time and job.next_run_time <= now
+    ]
+    total_ok = total_failed = 0
+    for start in range(0, len(jobs), settings.JOBS_BATCH_SIZE):
+        chunk = jobs[start : start + settings.JOBS_BATCH_SIZE]
+        started = time.perf_counter()
+        try:
+            failed = set(await run_batch([job.args[0] for job in chunk]))
+        except Exception as e:
+            logger.exception(f"Unhandled exception in {prefix} batch: {e}")
+            failed = {job.args[0] for job in chunk}
+        retry_at = datetime.now(timezone.utc) + RETRY_DELAY
+        for job in chunk:
+            try:
+                if job.args[0] in failed:
+                    # Без misfire_grace_time задача не пропадет, если планировщик еще на паузе
+                    scheduler.modify_job(job.id, next_run_time=retry_at, misfire_grace_time=None)
+                    continue
+                # Задачу могли удалить или перепланировать после get_jobs()
+                current = scheduler.get_job(job.id)
+                if current is not None and current.next_run_time == job.next_run_time:
+                    scheduler.remove_job(job.id)
+            except JobLookupError:
+                pass
+        elapsed = time.perf_counter() - started
+        ok = len(chunk) - len(failed)
+        total_ok += ok
+        total_failed += len(failed)
+        logger.info(
+            f"Batch {prefix}*: jobs={len(chunk)} ok={ok} failed={len(failed)} "
+            f"elapsed={elapsed:.2f}s throughput={len(chunk) / max(elapsed, 1e-6):.1f} jobs/s"
+        )
+    return total_ok, total_failed
+
+
 async def run_all_deactivations():
     """
-    Выполнить все задачи деактивации, запланированные в APScheduler,
-    и удалить их из планировщика после выполнения.
+    Выполнить все наступившие задачи деактивации, запланированные в APScheduler,
+    последовательными пачками, и удалить их из планировщика. Удаление ключей Outline
+    выполняет relay outbox с параллельностью OUTBOX_CONCURRENCY.
     """
     try:
-        for job in list(scheduler.get_jobs()):
-            if job.id.startswith("deactivate_"):
-                sub_id = job.args[0]
-                await _run_deactivate(sub_id)
-                # Удаляем задачу после выполнения
-                scheduler.remove_job(job.id)
+        return await _run_due_jobs("deactivate_", _deactivate_batch)
     except Exception as e:
         logger.exception(f"Unhandled exception in run_all_deactivations: {e}")
 
 
 async def run_all_notifications():
     """
-    Выполнить все задачи уведомлений, запланированные в APScheduler,
-    и удалить их из планировщика после выполнения.
+    Выполнить все наступившие задачи уведомлений, запланированные в APScheduler,
+    последовательными пачками, и удалить их из планировщика. Отправку ограничивает
+    очередь исходящих сообщений.
     """
     try:
-        for job in list(scheduler.get_jobs()):
-            if job.id.startswith("notify_"):
-                sub_id = job.args[0]
-                await _run_notify(sub_id)
-                # Удаляем задачу после выполнения
-                scheduler.remove_job(job.id)
+        return await _run_due_jobs("notify_", _notify_batch)
     except Exception as e:
         logger.exception(f"Unhandled exception in run_all_notifications: {e}")
+
+
+async def catch_up_and_resume():
+    """
+    Догоняет задачи, просроченные за время простоя, и запускает обработку
+    остальных задач планировщиком. Планировщик должен быть запущен с paused=True.
+    """
+    await run_all_notifications()
+    await run_all_deactivations()
+    scheduler.resume()
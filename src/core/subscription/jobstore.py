@@ -0,0 +1,108 @@
+# src/core/subscription/jobstore.py
+import logging
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindSQLAlchemyJobStore(MemoryJobStore):
+    """
+    Хранилище задач APScheduler, которое не блокирует event loop.
+
+    Все чтения (get_job, get_due_jobs, get_next_run_time) обслуживаются из памяти,
+    а запись в таблицу SQLAlchemyJobStore выполняется в отдельном потоке
+    с собственным небольшим пулом соединений. Один поток сохраняет порядок операций.
+    Задачи из таблицы загружаются в память один раз при старте планировщика.
+    """
+
+    def __init__(self, url: str, tablename: str = "apscheduler_jobs", pool_size: int = 2):
+        super().__init__()
+        self._persistent = SQLAlchemyJobStore(
+            url=url,
+            tablename=tablename,
+            engine_options={"pool_size": pool_size, "max_overflow": 0, "pool_pre_ping": True},
+        )
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._persistent.start(scheduler, alias)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobstore")
+        for job in self._persistent.get_all_jobs():
+            super().add_job(job)
+        logger.info("Loaded %d scheduler jobs into memory", len(self._jobs))
+
+    def shutdown(self):
+        # Дожидаемся записи всех накопленных изменений
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._persistent.shutdown()
+        # MemoryJobStore.shutdown() вызывает remove_all_jobs() и стер бы таблицу
+        self._jobs = []
+        self._jobs_index = {}
+
+    def add_job(self, job):
+        super().add_job(job)
+        row = self._serialize(job)
+        self._submit(self._upsert, row)
+
+    def update_job(self, job):
+        super().update_job(job)
+        row = self._serialize(job)
+        self._submit(self._upsert, row)
+
+    def remove_job(self, job_id):
+        super().remove_job(job_id)
+        self._submit(self._delete, job_id)
+
+    def remove_all_jobs(self):
+        super().remove_all_jobs()
+        self._submit(self._delete_all)
+
+    def _serialize(self, job) -> dict:
+        # Снимок состояния делается в потоке event loop, чтобы поток записи
+        # не читал задачу, которую планировщик в это время изменяет
+        return {
+            "id": job.id,
+            "next_run_time": datetime_to_utc_timestamp(job.next_run_time),
+            "job_state": pickle.dumps(job.__getstate__(), self._persistent.pickle_protocol),
+        }
+
+    def _submit(self, fn, *args) -> None:
+        if self._executor is None:
+            fn(*args)
+            return
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Failed to persist scheduler job change: %s", exc)
+
+    def _upsert(self, row: dict) -> None:
+        table = self._persistent.jobs_t
+        with self._persistent.engine.begin() as connection:
+            result = connection.execute(
+                table.update()
+                .values(next_run_time=row["next_run_time"], job_state=row["job_state"])
+                .where(table.c.id == row["id"])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+    def _delete(self, job_id: str) -> None:
+        table = self._persistent.jobs_t
+        with self._persistent.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.id == job_id))
+
+    def _delete_all(self) -> None:
+        with self._persistent.engine.begin() as connection:
+            connection.execute(self._persistent.jobs_t.delete())
@@ -30,10 +30,21 @@ class Subscription(Base):
     )
     vpn_key: Mapped[str] = mapped_column(String(100), nullable=False)
     outline_key_id: Mapped[str] = mapped_column(String(100), nullable=True)
+    # Имя сервера кластера Outline, на котором создан ключ (NULL — сервер по умолчанию)
+    outline_server: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     end_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     is_active: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False, index=True, server_default=sa.true()
     )
+    # end_date, о скором окончании которого пользователь уже уведомлен
+    notified_end_date: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Когда уведомление поставлено в очередь: пока не истек NOTIFY_CLAIM_TTL_MINUTES,
+    # его не ставят повторно, а notified_end_date заполняется только после отправки
+    notify_claimed_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
     cnt_payments: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     updated_at: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True),
@@ -47,8 +58,10 @@ class Subscription(Base):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship("User", back_populates="subscriptions", lazy="select")
-    tariff: Mapped["Tariff"] = relationship("Tariff", back_populates="subscriptions", lazy="select")
+    user: Mapped["User"] = relationship("User", back_populates="subscriptions", lazy="raise_on_sql")
+    tariff: Mapped["Tariff"] = relationship(
+        "Tariff", back_populates="subscriptions", lazy="raise_on_sql"
+    )
 
     def __repr__(self) -> str:
         return (
@@ -0,0 +1,165 @@
+# src/core/subscription/reconcile.py
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Sequence, Set
+
+from sqlalchemy import Row
+
+from src.config import settings
+from src.core.outbox.repository import OutboxRepository
+from src.core.subscription.repository import SubscriptionRepository
+from src.database import session_factory
+from src.outline.pool import POOL_KEY_PREFIX
+from src.outline.service import OutlineManager
+
+logger = logging.getLogger(__name__)
+
+# Сколько ID попадает в лог, остальное — только в счетчиках
+REPORT_SAMPLE_SIZE = 20
+
+
+@dataclass
+class ReconcileReport:
+    server: str
+    matched: int = 0
+    pooled: int = 0
+    # Активные подписки, ключа которых нет на сервере
+    missing_keys: int = 0
+    missing_sample: List[int] = field(default_factory=list)
+    # Ключи на сервере без активной подписки
+    orphan_keys: int = 0
+    orphan_sample: List[str] = field(default_factory=list)
+    # Удаления, поставленные в outbox (только при RECONCILE_AUTOFIX)
+    enqueued: int = 0
+
+
+async def run_reconciliation() -> None:
+    """
+    Периодическая задача worker: сверяет ключи каждого сервера Outline с подписками.
+    """
+    outline = OutlineManager()
+    for server in outline.servers:
+        try:
+            report = await reconcile_server(server, outline, settings.RECONCILE_AUTOFIX)
+        except Exception as e:
+            logger.exception(f"Reconciliation of Outline server {server} failed: {e}")
+            continue
+        if report.missing_keys or report.orphan_keys:
+            logger.warning(
+                f"Outline {server}: {report.missing_keys} subscriptions without key "
+                f"(e.g. {report.missing_sample}), {report.orphan_keys} keys without "
+                f"subscription (e.g. {report.orphan_sample}), {report.enqueued} queued for deletion"
+            )
+        else:
+            logger.info(f"Outline {server}: {report.matched} keys match subscriptions")
+
+
+async def reconcile_server(
+    server: str, outline: OutlineManager, autofix: bool = False
+) -> ReconcileReport:
+    """
+    Merge join ключей сервера и подписок с ключами на нем, оба потока упорядочены по id ключа.
+    Подписки читаются пачками по RECONCILE_BATCH_SIZE, в памяти держится одна пачка.
+
+    Ключ без подписки (в том числе оставшийся от деактивированной) считается лишним,
+    если по нему в outbox не ждет операция: новые ключи защищены отложенным удалением
+    до коммита подписки. Подписка могла закоммититься уже после чтения своей пачки,
+    поэтому перед постановкой в отчет и outbox лишние ключи еще раз сверяются с подписками.
+    При autofix лишние ключи ставятся в outbox на удаление.
+    Подписки без ключа только попадают в отчет: пользователь оплатил доступ, и выдавать
+    новый ключ автоматически нельзя без уведомления.
+    """
+    report = ReconcileReport(server=server)
+    servers = _server_values(server, outline)
+    orphans: List[str] = []
+
+    keys = iter(await outline.list_key_ids(server))
+    rows = _iter_subscription_keys(servers)
+    key = next(keys, None)
+    row = await anext(rows, None)
+    while key is not None or row is not None:
+        if row is None or (key is not None and key[0] < row.outline_key_id):
+            if key[1].startswith(POOL_KEY_PREFIX):
+                report.pooled += 1
+            else:
+                orphans.append(key[0])
+                if len(orphans) >= settings.RECONCILE_BATCH_SIZE:
+                    await _handle_orphans(report, servers, orphans, autofix)
+                    orphans = []
+            key = next(keys, None)
+        elif key is None or row.outline_key_id < key[0]:
+            if row.is_active:
+                report.missing_keys += 1
+                if len(report.missing_sample) < REPORT_SAMPLE_SIZE:
+                    report.missing_sample.append(row.id)
+            row = await anext(rows, None)
+        else:
+            if row.is_active:
+                report.matched += 1
+            else:
+                orphans.append(key[0])
+            key = next(keys, None)
+            row = await anext(rows, None)
+
+    await _handle_orphans(report, servers, orphans, autofix)
+    return report
+
+
+def _server_values(server: str, outline: OutlineManager) -> List[Optional[str]]:
+    # Подписки, созданные до кластера, хранят пустой сервер — это сервер по умолчанию
+    return [server, None, ""] if server == outline.default_server else [server]
+
+
+async def claimed_key_ids(server: str, key_ids: Sequence[str]) -> Set[str]:
+    """
+    Ключи из key_ids, которые уже выданы: записаны в подписку или защищены
+    отложенным удалением в outbox (подписка с ключом еще не закоммичена).
+    Пул ключей Outline не должен возвращать такие ключи при старте.
+    """
+    servers = _server_values(server, OutlineManager())
+    async with session_factory() as session:
+        used = await SubscriptionRepository(session).get_used_key_ids(servers, key_ids)
+        pending = await OutboxRepository(session).get_pending_key_ids(servers, key_ids)
+    return used | pending
+
+
+async def _iter_subscription_keys(servers: Sequence[Optional[str]]) -> AsyncIterator[Row]:
+    after = None
+    while True:
+        async with session_factory() as session:
+            page = await SubscriptionRepository(session).get_key_page(
+                servers, settings.RECONCILE_BATCH_SIZE, after=after
+            )
+        for row in page:
+            yield row
+        if len(page) < settings.RECONCILE_BATCH_SIZE:
+            return
+        after = page[-1].outline_key_id
+
+
+async def _handle_orphans(
+    report: ReconcileReport,
+    servers: Sequence[Optional[str]],
+    key_ids: List[str],
+    autofix: bool,
+) -> None:
+    if not key_ids:
+        return
+    async with session_factory() as session:
+        repo = OutboxRepository(session)
+        # Порядок важен: коммит подписки отменяет защиту ключа в outbox в той же
+        # транзакции, поэтому после чтения outbox такая подписка уже видна
+        pending = await repo.get_pending_key_ids(servers, key_ids)
+        candidates = [key_id for key_id in key_ids if key_id not in pending]
+        live = await SubscriptionRepository(session).get_used_key_ids(
+            servers, candidates, active_only=True
+        )
+        orphans = [key_id for key_id in candidates if key_id not in live]
+        report.orphan_keys += len(orphans)
+        report.orphan_sample.extend(orphans[: REPORT_SAMPLE_SIZE - len(report.orphan_sample)])
+        if autofix and orphans:
+            enqueued = await repo.enqueue_key_deletions(
+                [(key_id, report.server) for key_id in orphans], reason="reconcile"
+            )
+            await session.commit()
+            report.enqueued += len(enqueued)
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Sequence
 
-from sqlalchemy import select
+from sqlalchemy import Row, case, func, literal_column, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.subscription.models import Subscription
@@ -12,19 +13,100 @@ class SubscriptionRepository:
         self.session = session
 
     async def create(
-        self, user_id: int, tariff_id: int, vpn_key: str, outline_key_id: str, end_date: datetime
+        self,
+        user_id: int,
+        tariff_id: int,
+        vpn_key: str,
+        outline_key_id: str,
+        end_date: datetime,
+        outline_server: str | None = None,
     ) -> Subscription:
         sub = Subscription(
             user_id=user_id,
             tariff_id=tariff_id,
             vpn_key=vpn_key,
             outline_key_id=outline_key_id,
+            outline_server=outline_server,
             end_date=end_date,
         )
         self.session.add(sub)
         await self.session.flush()
         return sub
 
+    async def extend_active(self, user_id: int, duration: timedelta) -> Subscription | None:
+        """
+        Продлевает активную подписку пользователя одним UPDATE ... RETURNING:
+        end_date = GREATEST(end_date, now()) + duration. Ключ VPN не меняется.
+        Возвращает None, если активной подписки нет.
+        """
+        query = (
+            update(Subscription)
+            .where(Subscription.user_id == user_id, Subscription.is_active)
+            .values(
+                end_date=func.greatest(Subscription.end_date, func.now()) + duration,
+                cnt_payments=Subscription.cnt_payments + 1,
+            )
+            .returning(Subscription)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(query)
+        return result.scalars().first()
+
+    async def upsert(
+        self,
+        user_id: int,
+        tariff_id: int,
+        duration: timedelta,
+        vpn_key: str,
+        outline_key_id: str,
+        outline_server: str | None = None,
+    ) -> tuple[Subscription, bool]:
+        """
+        Создает подписку или продлевает существующую одним
+        INSERT ... ON CONFLICT (user_id) DO UPDATE ... RETURNING.
+
+        Неактивная подписка получает переданный ключ. Если подписку успела
+        активировать параллельная транзакция, остается ее ключ, а end_date
+        продлевается от GREATEST(end_date, now()).
+
+        Returns:
+            tuple: (subscription, created) — created=True, если строка вставлена
+        """
+        stmt = insert(Subscription).values(
+            user_id=user_id,
+            tariff_id=tariff_id,
+            vpn_key=vpn_key,
+            outline_key_id=outline_key_id,
+            outline_server=outline_server,
+            end_date=func.now() + duration,
+        )
+        # В DO UPDATE столбцы Subscription — это существующая строка, excluded — новая
+        keep_existing = Subscription.is_active
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Subscription.user_id],
+            set_={
+                "vpn_key": case((keep_existing, Subscription.vpn_key), else_=stmt.excluded.vpn_key),
+                "outline_key_id": case(
+                    (keep_existing, Subscription.outline_key_id),
+                    else_=stmt.excluded.outline_key_id,
+                ),
+                "outline_server": case(
+                    (keep_existing, Subscription.outline_server),
+                    else_=stmt.excluded.outline_server,
+                ),
+                "end_date": func.greatest(Subscription.end_date, func.now()) + duration,
+                "is_active": True,
+                "cnt_payments": Subscription.cnt_payments + 1,
+            },
+        )
+        # xmax = 0 только у только что вставленной строки
+        query = stmt.returning(Subscription, literal_column("xmax = 0")).execution_options(
+            populate_existing=True
+        )
+        result = await self.session.execute(query)
+        subscription, created = result.one()
+        return subscription, created
+
     async def get_by_user_id(self, user_id: int) -> Subscription | None:
         query = select(Subscription).where(Subscription.user_id == user_id)
         subscription = await self.session.execute(query)
@@ -35,6 +117,36 @@ class SubscriptionRepository:
         subscription = await self.session.execute(query)
         return subscription.scalars().first()
 
+    async def get_by_id_for_update(self, sub_id: int) -> Subscription | None:
+        """
+        Блокирует подписку до конца транзакции. Если ее уже обрабатывает
+        другая реплика, возвращает None.
+        """
+        query = (
+            select(Subscription).where(Subscription.id == sub_id).with_for_update(skip_locked=True)
+        )
+        subscription = await self.session.execute(query)
+        return subscription.scalars().first()
+
+    async def get_by_ids(
+        self, sub_ids: Sequence[int], for_update: bool = False
+    ) -> Sequence[Subscription]:
+        query = select(Subscription).where(Subscription.id.in_(sub_ids))
+        if for_update:
+            # Строки, занятые другой репликой, пропускаются
+            query = query.with_for_update(skip_locked=True)
+        result = await self.session.execute(query)
+        return result.scalars().all()
+
+    async def get_existing_ids(self, sub_ids: Sequence[int]) -> set[int]:
+        """ID из sub_ids, подписки с которыми есть в БД (без блокировки строк)."""
+        if not sub_ids:
+            return set()
+        result = await self.session.execute(
+            select(Subscription.id).where(Subscription.id.in_(sub_ids))
+        )
+        return set(result.scalars().all())
+
     async def get_active(self) -> Sequence[Subscription]:
         query = select(Subscription).where(
             Subscription.is_active,
@@ -42,16 +154,136 @@ class SubscriptionRepository:
         result = await self.session.execute(query)
         return result.scalars().all()
 
+    async def get_due_for_deactivation(
+        self, now: datetime, limit: int, after: tuple[datetime, int] | None = None
+    ) -> Sequence[Row]:
+        """
+        Пачка активных подписок с end_date <= now в порядке (end_date, id).
+        Строки блокируются до конца транзакции, занятые другими воркерами пропускаются.
+        """
+        query = (
+            select(
+                Subscription.id,
+                Subscription.end_date,
+                Subscription.outline_key_id,
+                Subscription.outline_server,
+            )
+            .where(Subscription.is_active, Subscription.end_date <= now)
+            .order_by(Subscription.end_date, Subscription.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if after is not None:
+            query = query.where(tuple_(Subscription.end_date, Subscription.id) > after)
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def deactivate_many(self, sub_ids: Sequence[int]) -> None:
+        if not sub_ids:
+            return
+        await self.session.execute(
+            update(Subscription)
+            .where(Subscription.id.in_(sub_ids))
+            .values(is_active=False, vpn_key="", outline_key_id="", outline_server="")
+        )
+
+    async def get_due_for_notification(
+        self,
+        now: datetime,
+        until: datetime,
+        claimed_before: datetime,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+    ) -> Sequence[Row]:
+        """
+        Пачка активных подписок с now < end_date <= until, по которым еще не было уведомления
+        и уведомление не стоит в очереди (не поставлено или поставлено до claimed_before).
+        """
+        query = (
+            select(Subscription.id, Subscription.user_id, Subscription.end_date)
+            .where(
+                Subscription.is_active,
+                Subscription.end_date > now,
+                Subscription.end_date <= until,
+                Subscription.notified_end_date.is_distinct_from(Subscription.end_date),
+                or_(
+                    Subscription.notify_claimed_at.is_(None),
+                    Subscription.notify_claimed_at <= claimed_before,
+                ),
+            )
+            .order_by(Subscription.end_date, Subscription.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if after is not None:
+            query = query.where(tuple_(Subscription.end_date, Subscription.id) > after)
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def claim_notifications(self, sub_ids: Sequence[int], now: datetime) -> None:
+        if not sub_ids:
+            return
+        await self.session.execute(
+            update(Subscription).where(Subscription.id.in_(sub_ids)).values(notify_claimed_at=now)
+        )
+
+    async def mark_notified(self, sub_id: int, end_date: datetime) -> None:
+        await self.session.execute(
+            update(Subscription)
+            .where(Subscription.id == sub_id)
+            .values(notified_end_date=end_date, notify_claimed_at=None)
+        )
+
+    async def get_key_page(
+        self,
+        servers: Sequence[str | None],
+        limit: int,
+        after: str | None = None,
+    ) -> Sequence[Row]:
+        """
+        Пачка подписок с ключом Outline на одном из servers в порядке outline_key_id
+        (побайтово, COLLATE "C" — так же сортирует строки Python).
+        """
+        key_id = Subscription.outline_key_id.collate("C")
+        server_filter = [Subscription.outline_server.in_([s for s in servers if s is not None])]
+        if None in servers:
+            server_filter.append(Subscription.outline_server.is_(None))
+        query = (
+            select(Subscription.id, Subscription.outline_key_id, Subscription.is_active)
+            .where(or_(*server_filter), Subscription.outline_key_id != "")
+            .order_by(key_id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(key_id > after)
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def get_used_key_ids(
+        self, servers: Sequence[str | None], key_ids: Sequence[str], active_only: bool = False
+    ) -> set[str]:
+        """
+        Ключи из key_ids, записанные в какую-либо подписку на одном из servers
+        (при active_only — в активную подписку).
+        """
+        if not key_ids:
+            return set()
+        server_filter = [Subscription.outline_server.in_([s for s in servers if s is not None])]
+        if None in servers:
+            server_filter.append(Subscription.outline_server.is_(None))
+        query = select(Subscription.outline_key_id).where(
+            Subscription.outline_key_id.in_(key_ids), or_(*server_filter)
+        )
+        if active_only:
+            query = query.where(Subscription.is_active)
+        result = await self.session.execute(query)
+        return set(result.scalars().all())
+
     async def update_end_date(self, sub: Subscription, new_date: datetime) -> None:
         sub.end_date = new_date
         self.session.add(sub)
         await self.session.flush()
 
-    async def increment_payments(self, sub: Subscription) -> None:
-        sub.cnt_payments += 1
-        self.session.add(sub)
-        await self.session.flush()
-
     async def deactivate(self, sub: Subscription) -> None:
         sub.is_active = False
         self.session.add(sub)
@@ -63,15 +295,21 @@ class SubscriptionRepository:
         *,
         vpn_key: str | None = None,
         outline_key_id: str | None = None,
+        outline_server: str | None = None,
         end_date: datetime | None = None,
+        notified_end_date: datetime | None = None,
         is_active: bool | None = None,
     ) -> None:
         if vpn_key is not None:
             subscription.vpn_key = vpn_key
         if outline_key_id is not None:
             subscription.outline_key_id = outline_key_id
+        if outline_server is not None:
+            subscription.outline_server = outline_server
         if end_date is not None:
             subscription.end_date = end_date
+        if notified_end_date is not None:
+            subscription.notified_end_date = notified_end_date
         if is_active is not None:
             subscription.is_active = is_active
 
@@ -1,11 +1,18 @@
 # scheduler.py
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from src.config import settings
+from src.core.subscription.jobstore import WriteBehindSQLAlchemyJobStore
 from src.database import DATABASE_URL
 
 sync_db_url = DATABASE_URL.replace("+asyncpg", "")
-jobstores = {"default": SQLAlchemyJobStore(url=sync_db_url, tablename="apscheduler_jobs")}
+jobstores = {
+    "default": WriteBehindSQLAlchemyJobStore(
+        url=sync_db_url,
+        tablename="apscheduler_jobs",
+        pool_size=settings.SCHEDULER_JOBSTORE_POOL_SIZE,
+    )
+}
 scheduler = AsyncIOScheduler(jobstores=jobstores, timezone="UTC")
 
 # Запуск планировщика в main.py
@@ -1,9 +1,20 @@
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import Set
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from src.config import settings
+from src.core.outbox.repository import OutboxRepository
 from src.core.referral.models import Referral
+from src.core.subscription.batch import (
+    notification_pending,
+    notify_claim_ttl,
+    send_expiry_notifications,
+)
 from src.core.subscription.jobs import (
     reschedule_deactivation,
     reschedule_notification,
@@ -12,8 +23,10 @@ from src.core.subscription.jobs import (
 )
 from src.core.subscription.models import Subscription
 from src.core.subscription.repository import SubscriptionRepository
+from src.core.tariff.catalog import tariff_catalog
 from src.core.tariff.repository import TariffRepository
 from src.core.user.repository import UserRepository
+from src.database import session_factory
 from src.exceptions import (
     ServiceException,
     SubscriptionException,
@@ -23,10 +36,20 @@ from src.exceptions import (
     TrialAlreadyUsedException,
     UserNotFoundException,
 )
+from src.outline.pool import key_pool
 from src.outline.service import OutlineManager
 
 logger = logging.getLogger(__name__)
 
+# Ключ session.info: (id записи-страховки в outbox, ключ) для ключей, созданных в транзакции
+CREATED_KEYS = "outline_keys_created"
+# Ключ session.info: id записей-страховок, уже отмененных в транзакции
+CONFIRMED_KEYS = "outline_keys_confirmed"
+
+EXPIRY_NOTIFICATION_TEXT = (
+    "Ваша подписка закончится через 3 дня\n" "Продлите ее, чтобы оставаться на связи!"
+)
+
 
 class SubscriptionService:
     """
@@ -37,39 +60,67 @@ class SubscriptionService:
     """
 
     def __init__(self, session: AsyncSession):
+        self.session = session
         self.sub_repo = SubscriptionRepository(session)
         self.user_repo = UserRepository(session)
         self.tariff_repo = TariffRepository(session)
+        self.outbox_repo = OutboxRepository(session)
         self.outline = OutlineManager()
 
     async def create_or_extend_subscription(
         self, user_id: int, tariff_id: int
-    ) -> tuple[Subscription, str]:
+    ) -> tuple[Subscription, str, bool]:
         """
         Создает новую подписку или продлевает существующую.
 
+        Активная подписка продлевается одним UPDATE без обращения к Outline.
+        Для новой или неактивной подписки выдается ключ, и строка создается
+        или обновляется одним upsert, поэтому два одновременных платежа
+        одного пользователя не теряют продление.
+
         Args:
             user_id: ID пользователя
             tariff_id: ID тарифа
 
         Returns:
-            tuple: (subscription, vpn_key)
+            tuple: (subscription, vpn_key, created)
 
         Raises:
             TariffNotFoundException: Если тариф не найден
             SubscriptionException: При других ошибках сервиса
         """
         try:
-            existing_sub = await self.sub_repo.get_by_user_id(user_id)
-
-            if existing_sub:
-                sub, key = await self._extend_subscription(existing_sub, tariff_id)
-                logger.info(f"Extended subscription {sub.id} for user {user_id}")
-            else:
-                sub, key = await self._create_subscription(user_id, tariff_id)
-                logger.info(f"Created subscription {sub.id} for user {user_id}")
-
-            return sub, key
+            tariff = await tariff_catalog.get_by_id(tariff_id, self.tariff_repo)
+            if not tariff:
+                logger.info(f"Tariff {tariff_id} not found for user {user_id}")
+                raise TariffNotFoundException("Tariff not found")
+            duration = timedelta(days=tariff.duration_days)
+
+            sub = await self.sub_repo.extend_active(user_id, duration)
+            created = False
+            if sub is None:
+                outline_key = await self._create_outline_key(user_id)
+                # TODO если создали в первый раз подписку, но не пробовали пробный период,
+                # нужно увеличивать cnt_payments
+                sub, created = await self.sub_repo.upsert(
+                    user_id=user_id,
+                    tariff_id=tariff_id,
+                    duration=duration,
+                    vpn_key=outline_key["accessUrl"],
+                    outline_key_id=outline_key["id"],
+                    outline_server=outline_key["server"],
+                )
+                if sub.outline_key_id != outline_key["id"]:
+                    # Параллельный платеж успел активировать подписку со своим ключом
+                    await self._release_key(outline_key)
+                await self._confirm_keys()
+
+            # Перепланируем деактивацию (даже если ее не было)
+            self._schedule_tasks(sub.id, sub.end_date, reschedule=not created)
+            logger.info(
+                f"{'Created' if created else 'Extended'} subscription {sub.id} for user {user_id}"
+            )
+            return sub, sub.vpn_key, created
 
         except TariffNotFoundException:
             raise
@@ -81,108 +132,27 @@ class SubscriptionService:
                 f"Failed to create or extend subscription for user {user_id}: {str(e)}"
             )
 
-    async def _create_subscription(
-        self,
-        user_id: int,
-        tariff_id: int,
-    ) -> tuple[Subscription, str]:
-        """
-        Создает новую подписку для пользователя.
-
-        Args:
-            user_id: ID пользователя
-            tariff_id: ID тарифа
-
-        Returns:
-            tuple: (subscription, vpn_key)
-
-        Raises:
-            TariffNotFoundException: Если тариф не найден
-        """
-        # Получаем тариф
-        tariff = await self.tariff_repo.get_by_id(tariff_id)
-        if not tariff:
-            logger.info(f"Tariff {tariff_id} not found for user {user_id}")
-            raise TariffNotFoundException("Tariff not found")
-
-        outline_key = await self.outline.create_key(name=f"user_{user_id}")
-
-        end_date = datetime.now(timezone.utc) + timedelta(days=tariff.duration_days)
-        # TODO если создали в первый раз подписку, но не пробовали пробный период, нужно увеличивать
-        # cnt_payments
-        subscription = await self.sub_repo.create(
-            user_id=user_id,
-            tariff_id=tariff_id,
-            vpn_key=outline_key["accessUrl"],
-            outline_key_id=outline_key["id"],
-            end_date=end_date,
-        )
-        # Планируем деактивацию
-        self._schedule_tasks(subscription.id, end_date)
-        return subscription, outline_key["accessUrl"]
-
-    async def _extend_subscription(
-        self, subscription: Subscription, tariff_id: int
-    ) -> tuple[Subscription, str]:
-        """
-        Продлевает существующую активную/неактивную подписку.
-
-        Args:
-            subscription: Существующая подписка
-            tariff_id: ID тарифа для продления
-
-        Returns:
-            tuple: (subscription, vpn_key)
-
-        Raises:
-            TariffNotFoundException: Если тариф не найден
-        """
-        tariff = await self.tariff_repo.get_by_id(tariff_id)
-        if not tariff:
-            logger.info(f"Tariff {tariff_id} not found for subscription {subscription.id}")
-            raise TariffNotFoundException("Tariff not found")
-
-        now = datetime.now(timezone.utc)
-
-        # Если подписка активна - продлеваем от текущей даты окончания
-        if subscription.is_active and subscription.end_date > now:
-            new_end_date = subscription.end_date + timedelta(days=tariff.duration_days)
-            await self.sub_repo.update_end_date(subscription, new_end_date)
-            key = subscription.vpn_key
-        else:
-            outline_key = await self.outline.create_key(name=f"user_{subscription.user_id}")
-            new_end_date = now + timedelta(days=tariff.duration_days)
-
-            # Обновляем подписку
-            await self.sub_repo.update(
-                subscription,
-                vpn_key=outline_key["accessUrl"],
-                outline_key_id=outline_key["id"],
-                end_date=new_end_date,
-                is_active=True,
-            )
-            key = outline_key["accessUrl"]
-        # Перепланируем деактивацию (даже если ее не было)
-        self._schedule_tasks(subscription.id, new_end_date, reschedule=True)
-        await self.sub_repo.increment_payments(subscription)
-
-        return subscription, key
-
     async def deactivate_subscription(self, sub_id: int) -> None:
         """
-        Деактивирует подписку и удаляет VPN ключ.
+        Деактивирует подписку и ставит удаление VPN ключа в outbox.
 
         Args:
             sub_id: ID подписки для деактивации
         """
         try:
-            sub = await self.sub_repo.get_by_id(sub_id)
-            if sub and sub.is_active:
-                # Удаляем ключ в Outline
+            # Блокировка строки: задачу одной подписки не выполнят две реплики одновременно
+            sub = await self.sub_repo.get_by_id_for_update(sub_id)
+            # Подписка могла быть продлена после постановки задачи
+            if sub and sub.is_active and sub.end_date <= datetime.now(timezone.utc):
+                # Ключ удалит relay после коммита, на сервере, которому он принадлежит
                 if sub.outline_key_id:
-                    await self.outline.delete_key(str(sub.outline_key_id))
+                    await self.outbox_repo.enqueue_key_deletions(
+                        [(sub.outline_key_id, sub.outline_server)]
+                    )
                 # Деактивируем подписку и очищаем ключи
-                await self.sub_repo.update(sub, vpn_key="", outline_key_id="", is_active=False)
+                await self.sub_repo.update(
+                    sub, vpn_key="", outline_key_id="", outline_server="", is_active=False
+                )
         except Exception as e:
             logger.exception(
                 "Unhandled exception in SubscriptionService.deactivate_subscription "
@@ -239,21 +209,21 @@ class SubscriptionService:
 
     async def send_notification(self, sub_id: int) -> None:
         """
-        Отправляет пользователю сообщение о скором окончании подписки.
+        Ставит в очередь исходящих сообщений уведомление о скором окончании подписки.
+        notified_end_date заполняется после отправки, а на момент истечения claim
+        ставится проверочная задача: неотправленное уведомление она поставит снова.
 
         Args:
             sub_id: ID подписки
         """
         try:
-            from src.bot import bot
-
-            sub = await self.sub_repo.get_by_id(sub_id)
-            if sub and sub.is_active:
-                await bot.send_message(
-                    sub.user_id,
-                    "Ваша подписка закончится через 3 дня\n"
-                    "Продлите ее, чтобы оставаться на связи!",
-                )
+            now = datetime.now(timezone.utc)
+            sub = await self.sub_repo.get_by_id_for_update(sub_id)
+            if sub and notification_pending(sub, now):
+                if not send_expiry_notifications([sub]):
+                    raise SubscriptionException("Message queue is full")
+                await self.sub_repo.claim_notifications([sub.id], now)
+                reschedule_notification(sub.id, now + notify_claim_ttl())
         except Exception as e:
             logger.exception(f"Unhandled exception in send_notification {sub_id}: {e}")
             raise SubscriptionException(
@@ -283,11 +253,11 @@ class SubscriptionService:
                 raise TrialAlreadyUsedException("Trial already used")
 
             # Используем специальный тариф для пробного периода
-            trial_tariff = await self.tariff_repo.get_by_name("trial")
+            trial_tariff = await tariff_catalog.get_by_name("trial", self.tariff_repo)
             if not trial_tariff:
                 raise TariffNotFoundException("Trial tariff not configured")
 
-            sub, key = await self.create_or_extend_subscription(user_id, trial_tariff.id)
+            sub, key, _ = await self.create_or_extend_subscription(user_id, trial_tariff.id)
             await self.user_repo.mark_trial_used(user)
             return sub, key
         except (TariffNotFoundException, UserNotFoundException, TrialAlreadyUsedException):
@@ -299,10 +269,31 @@ class SubscriptionService:
             raise SubscriptionException(f"Failed to activate trial for user {user_id}: {str(e)}")
 
     async def apply_referral_bonus(self, referral: Referral) -> None:
+        """
+        Начисляет реферальный бонус обоим пользователям.
+
+        Тариф trial читается один раз, нужные ключи Outline создаются параллельно.
+        Если транзакция будет откачена, созданные ключи удаляются (см. _guard_key).
+        """
         try:
             now = datetime.now(timezone.utc)
-            await self._apply_bonus_to_referred(referral, now)
-            await self._apply_bonus_to_referrer(referral, now)
+            trial = await tariff_catalog.get_by_name("trial", self.tariff_repo)
+            if not trial:
+                raise TariffNotFoundException("Trial tariff not configured")
+
+            referrer_sub = await self.sub_repo.get_by_user_id(referral.referrer_id)
+            # Действующей подписке пригласившего новый ключ не нужен
+            if referrer_sub and referrer_sub.is_active:
+                referred_key = await self._create_outline_key(referral.referred_id)
+                referrer_key = None
+            else:
+                referred_key, referrer_key = await self._create_outline_keys(
+                    referral.referred_id, referral.referrer_id
+                )
+
+            await self._apply_bonus_to_referred(referral, trial, referred_key, now)
+            await self._apply_bonus_to_referrer(referral, trial, referrer_sub, referrer_key, now)
+            await self._confirm_keys()
         except TariffNotFoundException:
             raise
         except Exception as e:
@@ -313,59 +304,82 @@ class SubscriptionService:
                 f"Failed to apply referral bonus for referral {referral.id}: {str(e)}"
             )
 
-    async def _apply_bonus_to_referred(self, referral: Referral, now: datetime) -> None:
+    async def _apply_bonus_to_referred(
+        self, referral: Referral, trial, outline: dict, now: datetime
+    ) -> None:
         """
         Применяет бонус для приглашенного пользователя.
 
         Args:
             referral: Объект реферальной программы
+            trial: Тариф пробного периода
+            outline: Ключ Outline для новой подписки
             now: Текущее время в UTC
         """
-
-        trial = await self.tariff_repo.get_by_name("trial")
-        if not trial:
-            raise TariffNotFoundException("Trial tariff not configured")
         days = trial.duration_days + referral.bonus_days
         end = now + timedelta(days=days)
-        outline = await self._create_outline_key(referral.referred_id)
 
         new_sub = await self.sub_repo.create(
             user_id=referral.referred_id,
             tariff_id=trial.id,
             vpn_key=outline["accessUrl"],
             outline_key_id=outline["id"],
+            outline_server=outline["server"],
             end_date=end,
         )
-        await self.user_repo.mark_trial_used(referral.referred)
+        # Связи Referral не загружаются неявно, а профиль мог быть взят из кэша
+        referred = await self.user_repo.get_by_id(referral.referred_id)
+        await self.user_repo.mark_trial_used(referred)
         self._schedule_tasks(new_sub.id, end, reschedule=True)
         logging.info(f"Applied {days}-day bonus to referred {referral.referred_id}")
 
-    async def _apply_bonus_to_referrer(self, referral: Referral, now: datetime) -> None:
+    async def _apply_bonus_to_referrer(
+        self,
+        referral: Referral,
+        trial,
+        referrer_sub: Subscription | None,
+        outline: dict | None,
+        now: datetime,
+    ) -> None:
         """
         Применяет бонус для пригласившего пользователя.
 
         Args:
             referral: Объект реферальной программы
+            trial: Тариф пробного периода
+            referrer_sub: Подписка пригласившего, если есть
+            outline: Новый ключ Outline (None, если подписка действующая)
             now: Текущее время в UTC
         """
-        referrer_sub = await self.sub_repo.get_by_user_id(referral.referrer_id)
-        if referrer_sub:
+        if referrer_sub and referrer_sub.is_active:
             end_date = max(referrer_sub.end_date, now) + timedelta(days=7)
             await self.sub_repo.update_end_date(referrer_sub, end_date)
             sub_id = referrer_sub.id
+        elif referrer_sub:
+            # Ключ закончившейся подписки уже удален, выдаем новый
+            end_date = now + timedelta(days=7)
+            await self.sub_repo.update(
+                referrer_sub,
+                vpn_key=outline["accessUrl"],
+                outline_key_id=outline["id"],
+                outline_server=outline["server"],
+                end_date=end_date,
+                is_active=True,
+            )
+            sub_id = referrer_sub.id
         else:
-            trial = await self.tariff_repo.get_by_name("trial")
             days = trial.duration_days + referral.bonus_days
             end_date = now + timedelta(days=days)
-            outline = await self._create_outline_key(referral.referrer_id)
             sub = await self.sub_repo.create(
                 user_id=referral.referrer_id,
                 tariff_id=trial.id,
                 vpn_key=outline["accessUrl"],
                 outline_key_id=outline["id"],
+                outline_server=outline["server"],
                 end_date=end_date,
             )
-            await self.user_repo.mark_trial_used(referral.referrer)
+            referrer = await self.user_repo.get_by_id(referral.referrer_id)
+            await self.user_repo.mark_trial_used(referrer)
             sub_id = sub.id
 
         self._schedule_tasks(sub_id, end_date, reschedule=True)
@@ -373,7 +387,7 @@ class SubscriptionService:
 
     async def _create_outline_key(self, user_id: int) -> dict:
         """
-        Создает VPN ключ в Outline для пользователя.
+        Выдает VPN ключ из пула готовых ключей, а если пул пуст — создает его в Outline.
 
         Args:
             user_id: ID пользователя
@@ -381,7 +395,70 @@ class SubscriptionService:
         Returns:
             dict: Словарь с данными созданного ключа
         """
-        return await self.outline.create_key(name=f"user_{user_id}")
+        key = key_pool.acquire(user_id)
+        if key is None:
+            key = await self.outline.create_key(name=f"user_{user_id}")
+        await self._guard_key(key)
+        return key
+
+    async def _create_outline_keys(self, *user_ids: int) -> list[dict]:
+        """
+        Создает ключи для нескольких пользователей параллельно.
+        Если хотя бы один не создан, исключение пробрасывается после завершения
+        остальных вызовов, а созданные ключи удалятся при откате транзакции.
+        """
+        results = await asyncio.gather(
+            *(self._create_outline_key(user_id) for user_id in user_ids), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    async def _guard_key(self, key: dict) -> None:
+        """
+        Сразу (в отдельной транзакции) ставит в outbox отложенное удаление нового ключа.
+        Транзакция с подпиской отменяет его в _confirm_keys; если она откатится
+        или процесс упадет, relay удалит ключ, и он не останется на сервере без подписки.
+        """
+        try:
+            async with session_factory() as session:
+                guard_ids = await OutboxRepository(session).enqueue_key_deletions(
+                    [(key["id"], key["server"])],
+                    reason="release",
+                    delay=timedelta(seconds=settings.OUTBOX_KEY_GRACE_SECONDS),
+                )
+                await session.commit()
+        except Exception:
+            await self.outline.delete_key(str(key["id"]), server=key["server"])
+            raise
+        created = self.session.info.setdefault(CREATED_KEYS, [])
+        created.extend((guard_id, key) for guard_id in guard_ids)
+
+    async def _confirm_keys(self) -> None:
+        """
+        Отменяет удаление ключей, записанных в подписки текущей транзакции.
+
+        Raises:
+            SubscriptionException: Если relay уже взял удаление хотя бы одного ключа
+        """
+        confirmed = self.session.info.setdefault(CONFIRMED_KEYS, set())
+        created = self.session.info.get(CREATED_KEYS, [])
+        guard_ids = [guard_id for guard_id, _ in created if guard_id not in confirmed]
+        cancelled = await self.outbox_repo.cancel(guard_ids)
+        if cancelled != len(guard_ids):
+            # Ключ мог быть уже удален с сервера: транзакция откатывается, а не выдает его
+            raise SubscriptionException(
+                f"Outline key guard expired: cancelled {cancelled} of {len(guard_ids)}"
+            )
+        confirmed.update(guard_ids)
+
+    async def _release_key(self, key: dict) -> None:
+        """Ключ не пригодился: relay удалит его сразу после коммита."""
+        created = self.session.info.get(CREATED_KEYS, [])
+        released = [guard_id for guard_id, item in created if item is key]
+        self.session.info[CREATED_KEYS] = [item for item in created if item[1] is not key]
+        await self.outbox_repo.expedite(released)
 
     def _schedule_tasks(self, sub_id: int, end_date: datetime, reschedule: bool = False) -> None:
         """
@@ -392,9 +469,44 @@ class SubscriptionService:
             end_date: Дата окончания подписки
             reschedule: Флаг перепланирования существующих задач
         """
+        if settings.EXPIRY_ENGINE == "sweeper":
+            # Окончание подписок обрабатывает периодический sweeper по end_date
+            return
         if reschedule:
             reschedule_deactivation(sub_id, end_date)
             reschedule_notification(sub_id, end_date - timedelta(days=3))
         else:
             schedule_deactivation(sub_id, end_date)
             schedule_notification(sub_id, end_date - timedelta(days=3))
+
+
+_cleanup_tasks: Set[asyncio.Task] = set()
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_created_keys(session: Session) -> None:
+    session.info.pop(CREATED_KEYS, None)
+    session.info.pop(CONFIRMED_KEYS, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _release_created_keys(session: Session) -> None:
+    session.info.pop(CONFIRMED_KEYS, None)
+    created = session.info.pop(CREATED_KEYS, None)
+    if not created:
+        return
+    # Не дожидаемся OUTBOX_KEY_GRACE_SECONDS: подписки с этими ключами точно не будет
+    task = asyncio.get_running_loop().create_task(
+        _expedite_guards([guard_id for guard_id, _ in created])
+    )
+    _cleanup_tasks.add(task)
+    task.add_done_callback(_cleanup_tasks.discard)
+
+
+async def _expedite_guards(guard_ids: list[int]) -> None:
+    try:
+        async with session_factory() as session:
+            await OutboxRepository(session).expedite(guard_ids)
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Failed to expedite deletion of orphaned Outline keys {guard_ids}: {e}")
@@ -0,0 +1,95 @@
+# src/core/subscription/sweeper.py
+import logging
+from datetime import datetime, timedelta, timezone
+
+from src.config import settings
+from src.core.outbox.repository import OutboxRepository
+from src.core.subscription.batch import key_refs, notify_claim_ttl, send_expiry_notifications
+from src.core.subscription.repository import SubscriptionRepository
+from src.database import session_factory
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_BEFORE = timedelta(days=3)
+
+
+async def run_expiry_sweep() -> None:
+    """
+    Периодическая задача: одна на весь сервис вместо двух задач APScheduler на подписку.
+    Уведомляет о скором окончании и деактивирует истекшие подписки пачками.
+    """
+    try:
+        notified = await sweep_notifications()
+        deactivated = await sweep_deactivations()
+        if notified or deactivated:
+            logger.info(f"Expiry sweep finished: notified={notified}, deactivated={deactivated}")
+    except Exception as e:
+        logger.exception(f"Unhandled exception in run_expiry_sweep: {e}")
+
+
+async def sweep_deactivations(now: datetime | None = None) -> int:
+    """
+    Деактивирует подписки с end_date <= now пачками по EXPIRY_SWEEP_BATCH_SIZE.
+    Удаление ключей Outline ставится в outbox в той же транзакции и выполняется relay.
+
+    Returns:
+        int: количество деактивированных подписок
+    """
+    now = now or datetime.now(timezone.utc)
+    total = 0
+    cursor = None
+
+    while True:
+        async with session_factory() as session:
+            repo = SubscriptionRepository(session)
+            rows = await repo.get_due_for_deactivation(
+                now, settings.EXPIRY_SWEEP_BATCH_SIZE, after=cursor
+            )
+            if not rows:
+                break
+            await OutboxRepository(session).enqueue_key_deletions(key_refs(rows))
+            done = [row.id for row in rows]
+            await repo.deactivate_many(done)
+            await session.commit()
+
+        total += len(done)
+        cursor = (rows[-1].end_date, rows[-1].id)
+        if len(rows) < settings.EXPIRY_SWEEP_BATCH_SIZE:
+            break
+    return total
+
+
+async def sweep_notifications(now: datetime | None = None) -> int:
+    """
+    Ставит в очередь уведомления за 3 дня до окончания подписки, по одному на каждый end_date.
+    Уведомление, которое не отправлено за NOTIFY_CLAIM_TTL_MINUTES (очередь потеряна
+    при рестарте, сообщение ушло в dead letter), ставится в очередь снова.
+
+    Returns:
+        int: количество уведомлений, принятых очередью
+    """
+    now = now or datetime.now(timezone.utc)
+    total = 0
+    cursor = None
+
+    while True:
+        async with session_factory() as session:
+            repo = SubscriptionRepository(session)
+            rows = await repo.get_due_for_notification(
+                now,
+                now + NOTIFY_BEFORE,
+                now - notify_claim_ttl(),
+                settings.EXPIRY_SWEEP_BATCH_SIZE,
+                after=cursor,
+            )
+            if not rows:
+                break
+            done = send_expiry_notifications(rows)
+            await repo.claim_notifications(done, now)
+            await session.commit()
+
+        total += len(done)
+        cursor = (rows[-1].end_date, rows[-1].id)
+        if len(rows) < settings.EXPIRY_SWEEP_BATCH_SIZE:
+            break
+    return total
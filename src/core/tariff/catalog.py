@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Mapping, Optional, Sequence, Set, Tuple
+
+from redis.asyncio import Redis
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+
+from src.cache import redis_client
+from src.core.tariff.models import Tariff
+from src.core.tariff.repository import TARIFFS_CHANGED, TariffRepository
+from src.database import session_factory
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "tariffs:changed"
+VERSION_KEY = "tariffs:version"
+
+
+@dataclass(frozen=True)
+class TariffInfo:
+    id: int
+    name: str
+    duration_days: int
+    price: Decimal
+    is_active: bool
+
+    @classmethod
+    def from_tariff(cls, tariff: Tariff) -> "TariffInfo":
+        return cls(
+            id=tariff.id,
+            name=tariff.name,
+            duration_days=tariff.duration_days,
+            price=tariff.price,
+            is_active=tariff.is_active,
+        )
+
+
+@dataclass(frozen=True)
+class TariffSnapshot:
+    """Неизменяемый снимок всех тарифов с номером версии."""
+
+    version: int
+    tariffs: Tuple[TariffInfo, ...]
+    by_id: Mapping[int, TariffInfo]
+    by_name: Mapping[str, TariffInfo]
+
+    @classmethod
+    def build(cls, version: int, tariffs: Sequence[TariffInfo]) -> "TariffSnapshot":
+        return cls(
+            version=version,
+            tariffs=tuple(tariffs),
+            by_id=MappingProxyType({t.id: t for t in tariffs}),
+            by_name=MappingProxyType({t.name: t for t in tariffs}),
+        )
+
+    def active(self) -> Tuple[TariffInfo, ...]:
+        return tuple(t for t in self.tariffs if t.is_active)
+
+
+class TariffCatalog:
+    """
+    Каталог тарифов в памяти процесса.
+
+    Снимок загружается при старте и заменяется целиком при изменении тарифов:
+    после коммита create/update/deactivate в Redis публикуется новая версия,
+    и каждая реплика перечитывает тарифы. Пока снимок не загружен
+    (например, в тестах), тарифы читаются из БД через переданный репозиторий.
+    """
+
+    def __init__(self, redis: Redis, factory: async_sessionmaker = session_factory):
+        self._redis = redis
+        self._factory = factory
+        self._snapshot: Optional[TariffSnapshot] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> Optional[TariffSnapshot]:
+        return self._snapshot
+
+    async def start(self) -> None:
+        await self.reload()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def reload(self, version: Optional[int] = None) -> TariffSnapshot:
+        """
+        Перечитывает тарифы из БД. Устаревшая версия (меньше текущей) игнорируется.
+        """
+        if version is None:
+            version = await self._current_version()
+        if self._snapshot and version < self._snapshot.version:
+            return self._snapshot
+        async with self._factory() as session:
+            result = await session.execute(select(Tariff).order_by(Tariff.id))
+            tariffs = [TariffInfo.from_tariff(t) for t in result.scalars().all()]
+        self._snapshot = TariffSnapshot.build(version, tariffs)
+        logger.info(f"Loaded tariff catalog v{version}: {len(tariffs)} tariffs")
+        return self._snapshot
+
+    async def publish_change(self) -> None:
+        try:
+            version = await self._redis.incr(VERSION_KEY)
+            await self._redis.publish(CHANNEL, version)
+        except Exception as e:
+            logger.error(f"Failed to publish tariff change: {e}")
+            # Без Redis обновляем хотя бы свою реплику
+            if self._snapshot is not None:
+                await self.reload(self._snapshot.version + 1)
+
+    async def get_by_id(self, tariff_id: int, repo: TariffRepository):
+        if self._snapshot is None:
+            return await repo.get_by_id(tariff_id)
+        return self._snapshot.by_id.get(tariff_id)
+
+    async def get_by_name(self, name: str, repo: TariffRepository):
+        if self._snapshot is None:
+            return await repo.get_by_name(name)
+        return self._snapshot.by_name.get(name)
+
+    async def get_all_active(self, repo: TariffRepository) -> Sequence:
+        if self._snapshot is None:
+            return await repo.get_all_active()
+        return self._snapshot.active()
+
+    async def _current_version(self) -> int:
+        try:
+            return int(await self._redis.get(VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"Failed to read tariff catalog version: {e}")
+            return self._snapshot.version if self._snapshot else 0
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    # Изменения, пропущенные пока не было подписки
+                    await self.reload()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self.reload(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Tariff catalog subscription failed: {e}")
+                await asyncio.sleep(5)
+
+
+tariff_catalog = TariffCatalog(redis_client)
+
+_publish_tasks: Set[asyncio.Task] = set()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    if not session.info.pop(TARIFFS_CHANGED, False):
+        return
+    task = asyncio.get_running_loop().create_task(tariff_catalog.publish_change())
+    _publish_tasks.add(task)
+    task.add_done_callback(_publish_tasks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(TARIFFS_CHANGED, None)
@@ -31,10 +31,14 @@ class Tariff(Base):
 
     # Relationships
     subscriptions: Mapped[List["Subscription"]] = relationship(
-        "Subscription", back_populates="tariff", cascade="all, delete-orphan", lazy="select"
+        "Subscription",
+        back_populates="tariff",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise",
     )
     payments: Mapped[List["Payment"]] = relationship(
-        back_populates="tariff", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="tariff", cascade="all, delete-orphan", passive_deletes=True, lazy="raise"
     )
 
     def __repr__(self) -> str:
@@ -5,6 +5,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.tariff.models import Tariff
 
+# Флаг в session.info: после коммита каталог тарифов во всех репликах перечитывается
+TARIFFS_CHANGED = "tariffs_changed"
+
 
 class TariffRepository:
     def __init__(self, session: AsyncSession):
@@ -14,6 +17,7 @@ class TariffRepository:
         tariff = Tariff(name=name, price=price, duration_days=duration_days)
         self.session.add(tariff)
         await self.session.flush()
+        self.session.info[TARIFFS_CHANGED] = True
         return tariff
 
     async def get_all_active(self) -> Sequence[Tariff]:
@@ -34,6 +38,7 @@ class TariffRepository:
     async def deactivate(self, tariff: Tariff) -> None:
         tariff.is_active = False
         await self.session.flush()
+        self.session.info[TARIFFS_CHANGED] = True
 
     async def update(
         self,
@@ -51,4 +56,5 @@ class TariffRepository:
             tariff.duration_days = duration_days
         self.session.add(tariff)
         await self.session.flush()
+        self.session.info[TARIFFS_CHANGED] = True
         return tariff
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Optional, Set
+
+from redis.asyncio import Redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.cache import LRUCache, redis_client
+from src.config import settings
+from src.core.user.models import User
+
+logger = logging.getLogger(__name__)
+
+# Ключ session.info: ID пользователей, профили которых сбрасываются в кэше после коммита
+USERS_CHANGED = "users_changed"
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    """Поля пользователя, которые нужны на навигации по меню."""
+
+    id: int
+    username: str
+    referral_code: str
+    trial_used: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserProfile":
+        return cls(
+            id=user.id,
+            username=user.username,
+            referral_code=user.referral_code,
+            trial_used=user.trial_used,
+            is_admin=user.is_admin,
+        )
+
+
+class UserProfileCache:
+    """
+    Двухуровневый кэш профилей: LRU в памяти процесса и Redis.
+
+    Локальный уровень живет несколько секунд, чтобы изменения из другой реплики
+    доходили быстро, Redis — дольше. Ошибки Redis не прерывают обработку:
+    профиль просто читается из БД.
+
+    Профиль изменившегося пользователя сбрасывается сразу и еще раз после коммита:
+    до коммита другой запрос мог снова положить в кэш старую версию из БД.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int,
+        local_size: int,
+        local_ttl: float,
+        enabled: bool = True,
+    ):
+        self._redis = redis
+        self._ttl = ttl
+        self._local: LRUCache[UserProfile] = LRUCache(maxsize=local_size, ttl=local_ttl)
+        self.enabled = enabled
+        self.stats: Dict[str, int] = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"user_profile:{user_id}"
+
+    async def get(self, user_id: int) -> Optional[UserProfile]:
+        if not self.enabled:
+            return None
+        profile = self._local.get(user_id)
+        if profile is not None:
+            self.stats["local_hits"] += 1
+            return profile
+        try:
+            raw = await self._redis.get(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Failed to read user profile {user_id} from Redis: {e}")
+            raw = None
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["redis_hits"] += 1
+        profile = UserProfile(**json.loads(raw))
+        self._local.set(user_id, profile)
+        return profile
+
+    async def set(self, profile: UserProfile) -> None:
+        if not self.enabled:
+            return
+        self._local.set(profile.id, profile)
+        try:
+            await self._redis.set(self._key(profile.id), json.dumps(asdict(profile)), ex=self._ttl)
+        except Exception as e:
+            logger.warning(f"Failed to write user profile {profile.id} to Redis: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        if not self.enabled:
+            return
+        self._local.delete(user_id)
+        try:
+            await self._redis.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Failed to invalidate user profile {user_id} in Redis: {e}")
+
+    async def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        for user_id in user_ids:
+            await self.invalidate(user_id)
+
+
+user_profile_cache = UserProfileCache(
+    redis=redis_client,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    local_size=settings.USER_CACHE_LOCAL_SIZE,
+    local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+    enabled=settings.USER_CACHE_ENABLED,
+)
+
+_invalidate_tasks: Set[asyncio.Task] = set()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    user_ids = session.info.pop(USERS_CHANGED, None)
+    if not user_ids or not user_profile_cache.enabled:
+        return
+    task = asyncio.get_running_loop().create_task(user_profile_cache.invalidate_many(user_ids))
+    _invalidate_tasks.add(task)
+    task.add_done_callback(_invalidate_tasks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(USERS_CHANGED, None)
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 import sqlalchemy as sa
-from sqlalchemy import BigInteger, Boolean, DateTime, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database import Base
@@ -31,30 +31,45 @@ class User(Base):
         nullable=False,
         server_default=sa.false(),
     )
+    # Денормализованное число приглашенных, увеличивается в ReferralRepository.create
+    referrals_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        server_default="0",
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.timezone("utc", func.now()), nullable=False
     )
 
     # Relationships
+    # Связи не загружаются неявно: нужные подгружаются опциями в репозиториях,
+    # обращение к незагруженной связи бросает исключение вместо скрытого запроса
     subscriptions: Mapped[Optional["Subscription"]] = relationship(
-        back_populates="user", uselist=False, cascade="all, delete-orphan", lazy="select"
+        back_populates="user",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise",
     )
     # One-to-Many: пользователь может приглашать многих
     sent_referrals: Mapped[List["Referral"]] = relationship(
-        back_populates="referrer", foreign_keys="Referral.referrer_id", lazy="select"
+        back_populates="referrer", foreign_keys="Referral.referrer_id", lazy="raise"
     )
 
     # One-to-One: пользователь может быть приглашён только одним
     received_referral: Mapped[Optional["Referral"]] = relationship(
-        back_populates="referred", foreign_keys="Referral.referred_id", uselist=False, lazy="select"
+        back_populates="referred", foreign_keys="Referral.referred_id", uselist=False, lazy="raise"
     )
     payments: Mapped[List["Payment"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="user", cascade="all, delete-orphan", passive_deletes=True, lazy="raise"
     )
 
     @property
     def referrer(self) -> Optional["User"]:
-        """Пользователь, который пригласил текущего (если есть)"""
+        """
+        Пользователь, который пригласил текущего (если есть).
+        Требует загруженных received_referral и Referral.referrer.
+        """
         return self.received_referral.referrer if self.received_referral else None
 
     def __repr__(self) -> str:
@@ -0,0 +1,76 @@
+import hashlib
+import hmac
+import string
+from typing import Optional
+
+from src.config import settings
+from src.exceptions import ReferralCodeGenerationException
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 10
+# Telegram user id занимает не больше 52 бит, перестановка работает на 54 битах:
+# 62^10 > 2^54, поэтому любой код помещается в 10 символов (users.referral_code)
+HALF_BITS = 27
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+class ReferralCodec:
+    """
+    Реферальный код как обратимое отображение id пользователя.
+
+    Id переставляется сетью Фейстеля с раундовой функцией HMAC-SHA256 на секретном
+    ключе и записывается в base62 фиксированной длины. Коды разных пользователей
+    не совпадают, поэтому проверка уникальности в БД не нужна, а по коду без ключа
+    нельзя получить id или подобрать код соседнего пользователя.
+    """
+
+    def __init__(self, key: bytes):
+        self._key = key
+
+    def encode(self, user_id: int) -> str:
+        if not 0 <= user_id < 1 << (2 * HALF_BITS):
+            raise ReferralCodeGenerationException(f"User id {user_id} is out of code range")
+        value = self._permute(user_id)
+        chars = []
+        for _ in range(CODE_LENGTH):
+            value, rest = divmod(value, len(ALPHABET))
+            chars.append(ALPHABET[rest])
+        return "".join(reversed(chars))
+
+    def decode(self, code: str) -> Optional[int]:
+        """
+        Возвращает id пользователя или None, если строка не может быть кодом.
+        """
+        if len(code) != CODE_LENGTH:
+            return None
+        value = 0
+        for char in code:
+            digit = ALPHABET.find(char)
+            if digit < 0:
+                return None
+            value = value * len(ALPHABET) + digit
+        if value >= 1 << (2 * HALF_BITS):
+            return None
+        return self._unpermute(value)
+
+    def _round(self, index: int, half: int) -> int:
+        digest = hmac.new(
+            self._key, bytes([index]) + half.to_bytes(4, "big"), hashlib.sha256
+        ).digest()
+        return int.from_bytes(digest[:4], "big") & HALF_MASK
+
+    def _permute(self, value: int) -> int:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for index in range(ROUNDS):
+            left, right = right, left ^ self._round(index, right)
+        return (left << HALF_BITS) | right
+
+    def _unpermute(self, value: int) -> int:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for index in reversed(range(ROUNDS)):
+            left, right = right ^ self._round(index, left), left
+        return (left << HALF_BITS) | right
+
+
+referral_codec = ReferralCodec((settings.REFERRAL_CODE_SECRET or settings.BOT_TOKEN).encode())
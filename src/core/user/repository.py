@@ -1,7 +1,9 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.user.cache import USERS_CHANGED, UserProfile, user_profile_cache
 from src.core.user.models import User
+from src.core.user.referral_code import referral_codec
 
 
 class UserRepository:
@@ -12,11 +14,35 @@ class UserRepository:
         result = await self.session.execute(select(User).where(User.id == user_id))
         return result.scalars().first()
 
+    async def get_profile(self, user_id: int) -> UserProfile | None:
+        """
+        Профиль пользователя через кэш (память процесса -> Redis -> БД).
+        Для изменения пользователя нужен get_by_id.
+        """
+        profile = await user_profile_cache.get(user_id)
+        if profile is not None:
+            return profile
+        user = await self.get_by_id(user_id)
+        if user is None:
+            return None
+        profile = UserProfile.from_user(user)
+        await user_profile_cache.set(profile)
+        return profile
+
     async def get_by_username(self, username: str) -> User | None:
         result = await self.session.execute(select(User).where(User.username == username))
         return result.scalars().first()
 
     async def get_by_referral_code(self, code: str) -> User | None:
+        """
+        Код нового формата раскодируется в id и ищется по первичному ключу.
+        Старые коды (выданные до перехода или под другим ключом) ищутся по столбцу.
+        """
+        user_id = referral_codec.decode(code)
+        if user_id is not None:
+            user = await self.get_by_id(user_id)
+            if user is not None and user.referral_code == code:
+                return user
         result = await self.session.execute(select(User).where(User.referral_code == code))
         return result.scalars().first()
 
@@ -24,14 +50,21 @@ class UserRepository:
         user = User(id=id, username=username, referral_code=ref_code)
         self.session.add(user)
         await self.session.flush()
+        await self._invalidate(user.id)
         return user
 
     async def mark_trial_used(self, user: User) -> None:
         user.trial_used = True
         self.session.add(user)
         await self.session.flush()
+        await self._invalidate(user.id)
 
     async def set_admin(self, user: User, is_admin: bool = True) -> None:
         user.is_admin = is_admin
         self.session.add(user)
         await self.session.flush()
+        await self._invalidate(user.id)
+
+    async def _invalidate(self, user_id: int) -> None:
+        await user_profile_cache.invalidate(user_id)
+        self.session.info.setdefault(USERS_CHANGED, set()).add(user_id)
@@ -1,10 +1,11 @@
 import logging
-import secrets
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.referral.repository import ReferralRepository
 from src.core.subscription.service import SubscriptionService
+from src.core.user.cache import UserProfile
+from src.core.user.referral_code import referral_codec
 from src.core.user.repository import UserRepository
 from src.exceptions import (
     ReferralAlreadyExistException,
@@ -33,14 +34,17 @@ class UserService:
 
     async def start(self, user_id: int, username: str, ref_code: str | None):
         try:
-            user = await self.user_repo.get_by_id(user_id)
+            user = await self.user_repo.get_profile(user_id)
             if not user:
-                code = await self._generate_unique_referral_code()
+                code = referral_codec.encode(user_id)
                 user = await self.user_repo.create(user_id, username, code)
 
             bonus_applied = False
             if ref_code:
                 bonus_applied = await self._apply_referral(user_id, ref_code)
+                if bonus_applied:
+                    # Бонус отмечает пробный период использованным: профиль из кэша устарел
+                    user = UserProfile.from_user(await self.user_repo.get_by_id(user_id))
             return user, bonus_applied
 
         except (
@@ -81,15 +85,3 @@ class UserService:
         referral = await self.ref_repo.create(referrer.id, user_id)
         await self.sub_service.apply_referral_bonus(referral)
         return True
-
-    async def _generate_unique_referral_code(self) -> str:
-        for _ in range(5):
-            code = secrets.token_urlsafe(6)  # 8 символов
-            exists = await self.user_repo.get_by_referral_code(code)
-            if not exists:
-                return code
-        # после 5 неудачных попыток
-        logger.warning("Failed to generate unique referral code after 5 attempts")
-        raise ReferralCodeGenerationException(
-            "Failed to generate unique referral code after 5 attempts"
-        )
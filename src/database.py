@@ -1,5 +1,7 @@
+from typing import Optional
+
 from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from src.config import settings
@@ -9,7 +11,13 @@ if settings.MODE == "TEST":
     DATABASE_PARAMS = {"poolclass": NullPool}
 else:
     DATABASE_URL = settings.DATABASE_URL
-    DATABASE_PARAMS = {}
+    DATABASE_PARAMS = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
 
 engine = create_async_engine(url=DATABASE_URL, **DATABASE_PARAMS)
 session_factory = async_sessionmaker(engine, expire_on_commit=False)
@@ -17,3 +25,39 @@ session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
 class Base(DeclarativeBase):
     pass
+
+
+class LazySession:
+    """
+    Прокси AsyncSession, который создает сессию при первом обращении к ней.
+    Хендлеры, не работающие с БД, не создают сессию и не занимают соединение из пула.
+    """
+
+    def __init__(self, factory: async_sessionmaker = session_factory):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def is_opened(self) -> bool:
+        return self._session is not None
+
+    def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    async def commit(self) -> None:
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
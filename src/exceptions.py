@@ -85,7 +85,7 @@ class PaymentNotFoundException(BusinessException):
 
 
 class ReferralCodeGenerationException(BusinessException):
-    """Все попытки создания кода неудачны."""
+    """Не удалось создать реферальный код."""
 
     pass
 
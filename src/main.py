@@ -1,16 +1,137 @@
 import asyncio
 import logging
+import signal
+from contextlib import suppress
 
 import src.core.models  # noqa: F401
-from src.bot import bot, dp, setup_bot
+from src.bot import bot, dp, setup_bot, throttling
+from src.config import settings
+from src.core.outbox.relay import run_outbox_relay
+from src.core.payment.partitions import run_partition_maintenance
+from src.core.payment.sweeper import run_payment_sweep
+from src.core.subscription.jobs import catch_up_and_resume
+from src.core.subscription.reconcile import claimed_key_ids, run_reconciliation
 from src.core.subscription.scheduler import scheduler
+from src.core.subscription.sweeper import run_expiry_sweep
+from src.core.tariff.catalog import tariff_catalog
+from src.notifications.keyboard_remover import keyboard_remover
+from src.notifications.queue import message_queue
+from src.outline.pool import key_pool
+from src.outline.service import OutlineManager, refresh_outline_servers
+from src.webhook.server import run_webhook
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(func, interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await func()
+
+
+def start_worker() -> asyncio.Task:
+    """
+    Запускает фоновую обработку подписок. Возвращает задачу догоняющего запуска.
+    """
+    # Задачи, просроченные за время простоя, выполняются пачками до возобновления планировщика
+    scheduler.start(paused=True)
+    # Обновление состояния Outline теперь выполняется в каждой реплике, а не задачей планировщика
+    if scheduler.get_job("outline_refresh"):
+        scheduler.remove_job("outline_refresh")
+    if settings.EXPIRY_ENGINE == "sweeper":
+        scheduler.add_job(
+            run_expiry_sweep,
+            trigger="interval",
+            seconds=settings.EXPIRY_SWEEP_INTERVAL_SECONDS,
+            id="expiry_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+    scheduler.add_job(
+        run_outbox_relay,
+        trigger="interval",
+        seconds=settings.OUTBOX_RELAY_INTERVAL_SECONDS,
+        id="outbox_relay",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        run_reconciliation,
+        trigger="interval",
+        minutes=settings.RECONCILE_INTERVAL_MINUTES,
+        id="outline_reconcile",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        run_payment_sweep,
+        trigger="interval",
+        minutes=settings.PAYMENT_SWEEP_INTERVAL_MINUTES,
+        id="payment_sweep",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        run_partition_maintenance,
+        trigger="interval",
+        hours=settings.PAYMENT_PARTITION_INTERVAL_HOURS,
+        id="payment_partitions",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    message_queue.start(bot)
+    return asyncio.create_task(catch_up_and_resume())
 
 
 async def main():
-    scheduler.start()
+    run_bot = settings.APP_ROLE in ("all", "bot")
+    run_worker = settings.APP_ROLE in ("all", "worker")
+    logger.info("Starting replica %r with role %s", settings.REPLICA_ID, settings.APP_ROLE)
+
+    await OutlineManager().refresh_servers()
+    outline_refresh = asyncio.create_task(
+        run_periodically(
+            refresh_outline_servers, settings.OUTLINE_HEALTHCHECK_INTERVAL_MINUTES * 60
+        )
+    )
+    catch_up = start_worker() if run_worker else None
+    if run_bot:
+        await tariff_catalog.start()
+        await key_pool.start(claimed_key_ids)
+        keyboard_remover.start(bot)
 
-    await setup_bot()
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    try:
+        if run_bot:
+            await setup_bot()
+            if settings.BOT_MODE == "webhook":
+                await run_webhook(dp, bot, extra_metrics={"throttling": lambda: throttling.stats})
+            else:
+                await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        else:
+            # Как и run_webhook: по SIGTERM останавливаемся штатно, дописав очередь и задачи
+            stop_event = asyncio.Event()
+            with suppress(NotImplementedError):
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+            await stop_event.wait()
+    finally:
+        outline_refresh.cancel()
+        if run_bot:
+            await keyboard_remover.stop()
+            await key_pool.stop()
+            await tariff_catalog.stop()
+        if run_worker:
+            catch_up.cancel()
+            await message_queue.stop()
+            # AsyncIOScheduler.shutdown() лишь планирует остановку в event loop,
+            # даем ей выполниться, чтобы хранилище задач дописало изменения
+            scheduler.shutdown()
+            await asyncio.sleep(0)
+        await OutlineManager.close()
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ from sqlalchemy import engine_from_config, pool
 
 from src.config import settings
 from src.core import models  # noqa: F401
+from src.core.payment.partitions import DEFAULT_PARTITION, is_partition_name
 from src.database import Base
 
 config = context.config
@@ -30,6 +31,11 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names) -> bool:
+    # Партиции payments создаются вне моделей и не участвуют в autogenerate
+    return not (type_ == "table" and (is_partition_name(name) or name == DEFAULT_PARTITION))
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -48,6 +54,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -72,6 +79,7 @@ def run_migrations_online() -> None:
             connection=connection,
             target_metadata=target_metadata,
             compare_server_default=True,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,31 @@
+"""Add claimed_at to outline_outbox
+
+Revision ID: 3b7e9c2f5a18
+Revises: 5e8c1a4d7b93
+Create Date: 2026-10-20 11:24:07.915342
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7e9c2f5a18"
+down_revision: Union[str, Sequence[str], None] = "5e8c1a4d7b93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "outline_outbox",
+        sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("outline_outbox", "claimed_at")
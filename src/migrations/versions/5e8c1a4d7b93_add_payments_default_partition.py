@@ -0,0 +1,34 @@
+"""Add payments default partition
+
+Revision ID: 5e8c1a4d7b93
+Revises: 9d3b6f2a8e41
+Create Date: 2026-10-19 16:05:31.204718
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8c1a4d7b93"
+down_revision: Union[str, Sequence[str], None] = "9d3b6f2a8e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Платежи месяцев без партиции; worker переносит их в партиции (src/core/payment/partitions.py)
+    op.execute("CREATE TABLE payments_default PARTITION OF payments DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    rows = op.get_bind().execute(sa.text("SELECT count(*) FROM payments_default")).scalar()
+    if rows:
+        raise RuntimeError(
+            f"payments_default has {rows} payments: run partition maintenance to move them first"
+        )
+    op.execute("DROP TABLE payments_default")
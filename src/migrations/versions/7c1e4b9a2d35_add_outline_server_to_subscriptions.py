@@ -0,0 +1,28 @@
+"""Add outline_server to subscriptions
+
+Revision ID: 7c1e4b9a2d35
+Revises: 24fa20a94a13
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1e4b9a2d35"
+down_revision: Union[str, Sequence[str], None] = "24fa20a94a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("subscriptions", sa.Column("outline_server", sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("subscriptions", "outline_server")
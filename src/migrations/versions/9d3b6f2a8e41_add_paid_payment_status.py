@@ -0,0 +1,43 @@
+"""Add PAID payment status
+
+Revision ID: 9d3b6f2a8e41
+Revises: c4e7a1f9d2b6
+Create Date: 2026-10-19 14:27:05.912644
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3b6f2a8e41"
+down_revision: Union[str, Sequence[str], None] = "c4e7a1f9d2b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Новое значение enum нельзя использовать в той же транзакции, где оно добавлено
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE paymentstatus ADD VALUE IF NOT EXISTS 'PAID' AFTER 'PENDING'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Значение из enum не удалить: тип пересоздается. Неприменённые оплаты становятся
+    # FAILED — старый process_success обработает их повторную доставку как новую оплату
+    op.execute("UPDATE payments SET status = 'FAILED' WHERE status = 'PAID'")
+    op.execute("DROP INDEX idx_payments_pending_created")
+    op.execute("ALTER TYPE paymentstatus RENAME TO paymentstatus_old")
+    op.execute("CREATE TYPE paymentstatus AS ENUM ('PENDING', 'SUCCESS', 'FAILED', 'CANCELED')")
+    op.execute(
+        "ALTER TABLE payments ALTER COLUMN status TYPE paymentstatus "
+        "USING status::text::paymentstatus"
+    )
+    op.execute("DROP TYPE paymentstatus_old")
+    op.execute(
+        "CREATE INDEX idx_payments_pending_created ON payments (created_at) "
+        "WHERE status = 'PENDING'"
+    )
@@ -0,0 +1,121 @@
+"""Partition payments by month
+
+Revision ID: a6d1e9b4c7f2
+Revises: f2a7d6c3b9e1
+Create Date: 2026-10-18 19:02:51.730415
+
+"""
+
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a6d1e9b4c7f2"
+down_revision: Union[str, Sequence[str], None] = "f2a7d6c3b9e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Партиции на будущие месяцы, дальше их создает worker (src/core/payment/partitions.py)
+MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, user_id, tariff_id, amount, status, invoice_payload, telegram_payment_charge_id, "
+    "provider_payment_charge_id, created_at, completed_at"
+)
+
+INDEXES = (
+    "CREATE INDEX idx_payments_pending_created ON payments (created_at) "
+    "WHERE status = 'PENDING'",
+    "CREATE INDEX idx_payments_user_created ON payments (user_id, created_at)",
+    "CREATE INDEX idx_payments_invoice_payload ON payments (invoice_payload)",
+)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rename_old_table() -> None:
+    op.execute("ALTER TABLE payments RENAME TO payments_old")
+    op.execute("ALTER TABLE payments_old RENAME CONSTRAINT payments_pkey TO payments_old_pkey")
+    op.execute("DROP INDEX IF EXISTS idx_payments_pending_created")
+    op.execute("DROP INDEX IF EXISTS idx_payments_user_created")
+    op.execute("DROP INDEX IF EXISTS idx_payments_invoice_payload")
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY NONE")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rename_old_table()
+    op.execute(
+        "ALTER TABLE payments_old DROP CONSTRAINT payments_telegram_payment_charge_id_key, "
+        "DROP CONSTRAINT payments_provider_payment_charge_id_key"
+    )
+    # Уникальный ключ партиционированной таблицы обязан включать created_at,
+    # поэтому глобальная уникальность charge id больше не проверяется базой
+    op.execute(
+        """
+        CREATE TABLE payments (
+            id INTEGER NOT NULL DEFAULT nextval('payments_id_seq'),
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            tariff_id INTEGER NOT NULL REFERENCES tariffs (id) ON DELETE RESTRICT,
+            amount NUMERIC(7, 2) NOT NULL,
+            status paymentstatus NOT NULL,
+            invoice_payload VARCHAR NOT NULL,
+            telegram_payment_charge_id VARCHAR(128),
+            provider_payment_charge_id VARCHAR(128),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT timezone('utc', now()),
+            completed_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT payments_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY payments.id")
+
+    first = op.get_bind().execute(sa.text("SELECT min(created_at) FROM payments_old")).scalar()
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    month = min(first.astimezone(timezone.utc).date(), current).replace(day=1) if first else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        end = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE payments_p{month:%Y_%m} PARTITION OF payments "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{end} 00:00:00+00')"
+        )
+        month = end
+
+    for index in INDEXES:
+        op.execute(index)
+    op.execute(f"INSERT INTO payments ({COLUMNS}) SELECT {COLUMNS} FROM payments_old")
+    op.execute("DROP TABLE payments_old")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Уже заархивированные (отсоединенные и удаленные) партиции не восстанавливаются
+    _rename_old_table()
+    op.execute(
+        """
+        CREATE TABLE payments (
+            id INTEGER NOT NULL DEFAULT nextval('payments_id_seq'),
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            tariff_id INTEGER NOT NULL REFERENCES tariffs (id) ON DELETE RESTRICT,
+            amount NUMERIC(7, 2) NOT NULL,
+            status paymentstatus NOT NULL,
+            invoice_payload VARCHAR NOT NULL,
+            telegram_payment_charge_id VARCHAR(128) UNIQUE,
+            provider_payment_charge_id VARCHAR(128) UNIQUE,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT timezone('utc', now()),
+            completed_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT payments_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY payments.id")
+    for index in INDEXES:
+        op.execute(index)
+    op.execute(f"INSERT INTO payments ({COLUMNS}) SELECT {COLUMNS} FROM payments_old")
+    op.execute("DROP TABLE payments_old")
@@ -0,0 +1,31 @@
+"""Add notified_end_date to subscriptions
+
+Revision ID: b3f9d2e1c6a8
+Revises: 7c1e4b9a2d35
+Create Date: 2026-10-18 11:04:27.903115
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f9d2e1c6a8"
+down_revision: Union[str, Sequence[str], None] = "7c1e4b9a2d35"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "subscriptions",
+        sa.Column("notified_end_date", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("subscriptions", "notified_end_date")
@@ -0,0 +1,31 @@
+"""Add notify_claimed_at to subscriptions
+
+Revision ID: c4e7a1f9d2b6
+Revises: a6d1e9b4c7f2
+Create Date: 2026-10-19 10:12:44.381207
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e7a1f9d2b6"
+down_revision: Union[str, Sequence[str], None] = "a6d1e9b4c7f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "subscriptions",
+        sa.Column("notify_claimed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("subscriptions", "notify_claimed_at")
@@ -0,0 +1,41 @@
+"""Add referrals_count to users
+
+Revision ID: d5a8c3f1e7b2
+Revises: b3f9d2e1c6a8
+Create Date: 2026-10-18 14:22:51.410937
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d5a8c3f1e7b2"
+down_revision: Union[str, Sequence[str], None] = "b3f9d2e1c6a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column("referrals_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE users
+        SET referrals_count = counts.total
+        FROM (
+            SELECT referrer_id, count(*) AS total FROM referrals GROUP BY referrer_id
+        ) AS counts
+        WHERE users.id = counts.referrer_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "referrals_count")
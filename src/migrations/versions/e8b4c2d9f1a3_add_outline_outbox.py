@@ -0,0 +1,71 @@
+"""Add outline_outbox
+
+Revision ID: e8b4c2d9f1a3
+Revises: d5a8c3f1e7b2
+Create Date: 2026-10-18 15:12:40.518204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8b4c2d9f1a3"
+down_revision: Union[str, Sequence[str], None] = "d5a8c3f1e7b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "outline_outbox",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("operation", sa.Enum("DELETE_KEY", name="outboxoperation"), nullable=False),
+        sa.Column("idempotency_key", sa.String(length=150), nullable=False),
+        sa.Column("key_id", sa.String(length=100), nullable=False),
+        sa.Column("server", sa.String(length=32), nullable=True),
+        sa.Column(
+            "status",
+            sa.Enum("PENDING", "DONE", "CANCELLED", "FAILED", name="outboxstatus"),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column(
+            "next_attempt_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("timezone('utc', now())"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("idempotency_key"),
+    )
+    op.create_index(
+        "idx_outbox_pending",
+        "outline_outbox",
+        ["next_attempt_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "idx_outbox_pending",
+        table_name="outline_outbox",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.drop_table("outline_outbox")
+    sa.Enum(name="outboxstatus").drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name="outboxoperation").drop(op.get_bind(), checkfirst=False)
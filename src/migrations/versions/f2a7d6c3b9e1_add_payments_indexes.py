@@ -0,0 +1,63 @@
+"""Add payments indexes
+
+Revision ID: f2a7d6c3b9e1
+Revises: e8b4c2d9f1a3
+Create Date: 2026-10-18 17:40:09.228614
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a7d6c3b9e1"
+down_revision: Union[str, Sequence[str], None] = "e8b4c2d9f1a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в payments, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_payments_pending_created",
+            "payments",
+            ["created_at"],
+            unique=False,
+            postgresql_where=sa.text("status = 'PENDING'"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_payments_user_created",
+            "payments",
+            ["user_id", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_payments_invoice_payload",
+            "payments",
+            ["invoice_payload"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_payments_invoice_payload", table_name="payments", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "idx_payments_user_created", table_name="payments", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "idx_payments_pending_created",
+            table_name="payments",
+            postgresql_where=sa.text("status = 'PENDING'"),
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KeyboardRemover:
+    """
+    Фоновое удаление inline-клавиатур у предыдущих сообщений бота.
+
+    Запросы кладутся в ограниченную очередь без ожидания, поэтому ответ пользователю
+    не ждет edit_message_reply_markup. При переполнении очереди запрос отбрасывается:
+    оставшаяся клавиатура не ломает сценарий, только занимает место в чате.
+    """
+
+    def __init__(self, workers: int, maxsize: int):
+        self._workers_count = workers
+        self._queue: asyncio.Queue[Tuple[int, int]] = asyncio.Queue(maxsize)
+        self._workers: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Keyboard remover stopped with %d pending requests", len(self))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, chat_id: int, message_id: int) -> bool:
+        try:
+            self._queue.put_nowait((chat_id, message_id))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Keyboard remover queue is full, %s:%s skipped", chat_id, message_id)
+            return False
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id, message_id = await self._queue.get()
+            try:
+                await self._remove(chat_id, message_id)
+            finally:
+                self._queue.task_done()
+
+    async def _remove(self, chat_id: int, message_id: int) -> None:
+        try:
+            await self._bot.edit_message_reply_markup(
+                chat_id=chat_id, message_id=message_id, reply_markup=None
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                logger.debug(f"Keyboard already removed: {chat_id}:{message_id}")
+                return
+            logger.error(f"Error removing keyboard {chat_id}:{message_id}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error removing keyboard {chat_id}:{message_id}: {e}")
+
+
+keyboard_remover = KeyboardRemover(
+    workers=settings.KEYBOARD_REMOVER_WORKERS, maxsize=settings.KEYBOARD_REMOVER_MAXSIZE
+)
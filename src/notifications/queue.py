@@ -0,0 +1,260 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MessagePriority(IntEnum):
+    """Чем меньше значение, тем раньше сообщение уходит из очереди."""
+
+    DEFAULT = 5
+    REMINDER = 10
+
+
+@dataclass(order=True)
+class OutgoingMessage:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(default_factory=dict, compare=False)
+    attempts: int = field(default=0, compare=False)
+    on_done: Optional[Callable[[], Awaitable[None]]] = field(default=None, compare=False)
+
+
+class TokenBucket:
+    """
+    Token bucket: не более rate операций в секунду с всплеском до capacity.
+    pause() останавливает выдачу токенов, например на время retry_after от Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class MessageQueue:
+    """
+    Очередь исходящих сообщений с учетом лимитов Telegram.
+
+    Глобальный лимит соблюдается через token bucket, для каждого чата выдерживается
+    интервал между сообщениями. Сообщения с меньшим приоритетом уходят раньше.
+    При TelegramRetryAfter отправка приостанавливается на retry_after, остальные ошибки
+    повторяются с экспоненциальной задержкой; после max_attempts сообщение попадает
+    в dead letter.
+
+    Очередь и dead letters живут только в памяти. Сообщения, которые нельзя терять,
+    передают on_done и хранят свое состояние в БД: on_done вызывается, когда повторять
+    сообщение больше не нужно, и пока он не вызван, отправитель считает сообщение
+    недоставленным.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_interval: float,
+        max_attempts: int,
+        workers: int,
+        maxsize: int,
+    ):
+        self._bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chat_interval = chat_interval
+        self._max_attempts = max_attempts
+        self._workers_count = workers
+        self._queue: asyncio.PriorityQueue[OutgoingMessage] = asyncio.PriorityQueue(maxsize)
+        self._seq = itertools.count()
+        self._chat_ready_at: Dict[int, float] = {}
+        self._workers: list[asyncio.Task] = []
+        # Сообщения, ожидающие повтора в call_later: queue.join() их не учитывает
+        self._delayed: Dict[int, asyncio.TimerHandle] = {}
+        self._bot: Optional[Bot] = None
+        self.dead_letters: Deque[OutgoingMessage] = deque(maxlen=1000)
+        self.stats: Dict[str, int] = {"enqueued": 0, "sent": 0, "retried": 0, "dead": 0}
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+        logger.info("Message queue started with %d workers", self._workers_count)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Дожидается отправки накопленных сообщений, в том числе ожидающих повтора
+        (не дольше timeout), и останавливает воркеров.
+        """
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Message queue stopped with %d unsent messages",
+                self._queue.qsize() + len(self._delayed),
+            )
+        for handle in self._delayed.values():
+            handle.cancel()
+        self._delayed = {}
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(
+        self,
+        chat_id: int,
+        text: str,
+        priority: MessagePriority = MessagePriority.DEFAULT,
+        on_done: Optional[Callable[[], Awaitable[None]]] = None,
+        **kwargs: Any,
+    ) -> bool:
+        """
+        Ставит сообщение в очередь без ожидания.
+
+        Args:
+            on_done: вызывается после отправки или окончательного отказа Telegram
+                (бот заблокирован, чат не существует); не вызывается, если сообщение
+                потеряно после временных ошибок или при остановке
+
+        Returns:
+            bool: False, если очередь переполнена и сообщение не принято
+        """
+        message = OutgoingMessage(
+            priority=int(priority),
+            seq=next(self._seq),
+            chat_id=chat_id,
+            text=text,
+            kwargs=kwargs,
+            on_done=on_done,
+        )
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Message queue is full, message to chat %s rejected", chat_id)
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                wait = self._chat_ready_at.get(message.chat_id, 0.0) - monotonic()
+                if wait > 0:
+                    self._requeue_later(message, wait)
+                    continue
+                await self._bucket.acquire()
+                self._chat_ready_at[message.chat_id] = monotonic() + self._chat_interval
+                await self._send(message)
+            except Exception as e:
+                logger.exception(f"Unhandled exception in message queue worker: {e}")
+            finally:
+                self._queue.task_done()
+                self._prune_chats()
+
+    async def _send(self, message: OutgoingMessage) -> None:
+        try:
+            await self._bot.send_message(message.chat_id, message.text, **message.kwargs)
+            self.stats["sent"] += 1
+            await self._done(message)
+        except TelegramRetryAfter as e:
+            logger.warning("Telegram flood limit, pausing sending for %s s", e.retry_after)
+            self._bucket.pause(e.retry_after)
+            self._retry(message, e.retry_after, str(e))
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Пользователь заблокировал бота или чат не существует: повтор не поможет
+            self._dead_letter(message, str(e))
+            await self._done(message)
+        except Exception as e:
+            self._retry(message, min(2**message.attempts, 60), str(e))
+
+    def _retry(self, message: OutgoingMessage, delay: float, reason: str) -> None:
+        message.attempts += 1
+        if message.attempts >= self._max_attempts:
+            self._dead_letter(message, reason)
+            return
+        self.stats["retried"] += 1
+        self._requeue_later(message, delay)
+
+    async def _done(self, message: OutgoingMessage) -> None:
+        if message.on_done is None:
+            return
+        try:
+            await message.on_done()
+        except Exception as e:
+            logger.exception(f"Unhandled exception in on_done for chat {message.chat_id}: {e}")
+
+    async def _drain(self) -> None:
+        while True:
+            await self._queue.join()
+            if not self._delayed:
+                return
+            await asyncio.sleep(0.05)
+
+    def _requeue_later(self, message: OutgoingMessage, delay: float) -> None:
+        self._delayed[message.seq] = asyncio.get_running_loop().call_later(
+            delay, self._put_back, message
+        )
+
+    def _put_back(self, message: OutgoingMessage) -> None:
+        self._delayed.pop(message.seq, None)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._dead_letter(message, "queue is full")
+
+    def _dead_letter(self, message: OutgoingMessage, reason: str) -> None:
+        self.stats["dead"] += 1
+        self.dead_letters.append(message)
+        logger.error(
+            "Message to chat %s dropped after %d attempts: %s",
+            message.chat_id,
+            message.attempts,
+            reason,
+        )
+
+    def _prune_chats(self) -> None:
+        if len(self._chat_ready_at) < 10000:
+            return
+        now = monotonic()
+        self._chat_ready_at = {
+            chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items() if ready_at > now
+        }
+
+
+message_queue = MessageQueue(
+    global_rate=settings.MESSAGE_QUEUE_GLOBAL_RATE,
+    chat_interval=settings.MESSAGE_QUEUE_CHAT_INTERVAL_SECONDS,
+    max_attempts=settings.MESSAGE_QUEUE_MAX_ATTEMPTS,
+    workers=settings.MESSAGE_QUEUE_WORKERS,
+    maxsize=settings.MESSAGE_QUEUE_MAXSIZE,
+)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Sequence, Set
+from uuid import uuid4
+
+from src.config import settings
+from src.outline.service import OutlineManager
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY_PREFIX = "pool_"
+# Cannot occur in REPLICA_ID, so no replica prefix is a prefix of another one
+POOL_KEY_SEPARATOR = ":"
+
+# (server, key ids) -> ids of the keys already handed out to users
+ClaimedKeyIds = Callable[[str, Sequence[str]], Awaitable[Set[str]]]
+
+
+def pool_prefix(replica_id: str) -> str:
+    return f"{POOL_KEY_PREFIX}{replica_id or 'main'}{POOL_KEY_SEPARATOR}"
+
+
+class OutlineKeyPool:
+    """
+    Warm pool of unassigned Outline access keys.
+
+    Keeps up to `size` keys already created on the Outline server and hands
+    them out in O(1). The assigned key is renamed to user_{id} in the background,
+    and the pool is refilled once stock drops below `low_watermark`.
+    Pool keys survive restarts: they are recognised on each server by name prefix.
+    The rename is only cosmetic: a handed-out key is recorded durably by its owner
+    (outbox guard, then the subscription row) before it is used, and `start()` skips
+    claimed keys, so a key whose rename was lost is never reissued.
+    Every pooled key remembers the cluster server it was placed on.
+    Each replica uses its own prefix, so two replicas never hand out the same key.
+    Keys named by older releases (pool_<replica>_<hex>) are picked up as well.
+    """
+
+    def __init__(
+        self,
+        outline: OutlineManager,
+        size: int,
+        low_watermark: int,
+        refill_concurrency: int,
+        prefix: str = POOL_KEY_PREFIX,
+    ):
+        self._outline = outline
+        self._prefix = prefix
+        self._legacy_name = re.compile(
+            re.escape(prefix.removesuffix(POOL_KEY_SEPARATOR)) + "_[0-9a-f]{32}"
+        )
+        self._size = size
+        self._low_watermark = low_watermark
+        self._semaphore = asyncio.Semaphore(max(refill_concurrency, 1))
+        self._keys: Deque[Dict[str, str]] = deque()
+        self._started = False
+        self._refill_task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    async def start(self, claimed_key_ids: Optional[ClaimedKeyIds] = None) -> None:
+        """
+        Picks up pool keys left on the server by a previous run and starts a refill.
+        Keys reported by claimed_key_ids were handed out before the restart and are skipped.
+        """
+        if not self.enabled:
+            return
+        self._started = True
+        for server in self._outline.servers:
+            try:
+                keys = await self._outline.list_keys(server)
+                pooled = [
+                    key
+                    for key in keys["accessKeys"]
+                    if key["name"] and self._is_pooled(key["name"])
+                ]
+                claimed = set()
+                if pooled and claimed_key_ids is not None:
+                    claimed = await claimed_key_ids(server, [key["id"] for key in pooled])
+            except Exception as e:
+                logger.error("Failed to load pooled Outline keys from %s: %s", server, e)
+                continue
+            for key in pooled:
+                if key["id"] in claimed:
+                    # Handed out before a restart, but the rename never reached Outline
+                    continue
+                self._keys.append(
+                    {"id": key["id"], "accessUrl": key["accessUrl"], "server": server}
+                )
+        logger.info("Loaded %d pooled Outline keys", len(self._keys))
+        self._refill(force=True)
+
+    async def stop(self) -> None:
+        """
+        Cancels the refill and waits for pending renames.
+        """
+        self._started = False
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def acquire(self, user_id: int) -> Optional[Dict[str, str]]:
+        """
+        Takes a ready key for the user without waiting on the Outline server.
+
+        Returns:
+            dict: {"id", "accessUrl", "server"} or None if the pool is empty
+        """
+        if not self._keys:
+            self._refill()
+            return None
+
+        key = self._keys.popleft()
+        self._spawn(self._rename(key, f"user_{user_id}"))
+        self._refill()
+        return key
+
+    def _is_pooled(self, name: str) -> bool:
+        return name.startswith(self._prefix) or self._legacy_name.fullmatch(name) is not None
+
+    def _refill(self, force: bool = False) -> None:
+        if not self._started:
+            return
+        if not force and len(self._keys) >= self._low_watermark:
+            return
+        if self._refill_task and not self._refill_task.done():
+            return
+        self._refill_task = asyncio.create_task(self._fill())
+
+    async def _fill(self) -> None:
+        missing = self._size - len(self._keys)
+        if missing <= 0:
+            return
+        await asyncio.gather(*(self._create_one() for _ in range(missing)))
+        logger.info("Outline key pool refilled: %d keys available", len(self._keys))
+
+    async def _create_one(self) -> None:
+        async with self._semaphore:
+            try:
+                key = await self._outline.create_key(name=f"{self._prefix}{uuid4().hex}")
+            except Exception as e:
+                logger.error("Failed to create pooled Outline key: %s", e)
+                return
+            self._keys.append(key)
+
+    async def _rename(self, key: Dict[str, str], name: str) -> None:
+        try:
+            await self._outline.rename_key(key["id"], name, server=key["server"])
+        except Exception as e:
+            # The key is already recorded by its owner, only its name is lost
+            logger.error("Failed to rename pooled Outline key %s to %s: %s", key["id"], name, e)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+key_pool = OutlineKeyPool(
+    OutlineManager(),
+    size=settings.OUTLINE_KEY_POOL_SIZE,
+    low_watermark=settings.OUTLINE_KEY_POOL_LOW_WATERMARK,
+    refill_concurrency=settings.OUTLINE_KEY_POOL_REFILL_CONCURRENCY,
+    prefix=pool_prefix(settings.REPLICA_ID),
+)
@@ -1,11 +1,12 @@
+import asyncio
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 import backoff
 from pyoutlineapi import AsyncOutlineClient, DataLimit
 from pyoutlineapi import exceptions as outline_exceptions
 
-from src.config import settings
+from src.config import OutlineServerSettings, settings
 
 logger = logging.getLogger(__name__)
 
@@ -16,69 +17,190 @@ class OutlineManager:
 
     Handles creation, deletion, and listing of access keys with retry logic,
     TLS fingerprint verification, and optional data limits.
-    Ensures proper client session management via context manager.
+    Keeps one long-lived pooled client per Outline server for the whole process,
+    so keep-alive connections and the TLS handshake are reused between calls.
+    Clients are closed via OutlineManager.close() on shutdown.
+
+    Manages a cluster of Outline servers: new keys are placed on the healthy server
+    with the lowest key count relative to its weight. Existing keys stay where they are,
+    so calls on a key take the name of the server that owns it.
     """
 
+    _clients: Dict[str, AsyncOutlineClient] = {}
+    _key_counts: Dict[str, int] = {}
+    _unhealthy: Set[str] = set()
+    _lock: asyncio.Lock = asyncio.Lock()
+
     def __init__(self):
-        self._api_url: str = settings.OUTLINE_API_URL
-        self._cert: str = settings.OUTLINE_CERT_SHA256
+        self._servers: Dict[str, OutlineServerSettings] = {
+            server.name: server for server in settings.OUTLINE_CLUSTER
+        }
+        # Keys created before the cluster existed belong to the first server
+        self._default_server: str = settings.OUTLINE_CLUSTER[0].name
+
+    @property
+    def servers(self) -> List[str]:
+        return list(self._servers)
+
+    @property
+    def default_server(self) -> str:
+        """Server of keys stored without a server name."""
+        return self._default_server
+
+    def pick_server(self) -> str:
+        """
+        Returns the least-loaded healthy server (key count divided by weight).
+        Falls back to all servers if none is marked healthy.
+        """
+        candidates = [s for s in self._servers.values() if s.name not in self._unhealthy]
+        if not candidates:
+            candidates = list(self._servers.values())
+        chosen = min(
+            candidates,
+            key=lambda s: self._key_counts.get(s.name, 0) / max(s.weight, 1),
+        )
+        return chosen.name
+
+    def _resolve(self, server: Optional[str]) -> OutlineServerSettings:
+        name = server or self._default_server
+        if name not in self._servers:
+            raise ValueError(f"Unknown Outline server: {name}")
+        return self._servers[name]
+
+    async def _get_client(self, server: Optional[str] = None) -> AsyncOutlineClient:
+        """
+        Returns the shared client for the server, opening its session on first use.
+        """
+        config = self._resolve(server)
+        client = self._clients.get(config.name)
+        if client is not None and client.session and not client.session.closed:
+            return client
+
+        async with self._lock:
+            client = self._clients.get(config.name)
+            if client is None or not client.session or client.session.closed:
+                client = AsyncOutlineClient(
+                    api_url=config.api_url,
+                    cert_sha256=config.cert_sha256,
+                    enable_logging=False,
+                    timeout=settings.OUTLINE_TIMEOUT,
+                    max_connections=settings.OUTLINE_MAX_CONNECTIONS,
+                )
+                await client.__aenter__()
+                self._clients[config.name] = client
+                logger.info("Opened pooled Outline client for server %s", config.name)
+        return client
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        Closes all pooled clients. Called once on application shutdown.
+        """
+        async with cls._lock:
+            for server, client in list(cls._clients.items()):
+                try:
+                    await client.__aexit__(None, None, None)
+                    logger.info("Closed pooled Outline client for server %s", server)
+                except Exception as e:
+                    logger.error("Failed to close Outline client for server %s: %s", server, e)
+            cls._clients.clear()
+
+    async def refresh_servers(self) -> Dict[str, int]:
+        """
+        Refreshes key counts and health of every server in the cluster.
+
+        Returns:
+            dict: key count per healthy server
+        """
+        for name in self._servers:
+            try:
+                client = await self._get_client(name)
+                keys = await client.get_access_keys()
+                self._key_counts[name] = len(keys.access_keys)
+                self._unhealthy.discard(name)
+            except Exception as e:
+                self._unhealthy.add(name)
+                logger.error("Outline server %s is unhealthy: %s", name, e)
+        logger.info(
+            "Outline cluster state: counts=%s unhealthy=%s", self._key_counts, self._unhealthy
+        )
+        return {name: count for name, count in self._key_counts.items() if name in self._servers}
 
     @backoff.on_exception(backoff.expo, outline_exceptions.OutlineError, max_time=60)
     async def create_key(
         self,
         name: str,
         data_limit_gb: Optional[int] = None,
+        server: Optional[str] = None,
     ) -> Dict[str, str]:
         """
         Create a new access key with an optional data limit (in GB).
-        Uses context manager to ensure client session is opened and closed correctly.
+        Without an explicit server the key is placed on the least-loaded one;
+        a failing server is marked unhealthy so the retry goes elsewhere.
         """
         limit = DataLimit(bytes=data_limit_gb * 1024**3) if data_limit_gb else None
+        target = server or self.pick_server()
+        try:
+            client = await self._get_client(target)
+            key = await client.create_access_key(name=name, limit=limit)
+            self._key_counts[target] = self._key_counts.get(target, 0) + 1
+            logger.info("Created Outline key %s on %s for name=%s", key.id, target, name)
+            return {"id": key.id, "accessUrl": key.access_url, "server": target}
+        except outline_exceptions.OutlineError as e:
+            if server is None and len(self._servers) > 1:
+                self._unhealthy.add(target)
+            logger.error("Failed to create Outline key on %s for %s: %s", target, name, e)
+            raise
+
+    async def delete_key(self, key_id: str, server: Optional[str] = None) -> None:
+        """
+        Delete an existing access key by its ID on the server that owns it.
+        A key that is already gone counts as deleted, so retries are safe.
+        No backoff here: deletions go through the outbox relay, which retries them itself.
+        """
+        target = self._resolve(server).name
         try:
-            async with AsyncOutlineClient(
-                api_url=self._api_url,
-                cert_sha256=self._cert,
-                enable_logging=False,
-            ) as client:
-                key = await client.create_access_key(name=name, limit=limit)
-            logger.info("Created Outline key %s for name=%s", key.id, name)
-            return {"id": key.id, "accessUrl": key.access_url}
+            client = await self._get_client(target)
+            await client.delete_access_key(key_id)
+            if self._key_counts.get(target):
+                self._key_counts[target] -= 1
+            logger.info("Deleted Outline key %s on %s", key_id, target)
+        except outline_exceptions.APIError as e:
+            if e.status_code != 404:
+                logger.error("Failed to delete Outline key %s on %s: %s", key_id, target, e)
+                raise
+            logger.info("Outline key %s on %s is already deleted", key_id, target)
         except outline_exceptions.OutlineError as e:
-            logger.error("Failed to create Outline key for %s: %s", name, e)
+            logger.error("Failed to delete Outline key %s on %s: %s", key_id, target, e)
             raise
 
     @backoff.on_exception(backoff.expo, outline_exceptions.OutlineError, max_time=60)
-    async def delete_key(self, key_id: str) -> None:
+    async def rename_key(self, key_id: str, name: str, server: Optional[str] = None) -> None:
         """
-        Delete an existing access key by its ID.
-        Ensures client session is closed after deletion.
+        Rename an existing access key.
         """
+        target = self._resolve(server).name
         try:
-            async with AsyncOutlineClient(
-                api_url=self._api_url,
-                cert_sha256=self._cert,
-                enable_logging=False,
-            ) as client:
-                await client.delete_access_key(key_id)
-            logger.info("Deleted Outline key %s", key_id)
+            client = await self._get_client(target)
+            await client.rename_access_key(key_id, name)
+            logger.info("Renamed Outline key %s on %s to %s", key_id, target, name)
         except outline_exceptions.OutlineError as e:
-            logger.error("Failed to delete Outline key %s: %s", key_id, e)
+            logger.error("Failed to rename Outline key %s on %s: %s", key_id, target, e)
             raise
 
     @backoff.on_exception(backoff.expo, outline_exceptions.OutlineError, max_time=60)
-    async def list_keys(self) -> Dict[str, any]:
+    async def list_keys(self, server: Optional[str] = None) -> Dict[str, any]:
         """
-        List all access keys on the Outline server.
+        List all access keys on an Outline server.
         """
+        target = self._resolve(server).name
         try:
-            async with AsyncOutlineClient(
-                api_url=self._api_url,
-                cert_sha256=self._cert,
-                enable_logging=False,
-            ) as client:
-                keys = await client.get_access_keys()
-            logger.debug("Fetched %d Outline keys", len(keys.access_keys))
+            client = await self._get_client(target)
+            keys = await client.get_access_keys()
+            self._key_counts[target] = len(keys.access_keys)
+            logger.debug("Fetched %d Outline keys from %s", len(keys.access_keys), target)
             return {
+                "server": target,
                 "total": keys.total,
                 "accessKeys": [
                     {"id": k.id, "name": k.name, "accessUrl": k.access_url}
@@ -86,23 +208,43 @@ class OutlineManager:
                 ],
             }
         except outline_exceptions.OutlineError as e:
-            logger.error("Failed to list Outline keys: %s", e)
+            logger.error("Failed to list Outline keys on %s: %s", target, e)
             raise
 
     @backoff.on_exception(backoff.expo, outline_exceptions.OutlineError, max_time=60)
-    async def get_server_info(self) -> Dict[str, any]:
+    async def list_key_ids(self, server: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        List (id, name) of all access keys on a server, sorted by id as plain strings
+        (the order of COLLATE "C" in PostgreSQL), for a merge join with the database.
+        """
+        target = self._resolve(server).name
+        try:
+            client = await self._get_client(target)
+            keys = await client.get_access_keys()
+            self._key_counts[target] = len(keys.access_keys)
+            return sorted((str(k.id), k.name or "") for k in keys.access_keys)
+        except outline_exceptions.OutlineError as e:
+            logger.error("Failed to list Outline keys on %s: %s", target, e)
+            raise
+
+    @backoff.on_exception(backoff.expo, outline_exceptions.OutlineError, max_time=60)
+    async def get_server_info(self, server: Optional[str] = None) -> Dict[str, any]:
         """
         Retrieve server metadata such as version and health status.
         """
+        target = self._resolve(server).name
         try:
-            async with AsyncOutlineClient(
-                api_url=self._api_url,
-                cert_sha256=self._cert,
-                enable_logging=False,
-            ) as client:
-                info = await client.get_server_info()
+            client = await self._get_client(target)
+            info = await client.get_server_info()
             logger.info("Connected to Outline server %s v%s", info.name, info.version)
             return info.dict()
         except outline_exceptions.OutlineError as e:
-            logger.error("Failed to get Outline server info: %s", e)
+            logger.error("Failed to get Outline server info for %s: %s", target, e)
             raise
+
+
+async def refresh_outline_servers() -> None:
+    """
+    Periodic job: refreshes key counts and health of the Outline cluster.
+    """
+    await OutlineManager().refresh_servers()
@@ -0,0 +1,226 @@
+import asyncio
+import hmac
+import logging
+import signal
+from contextlib import suppress
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """
+    Returns the id of the user (or chat) the update belongs to, 0 if there is none.
+    """
+    for value in update.values():
+        if isinstance(value, dict):
+            owner = value.get("from") or value.get("chat") or {}
+            return owner.get("id", 0)
+    return 0
+
+
+class UpdateQueue:
+    """
+    Bounded in-memory queue of incoming updates drained by a pool of dispatcher workers.
+
+    Every worker owns a shard of the queue and updates are routed by user id,
+    so updates of one user are processed in order while different users run in parallel.
+    submit() never waits: when a shard is full the update is rejected and the webhook
+    answers with an error, so Telegram delivers it again later.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int, maxsize: int):
+        self._dispatcher = dispatcher
+        self._bot = bot
+        shard_size = max(maxsize // workers, 1)
+        self._shards: List[asyncio.Queue[Tuple[float, Dict[str, Any]]]] = [
+            asyncio.Queue(shard_size) for _ in range(workers)
+        ]
+        self._workers: List[asyncio.Task] = []
+        self.stats: Dict[str, float] = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queue_size": 0,
+            "last_lag_ms": 0.0,
+        }
+
+    def __len__(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    @property
+    def capacity(self) -> int:
+        return sum(shard.maxsize for shard in self._shards)
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker(shard)) for shard in self._shards]
+        logger.info("Update queue started with %d workers", len(self._workers))
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Waits until queued updates are processed (at most timeout) and stops the workers.
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.join() for shard in self._shards)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error("Update queue stopped with %d unprocessed updates", len(self))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        """
+        Puts an update into its shard without waiting.
+
+        Returns:
+            bool: False if the shard is full and the update was not accepted
+        """
+        shard = self._shards[shard_key(update) % len(self._shards)]
+        try:
+            shard.put_nowait((monotonic(), update))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            return False
+        self.stats["received"] += 1
+        self.stats["max_queue_size"] = max(self.stats["max_queue_size"], len(self))
+        return True
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            **self.stats,
+            "queue_size": len(self),
+            "queue_capacity": self.capacity,
+            "workers": len(self._workers),
+        }
+
+    async def _worker(self, shard: asyncio.Queue) -> None:
+        while True:
+            received_at, update = await shard.get()
+            self.stats["last_lag_ms"] = round((monotonic() - received_at) * 1000, 1)
+            try:
+                await self._dispatcher.feed_raw_update(self._bot, update)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.exception("Failed to process update %s: %s", update.get("update_id"), e)
+            finally:
+                shard.task_done()
+
+
+class WebhookHandler:
+    """
+    aiohttp handler for Telegram webhook requests.
+
+    Checks the secret token, hands the update over to the UpdateQueue and acknowledges
+    it right away. While the queue is full or the server is shutting down it answers 503,
+    and Telegram retries the delivery, so no acknowledged update is left unqueued.
+    The queue lives in memory: updates that are acknowledged but not yet processed
+    are drained on a graceful shutdown and lost if the process crashes.
+    """
+
+    def __init__(
+        self,
+        queue: UpdateQueue,
+        secret: str,
+        extra_metrics: Optional[Dict[str, Callable[[], Dict[str, float]]]] = None,
+    ):
+        self._queue = queue
+        self._secret = secret
+        self._extra_metrics = extra_metrics or {}
+        self.accepting = True
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self._secret):
+            return web.Response(status=401)
+        if not self.accepting:
+            return web.Response(status=503)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+        if not self._queue.submit(update):
+            logger.warning("Update queue is full, update %s rejected", update.get("update_id"))
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        metrics: Dict[str, Any] = self._queue.metrics()
+        for name, source in self._extra_metrics.items():
+            metrics[name] = source()
+        return web.json_response(metrics)
+
+
+def create_app(handler: WebhookHandler, path: str) -> web.Application:
+    app = web.Application()
+    app.router.add_post(path, handler.handle_update)
+    return app
+
+
+def create_metrics_app(handler: WebhookHandler) -> web.Application:
+    """Metrics are served by a separate app on an internal address, not next to the webhook."""
+    app = web.Application()
+    app.router.add_get("/metrics", handler.handle_metrics)
+    return app
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    stop_event: Optional[asyncio.Event] = None,
+    extra_metrics: Optional[Dict[str, Callable[[], Dict[str, float]]]] = None,
+) -> None:
+    """
+    Serves the webhook until cancelled, SIGTERM or stop_event, then stops accepting
+    new updates and drains the queue before returning.
+    Queue counters and extra_metrics (one key each) are served on GET /metrics
+    at WEBHOOK_METRICS_HOST:WEBHOOK_METRICS_PORT, unless the port is 0.
+    """
+    stop_event = stop_event or asyncio.Event()
+    with suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+    queue = UpdateQueue(
+        dispatcher, bot, workers=settings.WEBHOOK_WORKERS, maxsize=settings.WEBHOOK_QUEUE_SIZE
+    )
+    handler = WebhookHandler(queue, settings.WEBHOOK_SECRET, extra_metrics)
+    runner = web.AppRunner(create_app(handler, settings.WEBHOOK_PATH))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    metrics_runner = web.AppRunner(create_metrics_app(handler))
+    await metrics_runner.setup()
+
+    await dispatcher.emit_startup(bot=bot, **dispatcher.workflow_data)
+    queue.start()
+    await site.start()
+    logger.info(
+        "Webhook server listening on %s:%s%s",
+        settings.WEBHOOK_HOST,
+        settings.WEBHOOK_PORT,
+        settings.WEBHOOK_PATH,
+    )
+    if settings.WEBHOOK_METRICS_PORT:
+        await web.TCPSite(
+            metrics_runner, settings.WEBHOOK_METRICS_HOST, settings.WEBHOOK_METRICS_PORT
+        ).start()
+    try:
+        await stop_event.wait()
+    finally:
+        handler.accepting = False
+        await queue.stop(timeout=settings.WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+        await runner.cleanup()
+        await metrics_runner.cleanup()
+        await dispatcher.emit_shutdown(bot=bot, **dispatcher.workflow_data)
@@ -2,11 +2,12 @@ import logging
 from typing import AsyncGenerator
 
 import pytest
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.config import settings
 from src.core import models  # noqa: F401
+from src.core.payment.partitions import ensure_partitions
 from src.core.subscription.scheduler import scheduler
 from src.core.tariff.models import Tariff
 from src.core.tariff.repository import TariffRepository
@@ -39,11 +40,37 @@ async def setup_db() -> None:
         logger.info("Все таблицы удалены")
 
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
         logger.info("Все таблицы созданы")
 
     scheduler.start()
 
 
+class QueryCounter:
+    """Считает SQL-запросы, выполненные через engine."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def query_counter():
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
+
+
 @pytest.fixture()
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -65,6 +92,18 @@ async def shared_db_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+@pytest.fixture(autouse=True)
+async def clean_outbox():
+    """
+    Записи outbox о созданных ключах коммитятся отдельно от db_session,
+    поэтому удаляются после каждого теста.
+    """
+    yield
+    async with session_factory() as session:
+        await session.execute(text("DELETE FROM outline_outbox"))
+        await session.commit()
+
+
 @pytest.fixture
 async def user_repo(db_session):
     return UserRepository(db_session)
@@ -123,3 +162,27 @@ async def setup_tariffs(shared_db_session) -> dict[str, Tariff]:
         month.name: month,  # "month"
         three_months.name: three_months,  # "3month"
     }
+
+
+@pytest.fixture
+async def mock_outline():
+    class DummyOutline:
+        def __init__(self):
+            self.counter = 0
+
+        async def create_key(self, name: str):
+            self.counter += 1
+            return {
+                "accessUrl": (
+                    "ss://Y3hhY2hhMjAtaWV0Zi1wb2x5MTMwNTpYYkJTakp5Um9"
+                    "MVjhUa0NZSGVacWY4@190.80.230.20:55000/?outline=1"
+                ),
+                "id": str(self.counter),
+                "server": "default",
+            }
+
+        async def delete_key(self, key_id: str, server: str | None = None):
+            # В продакшене удаляется на стороне сервера самим outline
+            return None
+
+    return DummyOutline()
@@ -0,0 +1,54 @@
+from src.database import LazySession
+
+
+class DummySession:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+    async def close(self):
+        self.calls.append("close")
+
+    async def execute(self, statement):
+        self.calls.append("execute")
+
+
+class DummyFactory:
+    def __init__(self):
+        self.sessions: list[DummySession] = []
+
+    def __call__(self):
+        session = DummySession()
+        self.sessions.append(session)
+        return session
+
+
+class TestLazySession:
+    async def test_unused_session_is_never_created(self):
+        factory = DummyFactory()
+        session = LazySession(factory)
+
+        await session.commit()
+        await session.rollback()
+        await session.close()
+
+        assert not session.is_opened
+        assert factory.sessions == []
+
+    async def test_session_is_created_on_first_use(self):
+        factory = DummyFactory()
+        session = LazySession(factory)
+
+        await session.execute("SELECT 1")
+        await session.execute("SELECT 2")
+        await session.commit()
+        await session.close()
+
+        assert len(factory.sessions) == 1
+        assert factory.sessions[0].calls == ["execute", "execute", "commit", "close"]
+        assert not session.is_opened
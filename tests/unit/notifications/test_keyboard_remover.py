@@ -0,0 +1,47 @@
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageReplyMarkup
+
+from src.notifications.keyboard_remover import KeyboardRemover
+
+
+class DummyBot:
+    def __init__(self, errors: list[Exception] | None = None):
+        self.edited: list[tuple[int, int]] = []
+        self.errors = errors or []
+
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, reply_markup=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.edited.append((chat_id, message_id))
+
+
+class TestKeyboardRemover:
+    async def test_removes_in_background(self):
+        remover = KeyboardRemover(workers=2, maxsize=10)
+        bot = DummyBot()
+        remover.submit(1, 10)
+        remover.submit(2, 20)
+
+        remover.start(bot)
+        await remover.stop(timeout=1)
+
+        assert sorted(bot.edited) == [(1, 10), (2, 20)]
+
+    async def test_errors_do_not_stop_worker(self):
+        method = EditMessageReplyMarkup(chat_id=1, message_id=10)
+        remover = KeyboardRemover(workers=1, maxsize=10)
+        bot = DummyBot(errors=[TelegramBadRequest(method, "message is not modified")])
+        remover.submit(1, 10)
+        remover.submit(1, 11)
+
+        remover.start(bot)
+        await remover.stop(timeout=1)
+
+        assert bot.edited == [(1, 11)]
+
+    def test_full_queue_drops_request(self):
+        remover = KeyboardRemover(workers=1, maxsize=1)
+
+        assert remover.submit(1, 10)
+        assert not remover.submit(1, 11)
+        assert remover.dropped == 1
@@ -0,0 +1,126 @@
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from src.notifications.queue import MessagePriority, MessageQueue
+
+
+class DummyBot:
+    def __init__(self, errors: list[Exception] | None = None):
+        self.sent: list[tuple[int, str]] = []
+        self.errors = errors or []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def make_queue(**kwargs) -> MessageQueue:
+    params = dict(global_rate=1000, chat_interval=0, max_attempts=3, workers=1, maxsize=100)
+    params.update(kwargs)
+    return MessageQueue(**params)
+
+
+class TestMessageQueue:
+    async def test_priority_order(self):
+        queue = make_queue()
+        bot = DummyBot()
+        queue.enqueue(1, "reminder", MessagePriority.REMINDER)
+        queue.enqueue(2, "default")
+        queue.enqueue(3, "reminder 2", MessagePriority.REMINDER)
+
+        queue.start(bot)
+        await queue.stop(timeout=1)
+
+        assert [text for _, text in bot.sent] == ["default", "reminder", "reminder 2"]
+
+    async def test_retry_after_is_honoured(self):
+        method = SendMessage(chat_id=1, text="x")
+        queue = make_queue()
+        bot = DummyBot(errors=[TelegramRetryAfter(method, "flood", retry_after=0.05)])
+        queue.enqueue(1, "hello")
+
+        queue.start(bot)
+        await asyncio.sleep(0.2)
+        await queue.stop(timeout=1)
+
+        assert bot.sent == [(1, "hello")]
+        assert queue.stats["retried"] == 1
+
+    async def test_forbidden_goes_to_dead_letter(self):
+        method = SendMessage(chat_id=1, text="x")
+        queue = make_queue()
+        bot = DummyBot(errors=[TelegramForbiddenError(method, "bot was blocked by the user")])
+        queue.enqueue(1, "hello")
+
+        queue.start(bot)
+        await queue.stop(timeout=1)
+
+        assert bot.sent == []
+        assert queue.stats["dead"] == 1
+        assert queue.dead_letters[0].chat_id == 1
+
+    async def test_full_queue_rejects(self):
+        queue = make_queue(maxsize=1)
+
+        assert queue.enqueue(1, "a") is True
+        assert queue.enqueue(2, "b") is False
+
+    async def test_on_done_after_send_and_final_rejection(self):
+        method = SendMessage(chat_id=1, text="x")
+        queue = make_queue()
+        bot = DummyBot(errors=[TelegramForbiddenError(method, "bot was blocked by the user")])
+        done = []
+
+        async def on_done(chat_id):
+            done.append(chat_id)
+
+        queue.enqueue(1, "blocked", on_done=lambda: on_done(1))
+        queue.enqueue(2, "hello", on_done=lambda: on_done(2))
+
+        queue.start(bot)
+        await queue.stop(timeout=1)
+
+        assert done == [1, 2]
+
+    async def test_on_done_not_called_for_lost_message(self):
+        queue = make_queue(max_attempts=2)
+        bot = DummyBot(errors=[RuntimeError("network"), RuntimeError("network")])
+        done = []
+
+        async def on_done():
+            done.append(1)
+
+        queue.enqueue(1, "hello", on_done=on_done)
+
+        queue.start(bot)
+        await queue.stop(timeout=5)
+
+        assert queue.stats["dead"] == 1
+        assert done == []
+
+    async def test_stop_waits_for_pending_retry(self):
+        method = SendMessage(chat_id=1, text="x")
+        queue = make_queue()
+        bot = DummyBot(errors=[TelegramRetryAfter(method, "flood", retry_after=0.2)])
+        queue.enqueue(1, "hello")
+
+        queue.start(bot)
+        await queue.stop(timeout=2)
+
+        assert bot.sent == [(1, "hello")]
+
+    async def test_stop_cancels_retries_after_timeout(self):
+        method = SendMessage(chat_id=1, text="x")
+        queue = make_queue()
+        bot = DummyBot(errors=[TelegramRetryAfter(method, "flood", retry_after=5)])
+        queue.enqueue(1, "hello")
+
+        queue.start(bot)
+        await queue.stop(timeout=0.2)
+        await asyncio.sleep(0)
+
+        assert bot.sent == []
+        assert len(queue) == 0
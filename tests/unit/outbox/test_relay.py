@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from src.config import settings
+from src.core.outbox.models import OutboxMessage, OutboxStatus
+from src.core.outbox.relay import relay_outbox
+from src.core.outbox.repository import OutboxRepository
+from src.database import session_factory
+
+
+class FakeOutline:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.deleted = []
+
+    async def delete_key(self, key_id: str, server: str | None = None):
+        if self.fail:
+            raise RuntimeError("Outline is unavailable")
+        self.deleted.append((key_id, server))
+
+
+async def enqueue(*keys, **kwargs) -> list[int]:
+    async with session_factory() as session:
+        ids = await OutboxRepository(session).enqueue_key_deletions(list(keys), **kwargs)
+        await session.commit()
+    return ids
+
+
+async def get_messages() -> list[OutboxMessage]:
+    async with session_factory() as session:
+        result = await session.execute(select(OutboxMessage).order_by(OutboxMessage.id))
+        return list(result.scalars().all())
+
+
+class TestOutboxRelay:
+    async def test_deletes_keys_and_marks_done(self):
+        await enqueue(("1", "nl1"), ("2", None))
+        outline = FakeOutline()
+
+        assert await relay_outbox(outline) == 2
+
+        assert outline.deleted == [("1", "nl1"), ("2", None)]
+        assert [m.status for m in await get_messages()] == [OutboxStatus.DONE] * 2
+        assert await relay_outbox(outline) == 0
+
+    async def test_same_operation_enqueued_once(self):
+        assert len(await enqueue(("1", "nl1"))) == 1
+        assert await enqueue(("1", "nl1")) == []
+        assert len(await enqueue(("1", "nl1"), reason="release")) == 1
+
+    async def test_delayed_operation_waits(self):
+        ids = await enqueue(("1", "nl1"), reason="release", delay=timedelta(minutes=5))
+
+        assert await relay_outbox(FakeOutline()) == 0
+
+        async with session_factory() as session:
+            await OutboxRepository(session).expedite(ids)
+            await session.commit()
+        assert await relay_outbox(FakeOutline()) == 1
+
+    async def test_failure_is_retried_later(self):
+        await enqueue(("1", "nl1"))
+
+        assert await relay_outbox(FakeOutline(fail=True)) == 1
+
+        [message] = await get_messages()
+        assert message.status == OutboxStatus.PENDING
+        assert message.attempts == 1
+        assert message.next_attempt_at > datetime.now(timezone.utc)
+        assert "unavailable" in message.last_error
+
+    async def test_failed_after_max_attempts(self, monkeypatch):
+        monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 1)
+        await enqueue(("1", "nl1"))
+
+        await relay_outbox(FakeOutline(fail=True))
+
+        [message] = await get_messages()
+        assert message.status == OutboxStatus.FAILED
+        assert message.processed_at is not None
+
+    async def test_failed_operation_is_rearmed(self, monkeypatch):
+        monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 1)
+        [message_id] = await enqueue(("1", "nl1"), reason="reconcile")
+        await relay_outbox(FakeOutline(fail=True))
+
+        assert await enqueue(("1", "nl1"), reason="reconcile") == [message_id]
+
+        [message] = await get_messages()
+        assert message.status == OutboxStatus.PENDING
+        assert message.attempts == 0
+        assert message.last_error is None
+        outline = FakeOutline()
+        assert await relay_outbox(outline) == 1
+        assert outline.deleted == [("1", "nl1")]
+
+    async def test_outline_is_called_without_open_transaction(self):
+        [message_id] = await enqueue(("1", "nl1"))
+        seen = []
+
+        class CheckingOutline(FakeOutline):
+            async def delete_key(self, key_id, server=None):
+                # Строка не заблокирована, а операция отложена на lease
+                async with session_factory() as session:
+                    message = await session.scalar(
+                        select(OutboxMessage)
+                        .where(OutboxMessage.id == message_id)
+                        .with_for_update(nowait=True)
+                    )
+                    seen.append(message.next_attempt_at > datetime.now(timezone.utc))
+                await super().delete_key(key_id, server)
+
+        assert await relay_outbox(CheckingOutline()) == 1
+
+        assert seen == [True]
+        [message] = await get_messages()
+        assert message.status == OutboxStatus.DONE
+
+    async def test_claimed_operation_is_not_cancelled(self):
+        ids = await enqueue(("1", "nl1"))
+        cancelled = []
+
+        class CancellingOutline(FakeOutline):
+            async def delete_key(self, key_id, server=None):
+                async with session_factory() as session:
+                    cancelled.append(await OutboxRepository(session).cancel(ids))
+                    await session.commit()
+                raise RuntimeError("Outline is unavailable")
+
+        await relay_outbox(CancellingOutline())
+
+        [message] = await get_messages()
+        assert cancelled == [0]
+        assert message.status == OutboxStatus.PENDING
+        assert message.attempts == 1
+        assert message.claimed_at is not None
@@ -0,0 +1,38 @@
+import pytest
+
+from src.config import OutlineServerSettings
+from src.outline.service import OutlineManager
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    monkeypatch.setattr(OutlineManager, "_key_counts", {})
+    monkeypatch.setattr(OutlineManager, "_unhealthy", set())
+    manager = OutlineManager()
+    manager._servers = {
+        name: OutlineServerSettings(name=name, api_url="", cert_sha256="", weight=weight)
+        for name, weight in (("nl1", 1), ("de1", 2))
+    }
+    manager._default_server = "nl1"
+    return manager
+
+
+class TestOutlinePlacement:
+    def test_pick_least_loaded_by_weight(self, cluster):
+        cluster._key_counts.update(nl1=30, de1=50)
+        assert cluster.pick_server() == "de1"
+
+        cluster._key_counts.update(nl1=20, de1=50)
+        assert cluster.pick_server() == "nl1"
+
+    def test_new_server_takes_new_keys(self, cluster):
+        cluster._key_counts.update(nl1=100)
+        assert cluster.pick_server() == "de1"
+
+    def test_unhealthy_server_skipped(self, cluster):
+        cluster._key_counts.update(nl1=100, de1=0)
+        cluster._unhealthy.add("de1")
+        assert cluster.pick_server() == "nl1"
+
+        cluster._unhealthy.add("nl1")
+        assert cluster.pick_server() == "de1"
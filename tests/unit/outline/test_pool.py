@@ -0,0 +1,132 @@
+import asyncio
+from uuid import uuid4
+
+from src.outline.pool import POOL_KEY_PREFIX, OutlineKeyPool, pool_prefix
+
+
+class DummyOutline:
+    servers = ["default"]
+
+    def __init__(self, existing: int = 0):
+        self.counter = 0
+        self.names: dict[str, str] = {}
+        for _ in range(existing):
+            self._add(f"{POOL_KEY_PREFIX}old")
+
+    def _add(self, name: str) -> dict:
+        self.counter += 1
+        key_id = str(self.counter)
+        self.names[key_id] = name
+        return {"id": key_id, "accessUrl": f"ss://key{key_id}", "server": "default"}
+
+    async def create_key(self, name: str):
+        return self._add(name)
+
+    async def rename_key(self, key_id: str, name: str, server: str | None = None):
+        self.names[key_id] = name
+
+    async def list_keys(self, server: str | None = None):
+        return {
+            "server": "default",
+            "total": len(self.names),
+            "accessKeys": [
+                {"id": k, "name": n, "accessUrl": f"ss://key{k}"} for k, n in self.names.items()
+            ],
+        }
+
+
+async def _settle(pool: OutlineKeyPool):
+    await asyncio.sleep(0)
+    if pool._refill_task:
+        await pool._refill_task
+    await asyncio.gather(*pool._background)
+
+
+class TestOutlineKeyPool:
+    async def test_start_fills_pool_and_reuses_existing_keys(self):
+        outline = DummyOutline(existing=2)
+        pool = OutlineKeyPool(outline, size=5, low_watermark=2, refill_concurrency=2)
+
+        await pool.start()
+        await _settle(pool)
+
+        assert len(pool) == 5
+        assert outline.counter == 5
+        await pool.stop()
+
+    async def test_acquire_renames_and_refills_below_watermark(self):
+        outline = DummyOutline()
+        pool = OutlineKeyPool(outline, size=3, low_watermark=2, refill_concurrency=1)
+        await pool.start()
+        await _settle(pool)
+
+        key = pool.acquire(42)
+        assert key is not None
+        assert len(pool) == 2
+        await _settle(pool)
+        assert outline.names[key["id"]] == "user_42"
+        assert outline.counter == 3
+
+        pool.acquire(43)
+        await _settle(pool)
+        assert len(pool) == 3
+        assert outline.counter == 5
+        await pool.stop()
+
+    async def test_acquire_returns_none_when_not_started(self):
+        pool = OutlineKeyPool(DummyOutline(), size=3, low_watermark=1, refill_concurrency=1)
+
+        assert pool.acquire(1) is None
+        assert pool._refill_task is None
+
+    async def test_replicas_do_not_share_keys(self):
+        outline = DummyOutline()
+        first = OutlineKeyPool(
+            outline, size=2, low_watermark=1, refill_concurrency=1, prefix=pool_prefix("a")
+        )
+        await first.start()
+        await _settle(first)
+
+        # Имя реплики "a" — префикс имени "a_b", но не префикс ее ключей
+        second = OutlineKeyPool(
+            outline, size=2, low_watermark=1, refill_concurrency=1, prefix=pool_prefix("a_b")
+        )
+        await second.start()
+        await _settle(second)
+
+        first_ids = {key["id"] for key in first._keys}
+        second_ids = {key["id"] for key in second._keys}
+        assert len(first_ids) == len(second_ids) == 2
+        assert first_ids.isdisjoint(second_ids)
+        await first.stop()
+        await second.stop()
+
+    async def test_start_skips_keys_claimed_before_restart(self):
+        outline = DummyOutline(existing=3)
+        checked = []
+
+        async def claimed_key_ids(server, key_ids):
+            checked.append((server, sorted(key_ids)))
+            return {"2"}
+
+        pool = OutlineKeyPool(outline, size=2, low_watermark=1, refill_concurrency=1)
+        await pool.start(claimed_key_ids)
+        await _settle(pool)
+
+        assert checked == [("default", ["1", "2", "3"])]
+        assert {key["id"] for key in pool._keys} == {"1", "3"}
+        await pool.stop()
+
+    async def test_start_picks_up_keys_named_by_older_releases(self):
+        outline = DummyOutline()
+        legacy = outline._add(f"pool_a_{uuid4().hex}")
+        outline._add(f"pool_a_b_{uuid4().hex}")
+
+        pool = OutlineKeyPool(
+            outline, size=1, low_watermark=0, refill_concurrency=1, prefix=pool_prefix("a")
+        )
+        await pool.start()
+        await _settle(pool)
+
+        assert [key["id"] for key in pool._keys] == [legacy["id"]]
+        await pool.stop()
@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy import delete
+
+from src.core.payment.service import PaymentService
+from src.core.user.models import User
+from src.core.user.repository import UserRepository
+from src.database import session_factory
+
+PAYMENT_USER_ID = 9999999999
+
+
+@pytest.fixture
+async def payment_user():
+    """
+    PaymentService коммитит платежи в отдельной сессии, поэтому пользователь
+    должен быть закоммичен; после теста он удаляется вместе с платежами.
+    """
+    async with session_factory() as session:
+        await UserRepository(session).create(PAYMENT_USER_ID, "payment_user", "p9y9m9n9")
+        await session.commit()
+    yield PAYMENT_USER_ID
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.id == PAYMENT_USER_ID))
+        await session.commit()
+
+
+@pytest.fixture
+async def pay_service(db_session, mock_outline):
+    pay_service = PaymentService(db_session)
+    pay_service.sub_service.outline = mock_outline
+    return pay_service
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.core.payment.payload import (
+    PAYLOAD_LENGTH,
+    InvoicePayload,
+    InvoicePayloadCodec,
+    invoice_payload_codec,
+)
+from tests.samples import month_sample
+
+SAMPLE = InvoicePayload(
+    payment_id=123456,
+    user_id=7_000_000_000,
+    tariff_id=2,
+    total_amount=29900,
+    created_at=datetime(2026, 10, 18, 12, 30, 15, 123456, tzinfo=timezone.utc),
+)
+
+
+class TestInvoicePayloadCodec:
+    codec = InvoicePayloadCodec(b"test-key")
+
+    def test_round_trip(self):
+        raw = self.codec.sign(SAMPLE)
+
+        assert len(raw) == PAYLOAD_LENGTH <= 128
+        assert self.codec.verify(raw) == SAMPLE
+
+    def test_rejects_other_key(self):
+        assert InvoicePayloadCodec(b"other-key").verify(self.codec.sign(SAMPLE)) is None
+
+    def test_rejects_tampered_payload(self):
+        raw = self.codec.sign(SAMPLE)
+        tampered = raw[:10] + ("A" if raw[10] != "A" else "B") + raw[11:]
+
+        assert self.codec.verify(tampered) is None
+
+    @pytest.mark.parametrize("raw", ["", "7000000000_2_1760790615", "!" * PAYLOAD_LENGTH])
+    def test_rejects_foreign_payloads(self, raw):
+        assert self.codec.verify(raw) is None
+
+
+class TestSignedInvoice:
+    async def test_invoice_payload_identifies_payment(
+        self, payment_user, pay_service, setup_tariffs
+    ):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+
+        payload = invoice_payload_codec.verify(invoice["payload"])
+        payment = await pay_service.pay_repo.get_by_id(payload.payment_id, payload.created_at)
+
+        assert payload.user_id == payment_user
+        assert payload.tariff_id == month_sample.id
+        assert payload.total_amount == invoice["amount"] * 100
+        assert payment.invoice_payload == invoice["payload"]
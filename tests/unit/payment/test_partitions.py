@@ -0,0 +1,80 @@
+import csv
+import gzip
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from src.core.payment.partitions import archive_partitions, ensure_partitions
+from src.core.payment.repository import PaymentRepository
+from src.database import session_factory
+from tests.samples import month_sample
+
+ARCHIVE_MONTH = date(2001, 1, 1)
+# Месяц, для которого в тестах нет партиции
+UNPARTITIONED_MONTH = date(2098, 5, 1)
+
+
+async def _payloads(table: str) -> list[str]:
+    async with session_factory() as session:
+        result = await session.execute(text(f"SELECT invoice_payload FROM {table}"))
+        return list(result.scalars().all())
+
+
+async def _table_exists(name: str) -> bool:
+    async with session_factory() as session:
+        result = await session.execute(text("SELECT to_regclass(:name)"), {"name": name})
+        return result.scalar() is not None
+
+
+class TestPartitions:
+    """Тесты для партиций payments"""
+
+    async def test_ensure_creates_missing_months_once(self, db_session):
+        created = await ensure_partitions(db_session, today=date(2099, 11, 5), months_ahead=2)
+        again = await ensure_partitions(db_session, today=date(2099, 11, 5), months_ahead=2)
+
+        assert created == ["payments_p2099_11", "payments_p2099_12", "payments_p2100_01"]
+        assert again == []
+
+    async def test_archive_exports_and_drops_old_partition(
+        self, payment_user, setup_tariffs, tmp_path
+    ):
+        async with session_factory() as session:
+            await ensure_partitions(session, today=ARCHIVE_MONTH, months_ahead=0)
+            payment = await PaymentRepository(session).create(
+                payment_user, month_sample.id, month_sample.price, "archived_payload"
+            )
+            payment.created_at = datetime(2001, 1, 15, tzinfo=timezone.utc)
+            await session.commit()
+
+        archived = await archive_partitions(date(2001, 2, 1), tmp_path)
+
+        assert archived == [tmp_path / "payments_p2001_01.csv.gz"]
+        with gzip.open(archived[0], "rt") as archive:
+            rows = list(csv.DictReader(archive))
+        assert [row["invoice_payload"] for row in rows] == ["archived_payload"]
+        assert not await _table_exists("payments_p2001_01")
+        assert await _table_exists("payments_p" + datetime.now(timezone.utc).strftime("%Y_%m"))
+
+    async def test_payment_without_partition_goes_to_default_and_is_moved(
+        self, payment_user, setup_tariffs
+    ):
+        async with session_factory() as session:
+            payment = await PaymentRepository(session).create(
+                payment_user, month_sample.id, month_sample.price, "unpartitioned_payload"
+            )
+            payment.created_at = datetime(2098, 5, 20, tzinfo=timezone.utc)
+            await session.commit()
+            payment_id = payment.id
+        assert await _payloads("payments_default") == ["unpartitioned_payload"]
+
+        async with session_factory() as session:
+            created = await ensure_partitions(session, today=UNPARTITIONED_MONTH, months_ahead=0)
+            await session.commit()
+
+        assert created == ["payments_p2098_05"]
+        assert await _payloads("payments_default") == []
+        assert await _payloads("payments_p2098_05") == ["unpartitioned_payload"]
+        async with session_factory() as session:
+            payment = await PaymentRepository(session).get_by_id(payment_id)
+        assert payment.invoice_payload == "unpartitioned_payload"
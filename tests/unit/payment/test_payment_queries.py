@@ -0,0 +1,18 @@
+from tests.samples import month_sample
+
+
+class TestPaymentServiceQueryCount:
+    async def test_create_invoice(self, payment_user, pay_service, setup_tariffs, query_counter):
+        query_counter.reset()
+        await pay_service.create_invoice(payment_user, month_sample.id)
+
+        assert query_counter.count == 3
+
+    async def test_process_success(self, payment_user, pay_service, setup_tariffs, query_counter):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+
+        query_counter.reset()
+        await pay_service.process_success(invoice["payment_id"], "tg_charge", "provider_charge")
+
+        # Включая SAVEPOINT и RELEASE вокруг применения подписки
+        assert query_counter.count == 9
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.core.payment.models import PaymentStatus
+from src.core.payment.repository import PaymentRepository
+from src.core.payment.sweeper import cancel_stale_payments
+from src.database import session_factory
+from src.exceptions import PaymentException, PaymentNotFoundException, SubscriptionException
+from tests.samples import month_sample
+
+
+class TestProcessSuccess:
+    """Тесты для PaymentService.process_success"""
+
+    async def test_payment_and_subscription_in_one_transaction(
+        self, payment_user, pay_service, setup_tariffs
+    ):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+
+        action, end_date, key = await pay_service.process_success(
+            invoice["payment_id"], "tg_charge", "provider_charge"
+        )
+
+        payment = await pay_service.pay_repo.get_by_id(invoice["payment_id"])
+        assert action == "создана"
+        assert key.startswith("ss://")
+        assert payment.status == PaymentStatus.SUCCESS
+        assert payment.telegram_payment_charge_id == "tg_charge"
+
+    async def test_second_payment_extends(self, payment_user, pay_service, setup_tariffs):
+        first = await pay_service.create_invoice(payment_user, month_sample.id)
+        second = await pay_service.create_invoice(payment_user, month_sample.id)
+        await pay_service.process_success(first["payment_id"], "tg_charge_1", "provider_1")
+
+        action, _, _ = await pay_service.process_success(
+            second["payment_id"], "tg_charge_2", "provider_2"
+        )
+
+        assert action == "продлена"
+
+    async def test_repeated_charge_is_idempotent(self, payment_user, pay_service, setup_tariffs):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+        result = await pay_service.process_success(
+            invoice["payment_id"], "tg_charge", "provider_charge"
+        )
+
+        repeated = await pay_service.process_success(
+            invoice["payment_id"], "tg_charge", "provider_charge"
+        )
+
+        sub = await pay_service.sub_service.sub_repo.get_by_user_id(payment_user)
+        assert repeated == result
+        assert sub.cnt_payments == 0
+
+    async def test_other_charge_for_paid_payment(self, payment_user, pay_service, setup_tariffs):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+        await pay_service.process_success(invoice["payment_id"], "tg_charge", "provider_charge")
+
+        with pytest.raises(PaymentException):
+            await pay_service.process_success(invoice["payment_id"], "tg_other", "provider_other")
+
+    async def test_failed_subscription_keeps_charge(
+        self, payment_user, pay_service, setup_tariffs, monkeypatch
+    ):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+        create_or_extend = pay_service.sub_service.create_or_extend_subscription
+
+        async def broken_subscription(user_id, tariff_id):
+            await create_or_extend(user_id, tariff_id)
+            raise SubscriptionException("Outline is down")
+
+        monkeypatch.setattr(
+            pay_service.sub_service, "create_or_extend_subscription", broken_subscription
+        )
+        with pytest.raises(SubscriptionException):
+            await pay_service.process_success(invoice["payment_id"], "tg_charge", "provider")
+        # Хендлер откатывает сессию после ошибки сервиса
+        await pay_service.session.rollback()
+
+        # Списание закоммичено, подписка из savepoint откатилась
+        async with session_factory() as session:
+            payment = await PaymentRepository(session).get_by_id(invoice["payment_id"])
+        assert payment.status == PaymentStatus.PAID
+        assert payment.telegram_payment_charge_id == "tg_charge"
+        assert await pay_service.sub_service.sub_repo.get_by_user_id(payment_user) is None
+
+        await cancel_stale_payments(now=datetime.now(timezone.utc) + timedelta(days=2))
+        payment = await pay_service.pay_repo.get_by_id(invoice["payment_id"])
+        assert payment.status == PaymentStatus.PAID
+
+        # Повторная обработка того же charge применяет подписку
+        monkeypatch.setattr(
+            pay_service.sub_service, "create_or_extend_subscription", create_or_extend
+        )
+        action, _, key = await pay_service.process_success(
+            invoice["payment_id"], "tg_charge", "provider"
+        )
+        assert action == "создана"
+        assert key.startswith("ss://")
+        payment = await pay_service.pay_repo.get_by_id(invoice["payment_id"])
+        assert payment.status == PaymentStatus.SUCCESS
+
+
+class TestPartitionLookup:
+    """Поиск платежа по ключу партиции"""
+
+    async def test_process_success_with_created_at(self, payment_user, pay_service, setup_tariffs):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+
+        action, _, _ = await pay_service.process_success(
+            invoice["payment_id"], "tg_charge", "provider_charge", created_at=invoice["created_at"]
+        )
+
+        assert action == "создана"
+
+    async def test_wrong_created_at_is_not_found(self, payment_user, pay_service, setup_tariffs):
+        invoice = await pay_service.create_invoice(payment_user, month_sample.id)
+
+        with pytest.raises(PaymentNotFoundException):
+            await pay_service.process_success(
+                invoice["payment_id"],
+                "tg_charge",
+                "provider_charge",
+                created_at=invoice["created_at"] - timedelta(days=40),
+            )
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from src.config import settings
+from src.core.payment.models import Payment, PaymentStatus
+from src.core.payment.repository import PaymentRepository
+from src.core.payment.sweeper import cancel_stale_payments
+from src.database import session_factory
+from tests.samples import month_sample
+
+
+async def _create_payments(user_id: int, count: int) -> list[int]:
+    async with session_factory() as session:
+        payments = [
+            await PaymentRepository(session).create(
+                user_id, month_sample.id, month_sample.price, f"sweep_{user_id}_{i}"
+            )
+            for i in range(count)
+        ]
+        await session.commit()
+        return [payment.id for payment in payments]
+
+
+async def _statuses(payment_ids: list[int]) -> list[PaymentStatus]:
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Payment.status).where(Payment.id.in_(payment_ids)).order_by(Payment.id)
+        )
+        return list(result.scalars().all())
+
+
+class TestPaymentSweeper:
+    """Тесты для cancel_stale_payments"""
+
+    async def test_fresh_invoices_are_kept(self, payment_user, setup_tariffs):
+        payment_ids = await _create_payments(payment_user, 2)
+
+        await cancel_stale_payments()
+
+        assert await _statuses(payment_ids) == [PaymentStatus.PENDING] * 2
+
+    async def test_stale_invoices_are_cancelled_in_batches(
+        self, payment_user, setup_tariffs, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "PAYMENT_SWEEP_BATCH_SIZE", 2)
+        payment_ids = await _create_payments(payment_user, 5)
+        later = datetime.now(timezone.utc) + timedelta(hours=settings.PAYMENT_PENDING_TTL_HOURS + 1)
+
+        cancelled = await cancel_stale_payments(now=later)
+
+        assert cancelled >= 5
+        assert await _statuses(payment_ids) == [PaymentStatus.CANCELED] * 5
+
+    async def test_paid_invoices_are_not_touched(self, payment_user, setup_tariffs):
+        paid_id, pending_id = await _create_payments(payment_user, 2)
+        async with session_factory() as session:
+            repo = PaymentRepository(session)
+            payment = await repo.get_by_id(paid_id)
+            await repo.update_status(payment, PaymentStatus.SUCCESS, "tg_charge", "provider_charge")
+            await session.commit()
+        later = datetime.now(timezone.utc) + timedelta(hours=settings.PAYMENT_PENDING_TTL_HOURS + 1)
+
+        await cancel_stale_payments(now=later)
+
+        assert await _statuses([paid_id, pending_id]) == [
+            PaymentStatus.SUCCESS,
+            PaymentStatus.CANCELED,
+        ]
@@ -0,0 +1,58 @@
+from src.core.referral import service as referral_service
+from src.core.referral.repository import ReferralRepository
+from src.core.referral.service import ReferralService
+from tests.samples import user1_sample, user2_sample, user3_sample, user4_sample, user5_sample
+
+
+async def create_referrals(db_session) -> None:
+    ref_repo = ReferralRepository(db_session)
+    for referred in (user2_sample, user3_sample, user4_sample, user5_sample):
+        await ref_repo.create(user1_sample.id, referred.id)
+    # Пользователи не должны браться из identity map сессии
+    db_session.expunge_all()
+
+
+class TestReferralServiceQueryCount:
+    async def test_get_info_is_a_single_query(self, db_session, setup_users, query_counter):
+        await create_referrals(db_session)
+
+        query_counter.reset()
+        info = await ReferralService(db_session).get_info(user1_sample.id, "bot")
+
+        assert info["total"] == 4
+        assert info["referred_usernames"] == ["@user2", "@user3", "@user4", "@user5"]
+        assert query_counter.count == 1
+
+
+class TestReferralServicePages:
+    async def test_counter_is_denormalized(self, db_session, user_repo, setup_users):
+        await create_referrals(db_session)
+
+        user = await user_repo.get_by_id(user1_sample.id)
+        assert user.referrals_count == 4
+
+    async def test_keyset_pages(self, db_session, setup_users, monkeypatch):
+        monkeypatch.setattr(referral_service, "REFERRALS_PAGE_SIZE", 3)
+        await create_referrals(db_session)
+        service = ReferralService(db_session)
+
+        first = await service.get_info(user1_sample.id, "bot")
+        assert first["referred_usernames"] == ["@user2", "@user3", "@user4"]
+        assert first["prev_cursor"] is None
+        assert first["next_cursor"] is not None
+
+        second = await service.get_info(user1_sample.id, "bot", after=first["next_cursor"])
+        assert second["referred_usernames"] == ["@user5"]
+        assert second["next_cursor"] is None
+        assert second["total"] == 4
+
+        back = await service.get_info(user1_sample.id, "bot", before=second["prev_cursor"])
+        assert back["referred_usernames"] == first["referred_usernames"]
+        assert back["prev_cursor"] is None
+
+    async def test_user_without_referrals(self, db_session, setup_users):
+        info = await ReferralService(db_session).get_info(user2_sample.id, "bot")
+
+        assert info["total"] == 0
+        assert info["referred_usernames"] == []
+        assert info["ref_link"] == f"https://t.me/bot?start={user2_sample.ref_code}"
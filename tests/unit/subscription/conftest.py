@@ -1,6 +1,15 @@
+from datetime import datetime, timedelta
+
 import pytest
+from sqlalchemy import delete
 
+from src.core.subscription.repository import SubscriptionRepository
 from src.core.subscription.service import SubscriptionService
+from src.core.user.models import User
+from src.core.user.repository import UserRepository
+from src.database import session_factory
+
+COMMITTED_USER_IDS = [8800001001, 8800001002, 8800001003, 8800001004, 8800001005]
 
 
 @pytest.fixture
@@ -11,23 +20,35 @@ async def sub_service(db_session, mock_outline):
 
 
 @pytest.fixture
-async def mock_outline():
-    class DummyOutline:
-        def __init__(self):
-            self.counter = 0
-
-        async def create_key(self, name: str):
-            self.counter += 1
-            return {
-                "accessUrl": (
-                    "ss://Y3hhY2hhMjAtaWV0Zi1wb2x5MTMwNTpYYkJTakp5Um9"
-                    "MVjhUa0NZSGVacWY4@190.80.230.20:55000/?outline=1"
-                ),
-                "id": str(self.counter),
-            }
-
-        async def delete_key(self, key_id: str):
-            # В продакшене удаляется на стороне сервера самим outline
-            return None
-
-    return DummyOutline()
+async def committed_subs(setup_tariffs):
+    """
+    Sweeper и пакетные задачи планировщика работают в своих сессиях, поэтому
+    подписки коммитятся и удаляются после теста вместе с пользователями.
+
+    Returns:
+        list[int]: ID подписок с end_date = now + offset в порядке offsets
+    """
+
+    async def create(now: datetime, offsets: list[timedelta]) -> list[int]:
+        sub_ids = []
+        async with session_factory() as session:
+            for user_id, offset in zip(COMMITTED_USER_IDS, offsets):
+                await UserRepository(session).create(
+                    user_id, f"user_{user_id}", f"cs{user_id % 10**8}"
+                )
+                sub = await SubscriptionRepository(session).create(
+                    user_id=user_id,
+                    tariff_id=setup_tariffs["month"].id,
+                    vpn_key=f"ss://{user_id}",
+                    outline_key_id=str(user_id),
+                    outline_server="default",
+                    end_date=now + offset,
+                )
+                sub_ids.append(sub.id)
+            await session.commit()
+        return sub_ids
+
+    yield create
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.id.in_(COMMITTED_USER_IDS)))
+        await session.commit()
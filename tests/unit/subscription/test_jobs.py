@@ -0,0 +1,204 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
+from sqlalchemy import select
+
+from src.core.subscription import batch, jobs
+from src.core.subscription.jobs import (
+    _deactivate_batch,
+    _notify_batch,
+    _run_due_jobs,
+    _run_notify,
+    catch_up_and_resume,
+)
+from src.core.subscription.models import Subscription
+from src.database import session_factory
+from src.notifications.queue import MessageQueue
+
+
+@pytest.fixture
+async def paused_scheduler(monkeypatch):
+    """Отдельный планировщик в памяти на паузе, как при старте worker до catch-up."""
+    scheduler = AsyncIOScheduler(timezone="UTC")
+    scheduler.start(paused=True)
+    monkeypatch.setattr(jobs, "scheduler", scheduler)
+    yield scheduler
+    scheduler.shutdown(wait=False)
+    await asyncio.sleep(0)
+
+
+class SentBot:
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        pass
+
+
+def make_reminder_queue(monkeypatch, maxsize: int = 100) -> MessageQueue:
+    queue = MessageQueue(
+        global_rate=1000, chat_interval=0, max_attempts=3, workers=1, maxsize=maxsize
+    )
+    monkeypatch.setattr(batch, "message_queue", queue)
+    return queue
+
+
+def add_due_jobs(scheduler: AsyncIOScheduler, prefix: str, sub_ids: list[int]) -> None:
+    run_date = datetime.now(timezone.utc) - timedelta(minutes=5)
+    for sub_id in sub_ids:
+        scheduler.add_job(
+            _run_notify, trigger="date", run_date=run_date, args=[sub_id], id=f"{prefix}{sub_id}"
+        )
+
+
+async def get_subs(sub_ids: list[int]) -> dict[int, Subscription]:
+    async with session_factory() as session:
+        result = await session.execute(select(Subscription).where(Subscription.id.in_(sub_ids)))
+        return {sub.id: sub for sub in result.scalars()}
+
+
+class TestBatches:
+    async def test_deactivate_batch(self, committed_subs):
+        now = datetime.now(timezone.utc)
+        expired, future = await committed_subs(now, [-timedelta(hours=1), timedelta(days=1)])
+
+        # Подписки 0 нет: задача по ней просто удаляется
+        assert await _deactivate_batch([expired, future, 0]) == []
+
+        subs = await get_subs([expired, future])
+        assert not subs[expired].is_active
+        assert subs[future].is_active
+
+    async def test_deactivate_batch_retries_locked(self, committed_subs):
+        now = datetime.now(timezone.utc)
+        locked, free = await committed_subs(now, [-timedelta(hours=1), -timedelta(hours=2)])
+
+        async with session_factory() as other:
+            # Строку держит другая транзакция (обработчик или другая реплика)
+            await other.execute(
+                select(Subscription).where(Subscription.id == locked).with_for_update()
+            )
+            assert await _deactivate_batch([locked, free, 0]) == [locked]
+            await other.rollback()
+
+        subs = await get_subs([locked, free])
+        assert subs[locked].is_active
+        assert not subs[free].is_active
+
+    async def test_notify_batch_returns_rejected(
+        self, paused_scheduler, committed_subs, monkeypatch
+    ):
+        queue = make_reminder_queue(monkeypatch, maxsize=1)
+        now = datetime.now(timezone.utc)
+        first, second = await committed_subs(now, [timedelta(days=1), timedelta(days=2)])
+
+        assert await _notify_batch([first, second]) == [second]
+
+        assert len(queue) == 1
+        subs = await get_subs([first, second])
+        assert subs[first].notify_claimed_at is not None
+        assert subs[second].notify_claimed_at is None
+        # Проверочная задача на случай, если уведомление не будет отправлено
+        assert [job.id for job in paused_scheduler.get_jobs()] == [f"notify_{first}"]
+
+    async def test_notify_batch_skips_claimed(self, paused_scheduler, committed_subs, monkeypatch):
+        queue = make_reminder_queue(monkeypatch)
+        (sub_id,) = await committed_subs(datetime.now(timezone.utc), [timedelta(days=1)])
+
+        assert await _notify_batch([sub_id]) == []
+        assert await _notify_batch([sub_id]) == []
+
+        assert len(queue) == 1
+
+
+class TestRunDueJobs:
+    async def test_failed_jobs_are_rescheduled(self, paused_scheduler):
+        add_due_jobs(paused_scheduler, "notify_", [1, 2, 3])
+
+        async def run_batch(sub_ids):
+            return [2]
+
+        assert await _run_due_jobs("notify_", run_batch) == (2, 1)
+
+        assert [job.id for job in paused_scheduler.get_jobs()] == ["notify_2"]
+        job = paused_scheduler.get_job("notify_2")
+        assert job.next_run_time > datetime.now(timezone.utc)
+        assert job.misfire_grace_time is None
+
+    async def test_batch_exception_keeps_all_jobs(self, paused_scheduler):
+        add_due_jobs(paused_scheduler, "deactivate_", [1, 2])
+
+        async def run_batch(sub_ids):
+            raise RuntimeError("database is down")
+
+        assert await _run_due_jobs("deactivate_", run_batch) == (0, 2)
+
+        assert sorted(job.id for job in paused_scheduler.get_jobs()) == [
+            "deactivate_1",
+            "deactivate_2",
+        ]
+
+    async def test_job_removed_during_batch(self, paused_scheduler, monkeypatch):
+        monkeypatch.setattr(jobs.settings, "JOBS_BATCH_SIZE", 2)
+        add_due_jobs(paused_scheduler, "notify_", [1, 2, 3])
+        calls = []
+
+        async def run_batch(sub_ids):
+            calls.append(sub_ids)
+            # Другой код удалил задачу, пока выполнялась пачка
+            if paused_scheduler.get_job("notify_1"):
+                paused_scheduler.remove_job("notify_1")
+            return []
+
+        assert await _run_due_jobs("notify_", run_batch) == (3, 0)
+
+        assert calls == [[1, 2], [3]]
+        assert paused_scheduler.get_jobs() == []
+
+    async def test_other_prefixes_and_future_jobs_are_untouched(self, paused_scheduler):
+        add_due_jobs(paused_scheduler, "deactivate_", [1])
+        paused_scheduler.add_job(
+            _run_notify,
+            trigger="date",
+            run_date=datetime.now(timezone.utc) + timedelta(days=1),
+            args=[2],
+            id="notify_2",
+        )
+        calls = []
+
+        async def run_batch(sub_ids):
+            calls.append(sub_ids)
+            return []
+
+        assert await _run_due_jobs("notify_", run_batch) == (0, 0)
+
+        assert calls == []
+        assert len(paused_scheduler.get_jobs()) == 2
+
+
+class TestCatchUpAndResume:
+    async def test_runs_missed_jobs_and_resumes(
+        self, paused_scheduler, committed_subs, monkeypatch
+    ):
+        queue = make_reminder_queue(monkeypatch)
+        now = datetime.now(timezone.utc)
+        expired, expiring = await committed_subs(now, [-timedelta(hours=1), timedelta(days=1)])
+        add_due_jobs(paused_scheduler, "deactivate_", [expired])
+        add_due_jobs(paused_scheduler, "notify_", [expiring])
+
+        await catch_up_and_resume()
+
+        # Просроченные задачи выполнены, осталась проверочная задача уведомления
+        job = paused_scheduler.get_job(f"notify_{expiring}")
+        assert [j.id for j in paused_scheduler.get_jobs()] == [job.id]
+        assert job.next_run_time > datetime.now(timezone.utc)
+        assert len(queue) == 1
+        subs = await get_subs([expired, expiring])
+        assert not subs[expired].is_active
+        assert subs[expiring].notify_claimed_at is not None
+        assert paused_scheduler.state == STATE_RUNNING
+
+        queue.start(SentBot())
+        await queue.stop(timeout=1)
+        subs = await get_subs([expiring])
+        assert subs[expiring].notified_end_date == subs[expiring].end_date
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import create_engine, text
+
+from src.core.subscription.jobs import _run_notify
+from src.core.subscription.jobstore import WriteBehindSQLAlchemyJobStore
+from src.core.subscription.scheduler import sync_db_url
+
+TABLENAME = "apscheduler_jobs_test"
+RUN_DATE = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def stored_rows():
+    """Читает таблицу задач напрямую, минуя хранилище; таблица удаляется после теста."""
+    engine = create_engine(sync_db_url)
+
+    def read() -> dict[str, float]:
+        with engine.connect() as connection:
+            result = connection.execute(text(f"SELECT id, next_run_time FROM {TABLENAME}"))
+            return dict(result.all())
+
+    yield read
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {TABLENAME}"))
+    engine.dispose()
+
+
+def start_scheduler() -> AsyncIOScheduler:
+    store = WriteBehindSQLAlchemyJobStore(url=sync_db_url, tablename=TABLENAME)
+    scheduler = AsyncIOScheduler(jobstores={"default": store}, timezone="UTC")
+    scheduler.start(paused=True)
+    return scheduler
+
+
+async def stop_scheduler(scheduler: AsyncIOScheduler) -> None:
+    # Как и в main.py: shutdown() лишь планирует остановку в event loop
+    scheduler.shutdown(wait=False)
+    await asyncio.sleep(0)
+
+
+def add_notify_job(scheduler: AsyncIOScheduler, job_id: str, run_date: datetime = RUN_DATE):
+    scheduler.add_job(_run_notify, trigger="date", run_date=run_date, args=[1], id=job_id)
+
+
+class TestWriteBehindJobStore:
+    async def test_shutdown_flushes_pending_writes(self, stored_rows):
+        scheduler = start_scheduler()
+        for i in range(50):
+            add_notify_job(scheduler, f"notify_{i}")
+
+        await stop_scheduler(scheduler)
+
+        assert len(stored_rows()) == 50
+
+    async def test_sequence_of_changes_keeps_last_state(self, stored_rows):
+        scheduler = start_scheduler()
+        add_notify_job(scheduler, "notify_moved")
+        add_notify_job(scheduler, "notify_removed")
+        add_notify_job(scheduler, "notify_readded")
+        scheduler.reschedule_job(
+            "notify_moved", trigger="date", run_date=RUN_DATE + timedelta(days=1)
+        )
+        scheduler.remove_job("notify_removed")
+        scheduler.remove_job("notify_readded")
+        add_notify_job(scheduler, "notify_readded", RUN_DATE + timedelta(days=2))
+
+        await stop_scheduler(scheduler)
+
+        assert stored_rows() == {
+            "notify_moved": (RUN_DATE + timedelta(days=1)).timestamp(),
+            "notify_readded": (RUN_DATE + timedelta(days=2)).timestamp(),
+        }
+
+    async def test_jobs_are_loaded_on_start(self, stored_rows):
+        scheduler = start_scheduler()
+        add_notify_job(scheduler, "notify_1")
+        await stop_scheduler(scheduler)
+
+        scheduler = start_scheduler()
+        try:
+            job = scheduler.get_job("notify_1")
+            assert job.next_run_time == RUN_DATE
+            assert job.args == (1,)
+        finally:
+            await stop_scheduler(scheduler)
+        # Остановка не стирает таблицу
+        assert list(stored_rows()) == ["notify_1"]
+
+    async def test_failed_write_is_logged_and_next_writes_continue(self, stored_rows, caplog):
+        scheduler = start_scheduler()
+        # id длиннее колонки таблицы: запись в БД падает, в памяти задача остается
+        long_id = "notify_" + "x" * 300
+        add_notify_job(scheduler, long_id)
+        add_notify_job(scheduler, "notify_ok")
+
+        with caplog.at_level(logging.ERROR, logger="src.core.subscription.jobstore"):
+            await stop_scheduler(scheduler)
+
+        assert "Failed to persist scheduler job change" in caplog.text
+        assert list(stored_rows()) == ["notify_ok"]
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from src.config import settings
+from src.core.outbox.models import OutboxMessage, OutboxStatus
+from src.core.outbox.repository import OutboxRepository
+from src.core.subscription import reconcile
+from src.core.subscription.reconcile import claimed_key_ids, reconcile_server
+from src.core.subscription.repository import SubscriptionRepository
+from src.core.user.models import User
+from src.core.user.repository import UserRepository
+from src.database import session_factory
+from src.outline.service import OutlineManager
+
+RECONCILE_USER_IDS = [8800000001, 8800000002, 8800000003, 8800000004, 8800000005]
+
+
+class FakeOutline:
+    servers = ["default"]
+    default_server = "default"
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    async def list_key_ids(self, server=None):
+        return sorted(self.keys)
+
+
+@pytest.fixture
+async def reconcile_subs(setup_tariffs):
+    """
+    Сверка читает подписки в отдельных сессиях, поэтому они коммитятся
+    и удаляются после теста вместе с пользователями.
+    """
+    end_date = datetime.now(timezone.utc) + timedelta(days=30)
+    # Ключи "2" и "10" есть на сервере, ключа "7" нет, у неактивной подписки ключ "4"
+    subs = [("2", True), ("10", True), ("7", True), ("4", False)]
+    async with session_factory() as session:
+        for user_id, (key_id, is_active) in zip(RECONCILE_USER_IDS, subs):
+            await UserRepository(session).create(user_id, f"user_{user_id}", f"rc{user_id % 10**8}")
+            sub = await SubscriptionRepository(session).create(
+                user_id=user_id,
+                tariff_id=setup_tariffs["month"].id,
+                vpn_key=f"ss://{key_id}",
+                outline_key_id=key_id,
+                end_date=end_date,
+            )
+            sub.is_active = is_active
+        await session.commit()
+    yield
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.id.in_(RECONCILE_USER_IDS)))
+        await session.commit()
+
+
+SERVER_KEYS = [
+    ("10", "user_8800000002"),
+    ("2", "user_8800000001"),
+    ("3", "user_1"),
+    ("4", "user_8800000004"),
+    ("5", "pool_main_abc"),
+    ("9", "user_2"),
+]
+
+
+class TestReconcileServer:
+    @pytest.mark.parametrize("batch_size", [1000, 1])
+    async def test_report(self, reconcile_subs, monkeypatch, batch_size):
+        monkeypatch.setattr(settings, "RECONCILE_BATCH_SIZE", batch_size)
+        # Ключ "9" только что создан: его подписка еще не закоммичена
+        async with session_factory() as session:
+            await OutboxRepository(session).enqueue_key_deletions(
+                [("9", "default")], reason="release", delay=timedelta(minutes=5)
+            )
+            await session.commit()
+
+        report = await reconcile_server("default", FakeOutline(SERVER_KEYS))
+
+        assert report.matched == 2
+        assert report.pooled == 1
+        assert report.missing_keys == 1
+        assert report.orphan_keys == 2
+        assert sorted(report.orphan_sample) == ["3", "4"]
+        assert report.enqueued == 0
+
+    async def test_autofix_enqueues_orphans_once(self, reconcile_subs):
+        outline = FakeOutline(SERVER_KEYS)
+
+        report = await reconcile_server("default", outline, autofix=True)
+        assert report.enqueued == 3
+
+        # Удаление уже ждет relay — повторно ключи не считаются лишними
+        report = await reconcile_server("default", outline, autofix=True)
+        assert report.orphan_keys == 0
+        assert report.enqueued == 0
+
+    async def test_autofix_rearms_failed_deletion(self, reconcile_subs):
+        outline = FakeOutline(SERVER_KEYS)
+        await reconcile_server("default", outline, autofix=True)
+        # Relay исчерпал попытки удалить ключ "3"
+        async with session_factory() as session:
+            await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.key_id == "3")
+                .values(status=OutboxStatus.FAILED, attempts=settings.OUTBOX_MAX_ATTEMPTS)
+            )
+            await session.commit()
+
+        report = await reconcile_server("default", outline, autofix=True)
+
+        assert report.orphan_sample == ["3"]
+        assert report.enqueued == 1
+        async with session_factory() as session:
+            message = await session.scalar(select(OutboxMessage).where(OutboxMessage.key_id == "3"))
+        assert message.status == OutboxStatus.PENDING
+        assert message.attempts == 0
+
+    async def test_subscription_committed_during_scan_is_not_orphan(
+        self, reconcile_subs, setup_tariffs, monkeypatch
+    ):
+        iter_subscription_keys = reconcile._iter_subscription_keys
+        user_id = RECONCILE_USER_IDS[4]
+
+        async def racing_rows(servers):
+            async for row in iter_subscription_keys(servers):
+                yield row
+            # Подписка с ключом "11" коммитится после чтения подписок, но до сверки
+            # лишних ключей; защита ключа в outbox отменяется тем же коммитом
+            async with session_factory() as session:
+                await UserRepository(session).create(user_id, f"user_{user_id}", "rc_race")
+                await SubscriptionRepository(session).create(
+                    user_id=user_id,
+                    tariff_id=setup_tariffs["month"].id,
+                    vpn_key="ss://11",
+                    outline_key_id="11",
+                    end_date=datetime.now(timezone.utc) + timedelta(days=30),
+                )
+                await session.commit()
+
+        monkeypatch.setattr(reconcile, "_iter_subscription_keys", racing_rows)
+        outline = FakeOutline(SERVER_KEYS + [("11", f"user_{user_id}")])
+
+        report = await reconcile_server("default", outline, autofix=True)
+
+        assert report.matched == 2
+        assert sorted(report.orphan_sample) == ["3", "4", "9"]
+        assert report.enqueued == 3
+
+
+class TestClaimedKeyIds:
+    async def test_subscription_and_guarded_keys_are_claimed(self, reconcile_subs):
+        server = OutlineManager().default_server
+        async with session_factory() as session:
+            await OutboxRepository(session).enqueue_key_deletions(
+                [("9", server)], reason="release", delay=timedelta(minutes=5)
+            )
+            await session.commit()
+
+        claimed = await claimed_key_ids(server, ["2", "4", "5", "9"])
+
+        assert claimed == {"2", "4", "9"}
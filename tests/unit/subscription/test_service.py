@@ -1,9 +1,15 @@
+import asyncio
 from contextlib import nullcontext as does_not_raise
 from datetime import datetime, timedelta, timezone
 
 import pytest
+from sqlalchemy import select
 
-from src.exceptions import TariffNotFoundException
+from src.core.outbox.models import OutboxMessage, OutboxStatus
+from src.core.outbox.relay import relay_outbox
+from src.core.referral.repository import ReferralRepository
+from src.core.subscription import service as sub_module
+from src.exceptions import SubscriptionException, TariffNotFoundException
 from tests.samples import (
     month_sample,
     three_months_sample,
@@ -16,7 +22,7 @@ from tests.samples import (
 
 
 class TestSubscriptionService:
-    """Тесты для SubscriptionService._create_subscription"""
+    """Тесты для SubscriptionService.create_or_extend_subscription"""
 
     @pytest.mark.parametrize(
         "user_id, tariff_id, expectation",
@@ -33,9 +39,12 @@ class TestSubscriptionService:
         self, sub_service, setup_tariffs, setup_users, user_id, tariff_id, expectation
     ):
         with expectation:
-            subscription, vpn_key = await sub_service._create_subscription(user_id, tariff_id)
+            subscription, vpn_key, created = await sub_service.create_or_extend_subscription(
+                user_id, tariff_id
+            )
 
             assert subscription is not None
+            assert created is True
             assert subscription.user_id == user_id
             assert subscription.tariff_id == tariff_id
             assert subscription.is_active is True
@@ -52,3 +61,133 @@ class TestSubscriptionService:
                 datetime.now(timezone.utc) + timedelta(days=durations.get(tariff_id, 0))
             ).date()
             assert subscription.end_date.date() == expected_date
+
+    async def test_extend_active_subscription(self, sub_service, setup_tariffs, setup_users):
+        sub, key, _ = await sub_service.create_or_extend_subscription(
+            user1_sample.id, month_sample.id
+        )
+        end_date = sub.end_date
+
+        extended, extended_key, created = await sub_service.create_or_extend_subscription(
+            user1_sample.id, month_sample.id
+        )
+
+        assert created is False
+        assert extended.id == sub.id
+        assert extended_key == key
+        assert extended.cnt_payments == 1
+        assert extended.end_date == end_date + timedelta(days=month_sample.duration_days)
+
+    async def test_reactivate_inactive_subscription(self, sub_service, setup_tariffs, setup_users):
+        sub, _, _ = await sub_service.create_or_extend_subscription(
+            user1_sample.id, month_sample.id
+        )
+        await sub_service.sub_repo.update(
+            sub,
+            vpn_key="",
+            outline_key_id="",
+            outline_server="",
+            end_date=datetime.now(timezone.utc) - timedelta(days=1),
+            is_active=False,
+        )
+
+        renewed, vpn_key, created = await sub_service.create_or_extend_subscription(
+            user1_sample.id, month_sample.id
+        )
+
+        assert created is False
+        assert renewed.id == sub.id
+        assert renewed.is_active is True
+        assert vpn_key.startswith("ss://")
+        assert renewed.outline_key_id != ""
+        expected_date = (
+            datetime.now(timezone.utc) + timedelta(days=month_sample.duration_days)
+        ).date()
+        assert renewed.end_date.date() == expected_date
+
+
+class TestReferralBonus:
+    """Тесты для SubscriptionService.apply_referral_bonus"""
+
+    async def test_both_users_get_subscriptions(
+        self, db_session, sub_service, setup_tariffs, setup_users
+    ):
+        referral = await ReferralRepository(db_session).create(user1_sample.id, user2_sample.id)
+
+        await sub_service.apply_referral_bonus(referral)
+
+        referred = await sub_service.sub_repo.get_by_user_id(user2_sample.id)
+        referrer = await sub_service.sub_repo.get_by_user_id(user1_sample.id)
+        assert referred.outline_key_id != referrer.outline_key_id
+        assert referred.is_active and referrer.is_active
+
+    async def test_created_keys_deleted_on_rollback(
+        self, db_session, sub_service, setup_tariffs, setup_users
+    ):
+        deleted = []
+
+        async def delete_key(key_id, server=None):
+            deleted.append(key_id)
+
+        async def create_key(name):
+            if name == f"user_{user1_sample.id}":
+                raise RuntimeError("Outline is unavailable")
+            return {"accessUrl": "ss://key", "id": "referred-key", "server": "default"}
+
+        sub_service.outline.delete_key = delete_key
+        sub_service.outline.create_key = create_key
+        referral = await ReferralRepository(db_session).create(user1_sample.id, user2_sample.id)
+
+        with pytest.raises(SubscriptionException):
+            await sub_service.apply_referral_bonus(referral)
+        await db_session.rollback()
+        await asyncio.gather(*sub_module._cleanup_tasks)
+        await relay_outbox(sub_service.outline)
+
+        assert deleted == ["referred-key"]
+
+    async def test_confirmed_keys_are_kept(
+        self, db_session, sub_service, setup_tariffs, setup_users
+    ):
+        deleted = []
+
+        async def delete_key(key_id, server=None):
+            deleted.append(key_id)
+
+        sub_service.outline.delete_key = delete_key
+        referral = await ReferralRepository(db_session).create(user1_sample.id, user2_sample.id)
+
+        await sub_service.apply_referral_bonus(referral)
+
+        guards = (await db_session.execute(select(OutboxMessage))).scalars().all()
+        assert {guard.status for guard in guards} == {OutboxStatus.CANCELLED}
+        assert len(guards) == 2
+        assert await relay_outbox(sub_service.outline) == 0
+        assert deleted == []
+
+    async def test_claimed_guard_fails_confirmation(
+        self, db_session, sub_service, setup_tariffs, setup_users, monkeypatch
+    ):
+        deleted = []
+
+        async def delete_key(key_id, server=None):
+            deleted.append(key_id)
+
+        confirm_keys = sub_service._confirm_keys
+
+        async def late_confirm():
+            # Коммит опоздал на grace: relay успевает удалить ключ до подтверждения
+            await relay_outbox(sub_service.outline)
+            await confirm_keys()
+
+        sub_service.outline.delete_key = delete_key
+        monkeypatch.setattr(sub_module.settings, "OUTBOX_KEY_GRACE_SECONDS", 0)
+        monkeypatch.setattr(sub_service, "_confirm_keys", late_confirm)
+        referral = await ReferralRepository(db_session).create(user1_sample.id, user2_sample.id)
+
+        with pytest.raises(SubscriptionException):
+            await sub_service.apply_referral_bonus(referral)
+        await db_session.rollback()
+
+        assert len(deleted) == 2
+        assert await sub_service.sub_repo.get_by_user_id(user2_sample.id) is None
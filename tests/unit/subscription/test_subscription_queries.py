@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+from tests.samples import month_sample, trial_sample, user1_sample
+
+
+class TestSubscriptionServiceQueryCount:
+    """
+    Регрессионные тесты на число SQL-запросов: связи моделей не должны
+    подгружаться неявно (например, вся история платежей вместе с тарифом).
+    """
+
+    async def test_create_subscription(
+        self, sub_service, setup_tariffs, setup_users, query_counter
+    ):
+        query_counter.reset()
+        await sub_service.create_or_extend_subscription(user1_sample.id, month_sample.id)
+
+        assert query_counter.count == 5
+
+    async def test_extend_subscription(
+        self, sub_service, setup_tariffs, setup_users, query_counter
+    ):
+        await sub_service.create_or_extend_subscription(user1_sample.id, month_sample.id)
+
+        query_counter.reset()
+        await sub_service.create_or_extend_subscription(user1_sample.id, month_sample.id)
+
+        assert query_counter.count == 2
+
+    async def test_activate_trial(self, sub_service, setup_tariffs, setup_users, query_counter):
+        query_counter.reset()
+        await sub_service.activate_trial(user1_sample.id)
+
+        assert query_counter.count == 8
+
+    async def test_get_subscription_info(
+        self, sub_service, setup_tariffs, setup_users, query_counter
+    ):
+        await sub_service.create_or_extend_subscription(user1_sample.id, trial_sample.id)
+
+        query_counter.reset()
+        await sub_service.get_subscription_info(user1_sample.id)
+
+        assert query_counter.count == 1
+
+    async def test_send_notification(self, sub_service, setup_tariffs, setup_users, query_counter):
+        sub, _, _ = await sub_service.create_or_extend_subscription(
+            user1_sample.id, trial_sample.id
+        )
+
+        query_counter.reset()
+        await sub_service.send_notification(sub.id)
+
+        assert query_counter.count == 2
+
+    async def test_deactivate_subscription(
+        self, sub_service, setup_tariffs, setup_users, query_counter
+    ):
+        sub, _, _ = await sub_service.create_or_extend_subscription(
+            user1_sample.id, trial_sample.id
+        )
+        await sub_service.sub_repo.update(sub, end_date=datetime.now(timezone.utc) - timedelta(1))
+
+        query_counter.reset()
+        await sub_service.deactivate_subscription(sub.id)
+
+        assert query_counter.count == 3
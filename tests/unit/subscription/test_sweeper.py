@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from src.config import settings
+from src.core.outbox.models import OutboxMessage, OutboxOperation
+from src.core.subscription import batch
+from src.core.subscription.models import Subscription
+from src.core.subscription.repository import SubscriptionRepository
+from src.core.subscription.sweeper import sweep_deactivations, sweep_notifications
+from src.database import session_factory
+from src.notifications.queue import MessageQueue
+
+NOW = datetime(2030, 6, 1, 12, 0, tzinfo=timezone.utc)
+CLAIM_TTL = timedelta(minutes=settings.NOTIFY_CLAIM_TTL_MINUTES)
+
+
+class SentBot:
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        pass
+
+
+@pytest.fixture
+def reminder_queue(monkeypatch):
+    queue = MessageQueue(global_rate=1000, chat_interval=0, max_attempts=3, workers=1, maxsize=100)
+    monkeypatch.setattr(batch, "message_queue", queue)
+    return queue
+
+
+async def get_subs(sub_ids: list[int]) -> dict[int, Subscription]:
+    async with session_factory() as session:
+        result = await session.execute(select(Subscription).where(Subscription.id.in_(sub_ids)))
+        return {sub.id: sub for sub in result.scalars()}
+
+
+class TestSweepDeactivations:
+    @pytest.mark.parametrize("batch_size", [1000, 1])
+    async def test_deactivates_due_subscriptions(self, committed_subs, monkeypatch, batch_size):
+        monkeypatch.setattr(settings, "EXPIRY_SWEEP_BATCH_SIZE", batch_size)
+        expired, boundary, future = await committed_subs(
+            NOW, [-timedelta(days=1), timedelta(0), timedelta(seconds=1)]
+        )
+
+        assert await sweep_deactivations(NOW) == 2
+
+        subs = await get_subs([expired, boundary, future])
+        assert not subs[expired].is_active
+        assert not subs[boundary].is_active
+        assert subs[expired].outline_key_id == ""
+        assert subs[future].is_active
+        assert await sweep_deactivations(NOW) == 0
+
+    async def test_keys_go_to_outbox(self, committed_subs):
+        sub_ids = await committed_subs(
+            NOW, [-timedelta(days=2), -timedelta(days=1), timedelta(days=1)]
+        )
+        subs = await get_subs(sub_ids)
+
+        await sweep_deactivations(NOW)
+
+        async with session_factory() as session:
+            result = await session.execute(
+                select(OutboxMessage.key_id).where(
+                    OutboxMessage.operation == OutboxOperation.DELETE_KEY
+                )
+            )
+            key_ids = set(result.scalars())
+        assert key_ids == {subs[sub_ids[0]].outline_key_id, subs[sub_ids[1]].outline_key_id}
+
+    async def test_skips_rows_locked_by_another_worker(self, committed_subs):
+        locked, free = await committed_subs(NOW, [-timedelta(days=2), -timedelta(days=1)])
+
+        async with session_factory() as other:
+            await SubscriptionRepository(other).get_by_ids([locked], for_update=True)
+            assert await sweep_deactivations(NOW) == 1
+            await other.rollback()
+
+        subs = await get_subs([locked, free])
+        assert subs[locked].is_active
+        assert not subs[free].is_active
+
+
+class TestSweepNotifications:
+    @pytest.mark.parametrize("batch_size", [1000, 1])
+    async def test_claims_once_per_end_date(
+        self, committed_subs, reminder_queue, monkeypatch, batch_size
+    ):
+        monkeypatch.setattr(settings, "EXPIRY_SWEEP_BATCH_SIZE", batch_size)
+        expired, soon, boundary, later = await committed_subs(
+            NOW, [timedelta(0), timedelta(hours=1), timedelta(days=3), timedelta(days=3, seconds=1)]
+        )
+
+        assert await sweep_notifications(NOW) == 2
+        assert len(reminder_queue) == 2
+
+        subs = await get_subs([expired, soon, boundary, later])
+        assert subs[soon].notify_claimed_at == NOW
+        assert subs[boundary].notify_claimed_at == NOW
+        assert subs[expired].notify_claimed_at is None
+        assert subs[later].notify_claimed_at is None
+        # Отметка об отправке появляется только после отправки
+        assert subs[soon].notified_end_date is None
+        assert await sweep_notifications(NOW) == 0
+
+    async def test_marks_notified_after_send(self, committed_subs, reminder_queue):
+        (sub_id,) = await committed_subs(NOW, [timedelta(hours=1)])
+        await sweep_notifications(NOW)
+
+        reminder_queue.start(SentBot())
+        await reminder_queue.stop(timeout=1)
+
+        sub = (await get_subs([sub_id]))[sub_id]
+        assert sub.notified_end_date == sub.end_date
+        assert await sweep_notifications(NOW + CLAIM_TTL) == 0
+
+    async def test_lost_notification_is_queued_again_after_ttl(
+        self, committed_subs, reminder_queue
+    ):
+        (sub_id,) = await committed_subs(NOW, [timedelta(hours=1)])
+        await sweep_notifications(NOW)
+        # Рестарт: очередь в памяти потеряна, отметки об отправке нет
+
+        assert await sweep_notifications(NOW + CLAIM_TTL - timedelta(seconds=1)) == 0
+        assert await sweep_notifications(NOW + CLAIM_TTL) == 1
+
+    async def test_extended_subscription_is_notified_again(self, committed_subs, reminder_queue):
+        (sub_id,) = await committed_subs(NOW, [timedelta(days=1)])
+        await sweep_notifications(NOW)
+        reminder_queue.start(SentBot())
+        await reminder_queue.stop(timeout=1)
+
+        async with session_factory() as session:
+            sub = (await SubscriptionRepository(session).get_by_ids([sub_id]))[0]
+            sub.end_date = NOW + timedelta(days=2)
+            await session.commit()
+
+        assert await sweep_notifications(NOW) == 1
+
+    async def test_full_queue_leaves_subscription_for_next_run(self, committed_subs, monkeypatch):
+        queue = MessageQueue(
+            global_rate=1000, chat_interval=0, max_attempts=3, workers=1, maxsize=1
+        )
+        monkeypatch.setattr(batch, "message_queue", queue)
+        first, second = await committed_subs(NOW, [timedelta(hours=1), timedelta(hours=2)])
+
+        assert await sweep_notifications(NOW) == 1
+
+        subs = await get_subs([first, second])
+        assert subs[first].notify_claimed_at == NOW
+        assert subs[second].notify_claimed_at is None
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from src.core import models  # noqa: F401
+from src.core.tariff import catalog as catalog_module
+from src.core.tariff.catalog import TariffCatalog, TariffInfo
+from src.core.tariff.models import Tariff
+from src.core.tariff.repository import TARIFFS_CHANGED, TariffRepository
+from src.database import session_factory
+
+TEST_TARIFF_NAME = "catalog_test"
+
+
+class DummyPubSub:
+    def __init__(self):
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+
+class DummyRedis:
+    def __init__(self):
+        self.version = 0
+        self.published: list[int] = []
+        self.subscribers: list[DummyPubSub] = []
+
+    async def get(self, key):
+        return str(self.version).encode()
+
+    async def incr(self, key):
+        self.version += 1
+        return self.version
+
+    async def publish(self, channel, message):
+        self.published.append(message)
+        for pubsub in self.subscribers:
+            pubsub.messages.put_nowait({"type": "message", "data": str(message).encode()})
+
+    def pubsub(self):
+        pubsub = DummyPubSub()
+        self.subscribers.append(pubsub)
+        return pubsub
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("Redis is down")
+
+    async def incr(self, key):
+        raise ConnectionError("Redis is down")
+
+
+class DummyResult:
+    def __init__(self, tariffs):
+        self._tariffs = tariffs
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._tariffs
+
+
+class DummySession:
+    def __init__(self, tariffs):
+        self._tariffs = tariffs
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, query):
+        return DummyResult(self._tariffs)
+
+
+class DummyRepo:
+    async def get_by_name(self, name):
+        return "from_db"
+
+
+def make_tariffs() -> list[Tariff]:
+    return [
+        Tariff(id=1, name="trial", duration_days=7, price=Decimal("0"), is_active=True),
+        Tariff(id=2, name="month", duration_days=30, price=Decimal("199"), is_active=True),
+        Tariff(id=3, name="old", duration_days=90, price=Decimal("499"), is_active=False),
+    ]
+
+
+def make_catalog(redis, tariffs: list[Tariff]) -> TariffCatalog:
+    return TariffCatalog(redis, factory=lambda: DummySession(tariffs))
+
+
+class TestTariffCatalog:
+    async def test_falls_back_to_db_until_loaded(self):
+        catalog = make_catalog(DummyRedis(), make_tariffs())
+
+        assert await catalog.get_by_name("trial", DummyRepo()) == "from_db"
+
+        await catalog.reload()
+        trial = await catalog.get_by_name("trial", DummyRepo())
+        assert isinstance(trial, TariffInfo)
+        assert trial.duration_days == 7
+
+    async def test_snapshot_lookup(self):
+        catalog = make_catalog(DummyRedis(), make_tariffs())
+        await catalog.reload()
+
+        assert (await catalog.get_by_id(2, DummyRepo())).name == "month"
+        assert await catalog.get_by_id(42, DummyRepo()) is None
+        assert [t.name for t in await catalog.get_all_active(DummyRepo())] == ["trial", "month"]
+
+    async def test_stale_version_is_ignored(self):
+        tariffs = make_tariffs()
+        catalog = make_catalog(DummyRedis(), tariffs)
+        await catalog.reload(version=5)
+        tariffs.pop()
+
+        snapshot = await catalog.reload(version=4)
+        assert snapshot.version == 5
+        assert len(snapshot.tariffs) == 3
+
+        snapshot = await catalog.reload(version=6)
+        assert len(snapshot.tariffs) == 2
+
+    async def test_commit_publishes_new_version(self, monkeypatch):
+        redis = DummyRedis()
+        monkeypatch.setattr(catalog_module, "tariff_catalog", make_catalog(redis, []))
+        session = Session()
+
+        session.commit()
+        session.info[TARIFFS_CHANGED] = True
+        session.commit()
+        await asyncio.sleep(0)
+
+        assert redis.published == [1]
+
+
+@pytest.fixture
+async def db_catalog(setup_tariffs, monkeypatch):
+    """
+    Каталог поверх настоящей БД, подставленный вместо глобального: коммиты
+    TariffRepository публикуют изменения в него. Тестовый тариф удаляется после теста.
+    """
+
+    def make(redis) -> TariffCatalog:
+        catalog = TariffCatalog(redis, factory=session_factory)
+        monkeypatch.setattr(catalog_module, "tariff_catalog", catalog)
+        return catalog
+
+    yield make
+    await wait_published()
+    async with session_factory() as session:
+        await session.execute(delete(Tariff).where(Tariff.name == TEST_TARIFF_NAME))
+        await session.commit()
+
+
+async def wait_published() -> None:
+    # Задачи публикации из других тестов привязаны к своим event loop
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(t for t in catalog_module._publish_tasks if t.get_loop() is loop))
+
+
+async def create_test_tariff(price: Decimal) -> int:
+    async with session_factory() as session:
+        tariff = await TariffRepository(session).create(
+            name=TEST_TARIFF_NAME, price=price, duration_days=14
+        )
+        await session.commit()
+        return tariff.id
+
+
+async def update_test_tariff(tariff_id: int, price: Decimal) -> None:
+    async with session_factory() as session:
+        repo = TariffRepository(session)
+        await repo.update(await repo.get_by_id(tariff_id), price=price)
+        await session.commit()
+
+
+async def wait_for_version(catalog: TariffCatalog, version: int) -> None:
+    async def poll():
+        while catalog.snapshot.version < version:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout=2)
+
+
+class TestTariffCatalogInvalidation:
+    async def test_loads_tariffs_from_db(self, db_catalog, setup_tariffs):
+        catalog = db_catalog(DummyRedis())
+
+        await catalog.reload()
+
+        month = await catalog.get_by_name("month", DummyRepo())
+        assert month == TariffInfo.from_tariff(setup_tariffs["month"])
+        assert await catalog.get_by_id(month.id, DummyRepo()) is month
+
+    async def test_update_commit_reloads_snapshot(self, db_catalog):
+        redis = DummyRedis()
+        catalog = db_catalog(redis)
+        await catalog.start()
+        try:
+            tariff_id = await create_test_tariff(Decimal("100"))
+            await wait_for_version(catalog, 1)
+            assert (await catalog.get_by_id(tariff_id, DummyRepo())).price == Decimal("100")
+
+            await update_test_tariff(tariff_id, Decimal("150"))
+            await wait_for_version(catalog, 2)
+
+            tariff = await catalog.get_by_name(TEST_TARIFF_NAME, DummyRepo())
+            assert tariff.price == Decimal("150")
+            assert redis.published == [1, 2]
+        finally:
+            await catalog.stop()
+
+    async def test_update_without_redis_reloads_own_replica(self, db_catalog, caplog):
+        catalog = db_catalog(BrokenRedis())
+        await catalog.reload()
+        tariff_id = await create_test_tariff(Decimal("100"))
+        await wait_published()
+
+        with caplog.at_level(logging.ERROR, logger="src.core.tariff.catalog"):
+            await update_test_tariff(tariff_id, Decimal("150"))
+            await wait_published()
+
+        assert "Failed to publish tariff change" in caplog.text
+        assert catalog.snapshot.version == 2
+        assert (await catalog.get_by_id(tariff_id, DummyRepo())).price == Decimal("150")
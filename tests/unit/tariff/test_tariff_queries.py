@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from src.core.payment.repository import PaymentRepository
+from tests.samples import trial_sample, user1_sample
+
+
+class TestTariffRepositoryQueryCount:
+    async def test_get_by_name_does_not_load_payments(
+        self, db_session, tariff_repo, setup_tariffs, setup_users, query_counter
+    ):
+        pay_repo = PaymentRepository(db_session)
+        for i in range(20):
+            await pay_repo.create(
+                user_id=user1_sample.id,
+                tariff_id=trial_sample.id,
+                amount=0,
+                invoice_payload=f"payload_{i}",
+            )
+        db_session.expunge_all()
+
+        query_counter.reset()
+        trial = await tariff_repo.get_by_name("trial")
+
+        assert query_counter.count == 1
+        with pytest.raises(InvalidRequestError):
+            trial.payments
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete
+
+from src.cache import LRUCache
+from src.core.user.cache import UserProfile, UserProfileCache, user_profile_cache
+from src.core.user.models import User
+from src.core.user.repository import UserRepository
+from src.database import session_factory
+
+CACHED_USER_ID = 8800002001
+
+
+class DummyRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_profile(user_id: int = 1, trial_used: bool = False) -> UserProfile:
+    return UserProfile(
+        id=user_id, username="user", referral_code="code", trial_used=trial_used, is_admin=False
+    )
+
+
+def make_cache(redis: DummyRedis, local_ttl: float = 60) -> UserProfileCache:
+    return UserProfileCache(redis=redis, ttl=300, local_size=100, local_ttl=local_ttl)
+
+
+class TestUserProfileCache:
+    async def test_local_then_redis_then_miss(self):
+        redis = DummyRedis()
+        cache = make_cache(redis)
+        assert await cache.get(1) is None
+
+        await cache.set(make_profile())
+        assert await cache.get(1) == make_profile()
+        assert redis.calls == 1
+
+        # Другая реплика: локального уровня нет, профиль берется из Redis
+        other = make_cache(redis)
+        assert await other.get(1) == make_profile()
+        assert other.stats == {"local_hits": 0, "redis_hits": 1, "misses": 0}
+        assert cache.stats == {"local_hits": 1, "redis_hits": 0, "misses": 1}
+
+    async def test_invalidate_removes_both_levels(self):
+        redis = DummyRedis()
+        cache = make_cache(redis)
+        await cache.set(make_profile())
+
+        await cache.invalidate(1)
+
+        assert await cache.get(1) is None
+        assert redis.data == {}
+
+    async def test_disabled_cache_never_hits(self):
+        cache = UserProfileCache(DummyRedis(), ttl=300, local_size=10, local_ttl=60, enabled=False)
+        await cache.set(make_profile())
+
+        assert await cache.get(1) is None
+
+
+@pytest.fixture
+async def cached_user(monkeypatch):
+    """
+    Включенный кэш профилей (в pytest.ini он выключен) поверх DummyRedis
+    и закоммиченный пользователь, которого читают разные сессии.
+    """
+    monkeypatch.setattr(user_profile_cache, "enabled", True)
+    monkeypatch.setattr(user_profile_cache, "_redis", DummyRedis())
+    monkeypatch.setattr(user_profile_cache, "_local", LRUCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(
+        user_profile_cache, "stats", {"local_hits": 0, "redis_hits": 0, "misses": 0}
+    )
+    async with session_factory() as session:
+        await UserRepository(session).create(CACHED_USER_ID, "cached", "cached")
+        await session.commit()
+    yield CACHED_USER_ID
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.id == CACHED_USER_ID))
+        await session.commit()
+
+
+async def read_profile(user_id: int) -> UserProfile:
+    async with session_factory() as session:
+        return await UserRepository(session).get_profile(user_id)
+
+
+class TestUserProfileCacheInvalidation:
+    async def test_stale_profile_cached_before_commit_is_dropped(self, cached_user):
+        assert (await read_profile(cached_user)).trial_used is False
+
+        async with session_factory() as session:
+            repo = UserRepository(session)
+            await repo.mark_trial_used(await repo.get_by_id(cached_user))
+            # Другой запрос до коммита снова кладет в кэш закоммиченную версию
+            assert (await read_profile(cached_user)).trial_used is False
+            await session.commit()
+        await asyncio.sleep(0)
+
+        assert (await read_profile(cached_user)).trial_used is True
+
+    async def test_rollback_keeps_profile(self, cached_user):
+        async with session_factory() as session:
+            repo = UserRepository(session)
+            await repo.mark_trial_used(await repo.get_by_id(cached_user))
+            await session.rollback()
+
+        assert (await read_profile(cached_user)).trial_used is False
+        assert user_profile_cache.stats["misses"] == 1
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_expired_entry_is_dropped(self):
+        cache = LRUCache(maxsize=2, ttl=0)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
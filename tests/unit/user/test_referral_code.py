@@ -0,0 +1,50 @@
+import pytest
+
+from src.core.user.referral_code import CODE_LENGTH, ReferralCodec, referral_codec
+from src.core.user.repository import UserRepository
+from src.exceptions import ReferralCodeGenerationException
+from tests.samples import user1_sample, user2_sample
+
+
+class TestReferralCodec:
+    codec = ReferralCodec(b"test-key")
+
+    @pytest.mark.parametrize("user_id", [0, 1, user1_sample.id, 7_000_000_000, (1 << 52) - 1])
+    def test_round_trip(self, user_id):
+        code = self.codec.encode(user_id)
+
+        assert len(code) == CODE_LENGTH
+        assert code.isalnum()
+        assert self.codec.decode(code) == user_id
+
+    def test_codes_differ_between_users_and_keys(self):
+        codes = {self.codec.encode(user_id) for user_id in range(1000, 2000)}
+
+        assert len(codes) == 1000
+        assert ReferralCodec(b"other-key").encode(user1_sample.id) != self.codec.encode(
+            user1_sample.id
+        )
+
+    @pytest.mark.parametrize("code", ["", "a1b1c1d1", "a1b1c1d1-_", "zzzzzzzzzz"])
+    def test_decode_rejects_foreign_codes(self, code):
+        assert self.codec.decode(code) is None
+
+    def test_encode_rejects_out_of_range_id(self):
+        with pytest.raises(ReferralCodeGenerationException):
+            self.codec.encode(-1)
+
+
+class TestGetByReferralCode:
+    async def test_new_code_found_by_id(self, db_session):
+        repo = UserRepository(db_session)
+        code = referral_codec.encode(user2_sample.id)
+        await repo.create(user2_sample.id, user2_sample.username, code)
+
+        found = await repo.get_by_referral_code(code)
+
+        assert found.id == user2_sample.id
+
+    async def test_legacy_code_found_by_column(self, db_session, setup_users):
+        found = await UserRepository(db_session).get_by_referral_code(user1_sample.ref_code)
+
+        assert found.id == user1_sample.id
@@ -0,0 +1,37 @@
+import pytest
+
+from src.core.user.service import UserService
+from tests.samples import user1_sample, user2_sample
+
+
+@pytest.fixture
+async def user_service(db_session, mock_outline):
+    user_service = UserService(db_session)
+    user_service.sub_service.outline = mock_outline
+    return user_service
+
+
+class TestUserServiceQueryCount:
+    async def test_start_new_user(self, user_service, query_counter):
+        query_counter.reset()
+        await user_service.start(user1_sample.id, user1_sample.username, ref_code=None)
+
+        assert query_counter.count == 2
+
+    async def test_start_existing_user(self, user_service, setup_users, query_counter):
+        query_counter.reset()
+        await user_service.start(user1_sample.id, user1_sample.username, ref_code=None)
+
+        assert query_counter.count == 1
+
+    async def test_start_with_referral(
+        self, user_service, setup_tariffs, setup_users, query_counter
+    ):
+        query_counter.reset()
+        user, _ = await user_service.start(
+            user2_sample.id, user2_sample.username, user1_sample.ref_code
+        )
+
+        # Последний запрос перечитывает профиль: бонус отметил пробный период использованным
+        assert query_counter.count == 18
+        assert user.trial_used
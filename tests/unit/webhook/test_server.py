@@ -0,0 +1,121 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.webhook.server import (
+    SECRET_HEADER,
+    UpdateQueue,
+    WebhookHandler,
+    create_app,
+    create_metrics_app,
+)
+
+SECRET = "secret"
+
+
+class DummyDispatcher:
+    def __init__(self, delay: float = 0):
+        self.processed: list[dict] = []
+        self.delay = delay
+
+    async def feed_raw_update(self, bot, update: dict):
+        await asyncio.sleep(self.delay)
+        self.processed.append(update)
+
+
+def make_update(update_id: int, user_id: int) -> dict:
+    return {"update_id": update_id, "message": {"from": {"id": user_id}, "text": "hi"}}
+
+
+async def make_client(queue: UpdateQueue) -> tuple[TestClient, WebhookHandler]:
+    handler = WebhookHandler(queue, SECRET)
+    client = TestClient(TestServer(create_app(handler, "/webhook")))
+    await client.start_server()
+    return client, handler
+
+
+class TestUpdateQueue:
+    async def test_updates_of_one_user_keep_order(self):
+        dispatcher = DummyDispatcher()
+        queue = UpdateQueue(dispatcher, bot=None, workers=4, maxsize=100)
+        for update_id in range(10):
+            assert queue.submit(make_update(update_id, user_id=7))
+
+        queue.start()
+        await queue.stop(timeout=1)
+
+        assert [u["update_id"] for u in dispatcher.processed] == list(range(10))
+        assert queue.stats["processed"] == 10
+
+    async def test_full_shard_rejects(self):
+        queue = UpdateQueue(DummyDispatcher(), bot=None, workers=1, maxsize=1)
+
+        assert queue.submit(make_update(1, user_id=1))
+        assert not queue.submit(make_update(2, user_id=1))
+        assert queue.stats["rejected"] == 1
+
+
+class TestWebhookHandler:
+    async def test_wrong_secret_is_rejected(self):
+        queue = UpdateQueue(DummyDispatcher(), bot=None, workers=1, maxsize=10)
+        client, _ = await make_client(queue)
+        try:
+            response = await client.post(
+                "/webhook", json=make_update(1, 1), headers={SECRET_HEADER: "wrong"}
+            )
+            assert response.status == 401
+            assert len(queue) == 0
+        finally:
+            await client.close()
+
+    async def test_update_is_acked_and_processed(self):
+        dispatcher = DummyDispatcher()
+        queue = UpdateQueue(dispatcher, bot=None, workers=2, maxsize=10)
+        client, _ = await make_client(queue)
+        queue.start()
+        try:
+            response = await client.post(
+                "/webhook", json=make_update(1, 1), headers={SECRET_HEADER: SECRET}
+            )
+            assert response.status == 200
+            await queue.stop(timeout=1)
+            assert dispatcher.processed == [make_update(1, 1)]
+            assert queue.stats["processed"] == 1
+
+        finally:
+            await client.close()
+
+    async def test_metrics_are_served_only_on_the_internal_app(self):
+        queue = UpdateQueue(DummyDispatcher(), bot=None, workers=1, maxsize=10)
+        client, handler = await make_client(queue)
+        metrics_client = TestClient(TestServer(create_metrics_app(handler)))
+        await metrics_client.start_server()
+        try:
+            await client.post("/webhook", json=make_update(1, 1), headers={SECRET_HEADER: SECRET})
+
+            assert (await client.get("/metrics")).status == 404
+            metrics = await (await metrics_client.get("/metrics")).json()
+            assert metrics["received"] == 1
+            assert metrics["queue_size"] == 1
+        finally:
+            await client.close()
+            await metrics_client.close()
+
+    async def test_backpressure_and_shutdown_answer_503(self):
+        queue = UpdateQueue(DummyDispatcher(), bot=None, workers=1, maxsize=1)
+        client, handler = await make_client(queue)
+        headers = {SECRET_HEADER: SECRET}
+        try:
+            assert (
+                await client.post("/webhook", json=make_update(1, 1), headers=headers)
+            ).status == 200
+            assert (
+                await client.post("/webhook", json=make_update(2, 1), headers=headers)
+            ).status == 503
+
+            handler.accepting = False
+            assert (
+                await client.post("/webhook", json=make_update(3, 2), headers=headers)
+            ).status == 503
+        finally:
+            await client.close()